@@ -0,0 +1,73 @@
+"""
+Raw array tiles: `numpy.save` of a (tile, mask) tuple vs the array format.
+
+Tiles are read from tests/fixtures/cog.tif (uint16, one band) at 256 and
+512 pixels. Sizes are in bytes, times in microseconds per tile.
+
+Usage
+-----
+    python benchmarks/arrays.py
+
+"""
+
+import os
+import time
+import warnings
+import zlib
+from io import BytesIO
+
+import numpy
+import rasterio
+
+from dashboard_api.ressources import arrays
+
+COG = os.path.join(os.path.dirname(__file__), "..", "tests", "fixtures", "cog.tif")
+
+
+def _numpy_save(tile: numpy.ndarray, mask: numpy.ndarray) -> bytes:
+    """Previous encoding of the npy tiles."""
+    sio = BytesIO()
+    with warnings.catch_warnings():
+        # ragged tuple: numpy builds an object array and pickles it
+        warnings.simplefilter("ignore")
+        numpy.save(sio, (tile, mask))
+    sio.seek(0)
+    return sio.getvalue()
+
+
+def _numpy_load(value: bytes):
+    return numpy.load(BytesIO(value), allow_pickle=True)
+
+
+def _timeit(fn, *args, number: int = 200) -> float:
+    start = time.perf_counter()
+    for _ in range(number):
+        fn(*args)
+    return (time.perf_counter() - start) / number * 1e6
+
+
+def main():
+    """Print size, encode and decode times per tile size and encoding."""
+    print(
+        f"{'size':>5} {'encoding':>12} {'bytes':>8} {'zlib bytes':>10} {'encode us':>10} {'decode us':>10}"
+    )
+    for size in (256, 512):
+        with rasterio.open(COG) as src_dst:
+            tile = src_dst.read(indexes=(1,), out_shape=(1, size, size))
+            mask = src_dst.dataset_mask(out_shape=(size, size))
+
+        encoders = {
+            "numpy.save": (_numpy_save, _numpy_load),
+            "array": (arrays.encode, arrays.decode),
+            "array zlib": (lambda t, m: arrays.encode(t, m, 1), arrays.decode),
+        }
+        for name, (encode, decode) in encoders.items():
+            value = encode(tile, mask)
+            print(
+                f"{size:>5} {name:>12} {len(value):>8} {len(zlib.compress(value)):>10} "
+                f"{_timeit(encode, tile, mask):>10.1f} {_timeit(decode, value):>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Micro-benchmark of response compression.
+
+Measures the CPU time spent per response by the previous blanket
+`GZipMiddleware(minimum_size=0)` and by `CompressionMiddleware`, for PNG and
+JPEG tiles rendered from tests/fixtures/cog.tif and for small and large JSON
+bodies, as requested by a browser (Accept-Encoding: gzip, deflate, br).
+
+Usage
+-----
+    python benchmarks/compression.py
+
+"""
+
+import asyncio
+import json
+import os
+import time
+
+import numpy as np
+import rasterio
+from rio_tiler.utils import render
+
+from dashboard_api.middleware import CompressionMiddleware
+
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.responses import Response
+
+COG = os.path.join(os.path.dirname(__file__), "..", "tests", "fixtures", "cog.tif")
+ACCEPT_ENCODING = b"gzip, deflate, br"
+
+
+def _bodies():
+    with rasterio.open(COG) as src_dst:
+        data = src_dst.read(1, out_shape=(256, 256))
+        mask = src_dst.dataset_mask(out_shape=(256, 256))
+
+    tile = (np.clip(data, 0, 1000) / 1000 * 255).astype(np.uint8)[np.newaxis]
+    info = {"bounds": [0.0] * 4, "band_metadata": [[i, {}] for i in range(500)]}
+    return {
+        "png tile": (render(tile, mask, img_format="PNG"), "image/png"),
+        "jpeg tile": (render(tile, img_format="JPEG"), "image/jpg"),
+        "small json": (json.dumps({"ping": "pong!"}).encode(), "application/json"),
+        "large json": (json.dumps(info).encode(), "application/json"),
+    }
+
+
+def _cpu_per_response(middleware, body: bytes, media_type: str, number: int):
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": "/",
+        "headers": [(b"accept-encoding", ACCEPT_ENCODING)],
+    }
+    sent = []
+
+    async def receive():
+        return {"type": "http.request"}
+
+    async def send(message):
+        sent.append(message)
+
+    async def run():
+        for _ in range(number):
+            app = middleware(Response(body, media_type=media_type))
+            await app(scope, receive, send)
+
+    loop = asyncio.get_event_loop()
+    start = time.process_time()
+    loop.run_until_complete(run())
+    elapsed = time.process_time() - start
+
+    return elapsed / number, len(sent[-1]["body"])
+
+
+def main(number: int = 500):
+    """Print CPU time and size per response of both middlewares."""
+    stacks = {
+        "before": lambda app: GZipMiddleware(app, minimum_size=0),
+        "after": lambda app: CompressionMiddleware(app),
+    }
+    print(f"{'response':>10} {'stack':>6} {'cpu us':>8} {'bytes':>7}")
+    for name, (body, media_type) in _bodies().items():
+        for stack, middleware in stacks.items():
+            cpu, size = _cpu_per_response(middleware, body, media_type, number)
+            print(f"{name:>10} {stack:>6} {cpu * 1e6:>8.1f} {size:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Size of the cached values, pickled (previous format) and as envelopes.
+
+Tiles are rendered from tests/fixtures/cog.tif with the tile endpoint
+formatting; the JSON value is the datasets list. The previous format is
+measured after python-binary-memcached's default zlib compression.
+
+Usage
+-----
+    python benchmarks/envelope.py
+
+"""
+
+import json
+import os
+import pickle
+import time
+import zlib
+
+import rasterio
+
+from dashboard_api.api.api_v1.endpoints.tiles import format_tile
+from dashboard_api.db import envelope
+from dashboard_api.ressources.enums import ImageType
+
+COG = os.path.join(os.path.dirname(__file__), "..", "tests", "fixtures", "cog.tif")
+
+
+def _legacy_size(value) -> int:
+    """Pickle and zlib-compress the value like bmemcached did."""
+    data = value.encode() if isinstance(value, str) else pickle.dumps(value, 0)
+    compressed = zlib.compress(data)
+    return min(len(data), len(compressed))
+
+
+def main(number: int = 100):
+    """Print stored bytes and encode time per value type."""
+    with rasterio.open(COG) as src_dst:
+        data = src_dst.read(1, out_shape=(1, 256, 256))
+        mask = src_dst.dataset_mask(out_shape=(256, 256))
+
+    tile = (data.clip(0, 1000) / 1000 * 255).astype("uint8")
+    values = {
+        ext.value: format_tile(tile, mask, ext, 0, 0, 0, 256) for ext in ImageType
+    }
+    datasets = [
+        {"id": f"dataset-{i}", "domain": ["2020-01-01"] * 30} for i in range(20)
+    ]
+    values["json"] = json.dumps(datasets).encode()
+
+    print(f"{'type':>5} {'payload':>8} {'legacy':>8} {'envelope':>8} {'encode us':>10}")
+    for name, payload in values.items():
+        if name == "json":
+            legacy = _legacy_size(payload.decode())
+            args = (payload, envelope.JSON)
+        else:
+            legacy = _legacy_size((payload, ImageType(name)))
+            args = (payload, envelope.IMAGE, ImageType(name))
+
+        start = time.perf_counter()
+        for _ in range(number):
+            value = envelope.pack(*args)
+        elapsed = (time.perf_counter() - start) / number
+
+        print(
+            f"{name:>5} {len(payload):>8} {legacy:>8} {len(value):>8} {elapsed * 1e6:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
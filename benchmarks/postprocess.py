@@ -0,0 +1,90 @@
+"""
+Micro-benchmark of dashboard_api.api.utils.postprocess.
+
+Compares the vectorised post-processing against the previous band-by-band
+implementation, for 1, 3 and 4 band tiles at 256 and 768 px built from
+tests/fixtures/cog.tif.
+
+Usage
+-----
+    python benchmarks/postprocess.py
+
+"""
+
+import os
+import timeit
+
+import numpy as np
+import rasterio
+from rio_color.operations import parse_operations
+from rio_color.utils import scale_dtype, to_math_type
+from rio_tiler.utils import _chunks, linear_rescale
+
+from dashboard_api.api.utils import postprocess
+
+COG = os.path.join(os.path.dirname(__file__), "..", "tests", "fixtures", "cog.tif")
+RESCALE = "0,1000"
+COLOR_FORMULA = "Gamma RGB 3.5 Saturation 1.7 Sigmoidal RGB 15 0.35"
+
+
+def legacy_postprocess(tile, mask, rescale=None, color_formula=None):
+    """Previous implementation of postprocess."""
+    if rescale:
+        rescale_arr = list(map(float, rescale.split(",")))
+        rescale_arr = list(_chunks(rescale_arr, 2))
+        if len(rescale_arr) != tile.shape[0]:
+            rescale_arr = ((rescale_arr[0]),) * tile.shape[0]
+
+        for bdx in range(tile.shape[0]):
+            tile[bdx] = np.where(
+                mask,
+                linear_rescale(
+                    tile[bdx], in_range=rescale_arr[bdx], out_range=[0, 255]
+                ),
+                0,
+            )
+        tile = tile.astype(np.uint8)
+
+    if color_formula:
+        tile[tile < 0] = 0
+        for ops in parse_operations(color_formula):
+            tile = scale_dtype(ops(to_math_type(tile)), np.uint8)
+
+    return tile
+
+
+def _sample(bands: int, size: int):
+    with rasterio.open(COG) as src_dst:
+        data = src_dst.read(1, out_shape=(size, size))
+        mask = src_dst.dataset_mask(out_shape=(size, size))
+
+    return np.stack([data] * bands), mask
+
+
+def main(number: int = 20):
+    """Print the mean time per call of both implementations."""
+    print(
+        f"{'bands':>5} {'size':>5} {'formula':>8} {'legacy ms':>10} {'new ms':>8} {'gain':>6}"
+    )
+    for size in (256, 768):
+        for bands in (1, 3, 4):
+            tile, mask = _sample(bands, size)
+            formulas = [None, COLOR_FORMULA] if bands == 3 else [None]
+            for formula in formulas:
+                kwargs = dict(rescale=RESCALE, color_formula=formula)
+                before = timeit.timeit(
+                    lambda: legacy_postprocess(tile.copy(), mask, **kwargs),
+                    number=number,
+                )
+                after = timeit.timeit(
+                    lambda: postprocess(tile.copy(), mask, **kwargs), number=number
+                )
+                print(
+                    f"{bands:>5} {size:>5} {'yes' if formula else 'no':>8} "
+                    f"{before / number * 1000:>10.2f} {after / number * 1000:>8.2f} "
+                    f"{before / after:>5.1f}x"
+                )
+
+
+if __name__ == "__main__":
+    main()
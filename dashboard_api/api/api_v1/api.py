@@ -1,14 +1,30 @@
 """dashboard_api api."""
 
 from dashboard_api.api.api_v1.endpoints import datasets  # isort:skip
-from dashboard_api.api.api_v1.endpoints import metadata, ogc, sites, tiles, timelapse
+from dashboard_api.api.api_v1.endpoints import (
+    compare,
+    metadata,
+    mosaic,
+    ogc,
+    point,
+    preview,
+    sites,
+    tiles,
+    timelapse,
+    timeseries,
+)
 
 from fastapi import APIRouter
 
 api_router = APIRouter()
 api_router.include_router(tiles.router, tags=["tiles"])
+api_router.include_router(mosaic.router, tags=["mosaic"])
+api_router.include_router(compare.router, tags=["compare"])
 api_router.include_router(metadata.router, tags=["metadata"])
+api_router.include_router(preview.router, tags=["preview"])
+api_router.include_router(point.router, tags=["point"])
 api_router.include_router(ogc.router, tags=["OGC"])
 api_router.include_router(timelapse.router, tags=["timelapse"])
+api_router.include_router(timeseries.router, tags=["timeseries"])
 api_router.include_router(datasets.router, tags=["datasets"])
 api_router.include_router(sites.router, tags=["sites"])
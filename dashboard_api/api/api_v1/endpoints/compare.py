@@ -0,0 +1,159 @@
+"""API comparison tiles."""
+
+import asyncio
+from functools import partial
+from typing import Dict, Optional, Union
+
+from dashboard_api.api import executors, keys, utils
+from dashboard_api.api.api_v1.endpoints.tiles import (
+    Encoder,
+    cached_tile_response,
+    negotiation_headers,
+    process_tile,
+    read_options,
+    read_tile,
+    tile_encoder,
+    tile_key,
+    tile_routes_params,
+)
+from dashboard_api.db.memcache import AsyncCacheLayer, CacheLayer
+from dashboard_api.ressources.enums import CompareMethod, ImageType
+from dashboard_api.ressources.responses import TileResponse
+
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Depends,
+    Header,
+    HTTPException,
+    Path,
+    Query,
+)
+
+_compare = executors.cpu_render.bind(utils.compare_tiles)
+
+router = APIRouter()
+compare_routes_params = dict(tile_routes_params, tags=["compare"])
+
+
+async def _timed_read(
+    url: str,
+    z: int,
+    x: int,
+    y: int,
+    tilesize: int,
+    options: Dict,
+    cache_client: Optional[CacheLayer],
+):
+    """Read the tile of a COG. Returns (tile, mask) and the read time."""
+    with utils.Timer() as t:
+        data = await read_tile(url, z, x, y, tilesize, options, cache_client)
+    return data, t.elapsed
+
+
+@router.get(r"/compare/{z}/{x}/{y}", **compare_routes_params)
+@router.get(r"/compare/{z}/{x}/{y}\.{ext}", **compare_routes_params)
+@router.get(r"/compare/{z}/{x}/{y}@{scale}x", **compare_routes_params)
+@router.get(r"/compare/{z}/{x}/{y}@{scale}x\.{ext}", **compare_routes_params)
+async def compare(
+    z: int = Path(..., ge=0, le=30, description="Mercator tiles's zoom level"),
+    x: int = Path(..., description="Mercator tiles's column"),
+    y: int = Path(..., description="Mercator tiles's row"),
+    scale: int = Query(
+        1, gt=0, lt=4, description="Tile size scale. 1=256x256, 2=512x512..."
+    ),
+    ext: ImageType = Query(None, description="Output image type. Default is auto."),
+    url: str = Query(..., description="Cloud Optimized GeoTIFF URL."),
+    compare_url: str = Query(
+        ..., description="Cloud Optimized GeoTIFF URL to compare `url` with."
+    ),
+    method: CompareMethod = Query(
+        CompareMethod.difference,
+        description="url - compare_url (difference) or url / compare_url (ratio).",
+    ),
+    bidx: Optional[str] = Query(None, description="Coma (',') delimited band indexes"),
+    nodata: Optional[Union[str, int, float]] = Query(
+        None, description="Overwrite internal Nodata value."
+    ),
+    rescale: Optional[str] = Query(
+        None,
+        description="Coma (',') delimited Min,Max bounds of the result. "
+        "Required except for npy and tif.",
+    ),
+    color_formula: Optional[str] = Query(None, title="rio-color formula"),
+    color_map: Optional[utils.ColorMapName] = Query(
+        None, title="rio-tiler color map name"
+    ),
+    accept: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+    background_tasks: BackgroundTasks = None,
+    cache_client: AsyncCacheLayer = Depends(utils.get_async_cache),
+) -> TileResponse:
+    """
+    Handle /compare requests: difference or ratio of two COGs.
+
+    Both COGs are read concurrently and compared on their raw values, then
+    the result is rescaled and colour-mapped like a regular tile.
+
+    The result is float32, so 8-bit formats need `rescale`.
+
+    """
+    if not rescale and ext not in (ImageType.npy, ImageType.tif):
+        raise HTTPException(
+            status_code=400, detail="rescale is required for 8-bit formats"
+        )
+
+    encoder = Encoder.negotiate(ext, accept)
+    headers = negotiation_headers(ext)
+    key = tile_key(
+        z,
+        x,
+        y,
+        ext,
+        scale,
+        url,
+        bidx,
+        nodata,
+        rescale,
+        color_formula,
+        color_map,
+        encoder,
+    )
+    tilesize = scale * 256
+    options = read_options(bidx, nodata)
+    sync_client = cache_client.sync if cache_client else None
+
+    async def _read():
+        (
+            ((tile, mask), base_elapsed),
+            ((other, other_mask), compare_elapsed),
+        ) = await asyncio.gather(
+            _timed_read(url, z, x, y, tilesize, options, sync_client),
+            _timed_read(compare_url, z, x, y, tilesize, options, sync_client),
+        )
+        timings = [("Read", base_elapsed), ("Read compare", compare_elapsed)]
+
+        with utils.Timer() as t:
+            tile, mask = await _compare(tile, mask, other, other_mask, method.value)
+        timings.append(("Compare", t.elapsed))
+        return tile, mask, timings
+
+    render = partial(
+        process_tile,
+        _read,
+        tile_encoder(x, y, z, tilesize, color_map, encoder),
+        ext,
+        rescale,
+        color_formula,
+        encoder,
+    )
+    return await cached_tile_response(
+        keys.compare_key(key, compare_url, method.value),
+        render,
+        ext,
+        scale,
+        if_none_match,
+        background_tasks,
+        cache_client,
+        headers,
+    )
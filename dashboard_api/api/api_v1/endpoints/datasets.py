@@ -1,12 +1,19 @@
 """Dataset endpoints."""
-from dashboard_api.api import utils
+from typing import Optional
+
+from dashboard_api.api import keys, utils
 from dashboard_api.core import config
 from dashboard_api.db.memcache import CacheLayer
 from dashboard_api.db.static.datasets import datasets
 from dashboard_api.db.static.errors import InvalidIdentifier
 from dashboard_api.models.static import Datasets
+from dashboard_api.ressources.responses import (
+    NotModifiedResponse,
+    etag_match,
+    make_etag,
+)
 
-from fastapi import APIRouter, Depends, HTTPException, Response
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
 
 from starlette.requests import Request
 
@@ -21,10 +28,16 @@ router = APIRouter()
 def get_datasets(
     request: Request,
     response: Response,
+    if_none_match: Optional[str] = Header(None),
     cache_client: CacheLayer = Depends(utils.get_cache),
 ):
     """Return a list of datasets."""
-    dataset_hash = utils.get_hash(spotlight_id="all")
+    dataset_hash = keys.json_key("datasets", _api_url(request))
+    if cache_client and if_none_match:
+        etag = cache_client.get_etag(dataset_hash)
+        if etag_match(if_none_match, etag):
+            return NotModifiedResponse(etag, ttl=0)
+
     content = None
     if cache_client:
         content = cache_client.get_dataset_from_cache(dataset_hash)
@@ -32,16 +45,16 @@ def get_datasets(
             content = Datasets.parse_raw(content)
             response.headers["X-Cache"] = "HIT"
     if not content:
-        scheme = request.url.scheme
-        host = request.headers["host"]
-        if config.API_VERSION_STR:
-            host += config.API_VERSION_STR
-
-        content = datasets.get_all(api_url=f"{scheme}://{host}")
+        content = datasets.get_all(api_url=_api_url(request))
 
         if cache_client and content:
             cache_client.set_dataset_cache(dataset_hash, content)
 
+    etag = make_etag(dataset_hash, content.json().encode())
+    if etag_match(if_none_match, etag):
+        return NotModifiedResponse(etag, ttl=0)
+    response.headers["ETag"] = etag
+
     return content
 
 
@@ -56,11 +69,19 @@ def get_dataset(
     request: Request,
     spotlight_id: str,
     response: Response,
+    if_none_match: Optional[str] = Header(None),
     cache_client: CacheLayer = Depends(utils.get_cache),
 ):
     """Return dataset info for all datasets available for a given spotlight"""
     try:
-        dataset_hash = utils.get_hash(spotlight_id=spotlight_id)
+        dataset_hash = keys.json_key(
+            "datasets", _api_url(request), spotlight_id=spotlight_id
+        )
+        if cache_client and if_none_match:
+            etag = cache_client.get_etag(dataset_hash)
+            if etag_match(if_none_match, etag):
+                return NotModifiedResponse(etag, ttl=0)
+
         content = None
 
         if cache_client:
@@ -69,18 +90,27 @@ def get_dataset(
                 content = Datasets.parse_raw(content)
                 response.headers["X-Cache"] = "HIT"
         if not content:
-            scheme = request.url.scheme
-            host = request.headers["host"]
-            if config.API_VERSION_STR:
-                host += config.API_VERSION_STR
-
-            content = datasets.get(spotlight_id, api_url=f"{scheme}://{host}")
+            content = datasets.get(spotlight_id, api_url=_api_url(request))
 
             if cache_client and content:
                 cache_client.set_dataset_cache(dataset_hash, content)
 
+        etag = make_etag(dataset_hash, content.json().encode())
+        if etag_match(if_none_match, etag):
+            return NotModifiedResponse(etag, ttl=0)
+        response.headers["ETag"] = etag
+
         return content
     except InvalidIdentifier:
         raise HTTPException(
             status_code=404, detail=f"Invalid spotlight identifier: {spotlight_id}"
         )
+
+
+def _api_url(request: Request) -> str:
+    scheme = request.url.scheme
+    host = request.headers["host"]
+    if config.API_VERSION_STR:
+        host += config.API_VERSION_STR
+
+    return f"{scheme}://{host}"
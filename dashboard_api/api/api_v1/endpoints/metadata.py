@@ -1,33 +1,51 @@
 """API metadata."""
 
+import json
 import os
 import re
-from functools import partial
 from typing import Any, Dict, Optional, Union
 from urllib.parse import urlencode
 
 import numpy
-from rio_tiler.io import cogeo
 
-from dashboard_api.api.utils import info as cogInfo
+from dashboard_api.api import cogeo, executors, keys, utils
 from dashboard_api.core import config
+from dashboard_api.db.memcache import AsyncCacheLayer
 from dashboard_api.models.mapbox import TileJSON
 from dashboard_api.ressources.enums import ImageType
+from dashboard_api.ressources.responses import (
+    NotModifiedResponse,
+    etag_match,
+    make_etag,
+)
 
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, Query
 
-from starlette.concurrency import run_in_threadpool
 from starlette.requests import Request
 from starlette.responses import Response
 
-_info = partial(run_in_threadpool, cogInfo)
-_bounds = partial(run_in_threadpool, cogeo.bounds)
-_metadata = partial(run_in_threadpool, cogeo.metadata)
-_spatial_info = partial(run_in_threadpool, cogeo.spatial_info)
+_info = executors.metadata.bind(cogeo.info)
+_bounds = executors.metadata.bind(cogeo.bounds)
+_metadata = executors.metadata.bind(cogeo.metadata)
+_spatial_info = executors.metadata.bind(cogeo.spatial_info)
 
 router = APIRouter()
 
 
+def _json_etag(
+    key: str,
+    content: Dict,
+    cache_client: Optional[AsyncCacheLayer],
+    background_tasks: BackgroundTasks,
+    ttl: int = 3600,
+) -> str:
+    """Return the ETag of a JSON response and keep it as the key validator."""
+    etag = make_etag(key, json.dumps(content, sort_keys=True, default=str).encode())
+    if cache_client:
+        background_tasks.add_task(cache_client.set_etag, key, etag, ttl)
+    return etag
+
+
 @router.get(
     "/tilejson.json",
     response_model=TileJSON,
@@ -53,6 +71,9 @@ async def tilejson(
     tile_scale: int = Query(
         1, gt=0, lt=4, description="Tile size scale. 1=256x256, 2=512x512..."
     ),
+    if_none_match: Optional[str] = Header(None),
+    background_tasks: BackgroundTasks = None,
+    cache_client: AsyncCacheLayer = Depends(utils.get_async_cache),
 ):
     """Handle /tilejson.json requests."""
     scheme = request.url.scheme
@@ -64,7 +85,21 @@ async def tilejson(
     kwargs.pop("tile_format", None)
     kwargs.pop("tile_scale", None)
 
-    qs = urlencode(list(kwargs.items()))
+    # Tile URLs are built from the normalized query so equivalent requests
+    # share the tilejson and the tiles cache entries
+    qs = urlencode(keys.canonical_query(kwargs))
+    _hash = keys.json_key(
+        "tilejson",
+        f"{scheme}://{host}",
+        tile_format=tile_format.value if tile_format else None,
+        tile_scale=str(tile_scale),
+        query=qs,
+    )
+    if cache_client and if_none_match:
+        etag = await cache_client.get_etag(_hash)
+        if etag_match(if_none_match, etag):
+            return NotModifiedResponse(etag)
+
     if tile_format:
         tile_url = (
             f"{scheme}://{host}/{{z}}/{{x}}/{{y}}@{tile_scale}x.{tile_format}?{qs}"
@@ -73,8 +108,7 @@ async def tilejson(
         tile_url = f"{scheme}://{host}/{{z}}/{{x}}/{{y}}@{tile_scale}x?{qs}"
 
     meta = await _spatial_info(url)
-    response.headers["Cache-Control"] = "max-age=3600"
-    return dict(
+    content = dict(
         bounds=meta["bounds"],
         center=meta["center"],
         minzoom=meta["minzoom"],
@@ -83,6 +117,14 @@ async def tilejson(
         tiles=[tile_url],
     )
 
+    etag = _json_etag(_hash, content, cache_client, background_tasks)
+    if etag_match(if_none_match, etag):
+        return NotModifiedResponse(etag)
+
+    response.headers["Cache-Control"] = "max-age=3600"
+    response.headers["ETag"] = etag
+    return content
+
 
 @router.get(
     "/bounds", responses={200: {"description": "Return the bounds of the COG."}}
@@ -100,10 +142,26 @@ async def bounds(
 async def info(
     response: Response,
     url: str = Query(..., description="Cloud Optimized GeoTIFF URL."),
+    if_none_match: Optional[str] = Header(None),
+    background_tasks: BackgroundTasks = None,
+    cache_client: AsyncCacheLayer = Depends(utils.get_async_cache),
 ):
     """Handle /info requests."""
+    _hash = keys.json_key("info", url=url.strip())
+    if cache_client and if_none_match:
+        etag = await cache_client.get_etag(_hash)
+        if etag_match(if_none_match, etag):
+            return NotModifiedResponse(etag)
+
+    content = await _info(url)
+
+    etag = _json_etag(_hash, content, cache_client, background_tasks)
+    if etag_match(if_none_match, etag):
+        return NotModifiedResponse(etag)
+
     response.headers["Cache-Control"] = "max-age=3600"
-    return await _info(url)
+    response.headers["ETag"] = etag
+    return content
 
 
 @router.get(
@@ -0,0 +1,234 @@
+"""API mosaic tiles."""
+
+import asyncio
+import time
+from collections import deque
+from functools import partial
+from typing import Deque, Dict, List, Optional, Tuple, Union
+
+from rio_tiler.errors import TileOutsideBounds
+
+from dashboard_api.api import executors, keys, utils
+from dashboard_api.api.api_v1.endpoints.tiles import (
+    Encoder,
+    cached_tile_response,
+    negative_status,
+    negotiation_headers,
+    process_tile,
+    read_options,
+    read_tile,
+    tile_encoder,
+    tile_key,
+    tile_routes_params,
+)
+from dashboard_api.api.mosaic import MosaicTile, stac_assets
+from dashboard_api.core import config, metrics
+from dashboard_api.db.memcache import AsyncCacheLayer, CacheLayer
+from dashboard_api.ressources.enums import ImageType, PixelSelection
+from dashboard_api.ressources.responses import TileResponse
+
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Depends,
+    Header,
+    HTTPException,
+    Path,
+    Query,
+)
+
+_stac_assets = executors.metadata.bind(stac_assets)
+
+router = APIRouter()
+mosaic_routes_params = dict(tile_routes_params, tags=["mosaic"])
+
+
+async def _read_asset(
+    url: str,
+    z: int,
+    x: int,
+    y: int,
+    tilesize: int,
+    options: Dict,
+    cache_client: Optional[CacheLayer],
+):
+    """Read the tile of an asset. Returns (tile, mask) or None, and the read time."""
+    start = time.perf_counter()
+    try:
+        data = await read_tile(url, z, x, y, tilesize, options, cache_client)
+    except executors.ExecutorBusy:
+        raise
+    except Exception as e:
+        # Assets missing or not covering the tile do not fail the mosaic
+        if negative_status(e) == 500:
+            raise
+        data = None
+
+    return data, time.perf_counter() - start
+
+
+async def read_mosaic(
+    assets: List[str],
+    z: int,
+    x: int,
+    y: int,
+    tilesize: int,
+    pixel_selection: PixelSelection,
+    options: Dict,
+    cache_client: Optional[CacheLayer],
+) -> Tuple[MosaicTile, List[Tuple[str, float]]]:
+    """
+    Read and merge the tiles of `assets`, in priority order.
+
+    At most `MOSAIC_CONCURRENCY` reads are in flight. Results are merged in
+    asset order, and no more reads are issued once the mosaic is complete.
+    Returns the mosaic and the read time of every asset read.
+
+    """
+    mosaic = MosaicTile(pixel_selection)
+    timings = []
+    queued = deque(enumerate(assets))
+    running: Deque[Tuple[int, asyncio.Future]] = deque()
+
+    def _schedule():
+        while queued and len(running) < config.MOSAIC_CONCURRENCY:
+            i, url = queued.popleft()
+            job = _read_asset(url, z, x, y, tilesize, options, cache_client)
+            running.append((i, asyncio.ensure_future(job)))
+
+    _schedule()
+    try:
+        while running:
+            i, job = running[0]
+            data, elapsed = await job
+            running.popleft()
+            metrics.TILE_STAGE_LATENCY.observe(elapsed, "Mosaic-read")
+            timings.append((f"Read {i}", elapsed))
+            if data is not None:
+                mosaic.add(*data)
+            if mosaic.full:
+                break
+            _schedule()
+    finally:
+        for _, job in running:
+            job.cancel()
+
+    return mosaic, timings
+
+
+@router.get(r"/mosaic/{z}/{x}/{y}", **mosaic_routes_params)
+@router.get(r"/mosaic/{z}/{x}/{y}\.{ext}", **mosaic_routes_params)
+@router.get(r"/mosaic/{z}/{x}/{y}@{scale}x", **mosaic_routes_params)
+@router.get(r"/mosaic/{z}/{x}/{y}@{scale}x\.{ext}", **mosaic_routes_params)
+async def mosaic(
+    z: int = Path(..., ge=0, le=30, description="Mercator tiles's zoom level"),
+    x: int = Path(..., description="Mercator tiles's column"),
+    y: int = Path(..., description="Mercator tiles's row"),
+    scale: int = Query(
+        1, gt=0, lt=4, description="Tile size scale. 1=256x256, 2=512x512..."
+    ),
+    ext: ImageType = Query(None, description="Output image type. Default is auto."),
+    url: Optional[List[str]] = Query(
+        None, description="Cloud Optimized GeoTIFF URLs, in priority order."
+    ),
+    collection: Optional[str] = Query(None, description="STAC collection id."),
+    date: Optional[str] = Query(
+        None, description="STAC items date (YYYY-MM-DD) or datetime interval."
+    ),
+    asset: Optional[str] = Query(
+        None, description="STAC item asset name. Default is the first GeoTIFF."
+    ),
+    pixel_selection: PixelSelection = Query(
+        PixelSelection.first, description="Pixel selection method."
+    ),
+    bidx: Optional[str] = Query(None, description="Coma (',') delimited band indexes"),
+    nodata: Optional[Union[str, int, float]] = Query(
+        None, description="Overwrite internal Nodata value."
+    ),
+    rescale: Optional[str] = Query(
+        None, description="Coma (',') delimited Min,Max bounds"
+    ),
+    color_formula: Optional[str] = Query(None, title="rio-color formula"),
+    color_map: Optional[utils.ColorMapName] = Query(
+        None, title="rio-tiler color map name"
+    ),
+    accept: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+    background_tasks: BackgroundTasks = None,
+    cache_client: AsyncCacheLayer = Depends(utils.get_async_cache),
+) -> TileResponse:
+    """
+    Handle /mosaic requests: merge the tiles of several COGs.
+
+    Only the first `MOSAIC_MAX_ASSETS` assets, in priority order, are used.
+
+    """
+    if url:
+        assets = url
+    elif collection and date:
+        try:
+            assets = await _stac_assets(collection, date, z, x, y, asset)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    else:
+        raise HTTPException(
+            status_code=400, detail="Either url or collection and date are required"
+        )
+
+    # Lower priority assets are rarely read: the mosaic is full before them
+    assets = assets[: config.MOSAIC_MAX_ASSETS]
+
+    encoder = Encoder.negotiate(ext, accept)
+    headers = negotiation_headers(ext)
+    key = tile_key(
+        z,
+        x,
+        y,
+        ext,
+        scale,
+        "",
+        bidx,
+        nodata,
+        rescale,
+        color_formula,
+        color_map,
+        encoder,
+    )
+    tilesize = scale * 256
+
+    async def _read():
+        mosaic_tile, timings = await read_mosaic(
+            assets,
+            z,
+            x,
+            y,
+            tilesize,
+            pixel_selection,
+            read_options(bidx, nodata),
+            cache_client.sync if cache_client else None,
+        )
+        if mosaic_tile.empty:
+            raise TileOutsideBounds(f"Tile {z}/{x}/{y} is outside every asset")
+
+        headers["X-Mosaic-Assets"] = f"{mosaic_tile.assets}/{len(assets)}"
+        return (*mosaic_tile.data(), timings)
+
+    render = partial(
+        process_tile,
+        _read,
+        tile_encoder(x, y, z, tilesize, color_map, encoder),
+        ext,
+        rescale,
+        color_formula,
+        encoder,
+    )
+    return await cached_tile_response(
+        keys.mosaic_key(key, assets, pixel_selection.value),
+        render,
+        ext,
+        scale,
+        if_none_match,
+        background_tasks,
+        cache_client,
+        headers,
+    )
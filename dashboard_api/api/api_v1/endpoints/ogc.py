@@ -2,11 +2,7 @@
 
 from urllib.parse import urlencode
 
-import rasterio
-from rasterio import warp
-from rio_tiler import constants
-from rio_tiler.mercator import get_zooms
-
+from dashboard_api.api import cogeo
 from dashboard_api.core import config
 from dashboard_api.ressources.common import mimetype
 from dashboard_api.ressources.enums import ImageType
@@ -50,13 +46,9 @@ def wtms(
     kwargs.pop("tile_scale", None)
     qs = urlencode(list(kwargs.items()))
 
-    with rasterio.open(url) as src_dst:
-        bounds = list(
-            warp.transform_bounds(
-                src_dst.crs, constants.WGS84_CRS, *src_dst.bounds, densify_pts=21
-            )
-        )
-        minzoom, maxzoom = get_zooms(src_dst)
+    meta = cogeo.spatial_info(url)
+    bounds = list(meta["bounds"])
+    minzoom, maxzoom = meta["minzoom"], meta["maxzoom"]
 
     media_type = mimetype[tile_format.value]
     tilesize = tile_scale * 256
@@ -0,0 +1,148 @@
+"""API point values."""
+
+import asyncio
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy
+from rasterio.errors import RasterioIOError
+
+from dashboard_api.api import cogeo, executors, utils
+from dashboard_api.api.api_v1.endpoints.tiles import negative_status, read_options
+from dashboard_api.core import config
+from dashboard_api.db.memcache import CacheLayer
+from dashboard_api.models.point import PointRequest
+from dashboard_api.ressources import arrays
+from dashboard_api.ressources.common import mimetype
+from dashboard_api.ressources.enums import ImageType, TimeUnit
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from starlette.responses import JSONResponse, Response
+
+router = APIRouter()
+
+responses = {
+    200: {
+        "content": {"application/json": {}, "application/x-binary": {}},
+        "description": "Return point values.",
+    }
+}
+
+
+def read_points(
+    url: str,
+    points: List[Tuple[float, float]],
+    options: Dict,
+    cache_client: Optional[CacheLayer],
+) -> Optional[Tuple[numpy.ndarray, numpy.ndarray]]:
+    """Read point values, None when the COG does not exist."""
+    try:
+        return cogeo.points(url, points, cache_client=cache_client, **options)
+    except RasterioIOError as e:
+        if negative_status(e) != 404:
+            raise
+        return None
+
+
+_points = executors.raster_read.bind(read_points)
+
+
+def columns(values: numpy.ndarray, valid: numpy.ndarray) -> List[List]:
+    """Return (count, points) values as lists, None where invalid."""
+    return [
+        [v if ok else None for v, ok in zip(band, valid)] for band in values.tolist()
+    ]
+
+
+@router.post(r"/point", responses=responses, tags=["point"])
+@router.post(r"/point\.{ext}", responses=responses, tags=["point"])
+async def point(
+    body: PointRequest,
+    ext: ImageType = Query(
+        None, description="npy for a binary array. Default is JSON."
+    ),
+    url: str = Query(
+        ..., description="Cloud Optimized GeoTIFF URL, with a {date} for dates."
+    ),
+    time_unit: TimeUnit = Query(TimeUnit.day, description="Dataset time unit."),
+    date_format: Optional[str] = Query(
+        None, description="strftime format of {date}. Default from time unit."
+    ),
+    bidx: Optional[str] = Query(None, description="Coma (',') delimited band indexes"),
+    nodata: Optional[Union[str, int, float]] = Query(
+        None, description="Overwrite internal Nodata value."
+    ),
+    cache_client: CacheLayer = Depends(utils.get_cache),
+) -> Response:
+    """
+    Handle /point requests: the values of many lon/lat points at many dates.
+
+    Points are grouped by internal block of the COG and every block is read
+    once, then cached. Dates are read concurrently.
+
+    The JSON response is columnar: `values[band][point]`, or
+    `values[date][band][point]` when dates are requested, null where there
+    is no data. The npy response is a (band, date, point) array, with one
+    date when none is requested (see docs/array-format.md).
+
+    """
+    if ext is not None and ext != ImageType.npy:
+        raise HTTPException(status_code=400, detail=f"Unsupported format {ext.value}")
+    if len(body.points) > config.POINT_MAX_POINTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many points, maximum is {config.POINT_MAX_POINTS}",
+        )
+
+    urls = [url]
+    if body.dates:
+        if len(body.dates) > config.POINT_MAX_DATES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Too many dates, maximum is {config.POINT_MAX_DATES}",
+            )
+        if "{date}" not in url:
+            raise HTTPException(status_code=400, detail="url must contain {date}")
+        try:
+            dates = [utils.parse_date(d) for d in body.dates]
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        date_format = date_format or utils.DATE_FORMATS[time_unit.value]
+        urls = [url.replace("{date}", d.strftime(date_format)) for d in dates]
+
+    options = read_options(bidx, nodata)
+    semaphore = asyncio.Semaphore(config.POINT_CONCURRENCY)
+
+    async def _read(url: str) -> Optional[Tuple[numpy.ndarray, numpy.ndarray]]:
+        async with semaphore:
+            return await _points(url, body.points, options, cache_client)
+
+    jobs = [asyncio.ensure_future(_read(u)) for u in urls]
+    try:
+        results = await asyncio.gather(*jobs)
+    finally:
+        for job in jobs:
+            job.cancel()
+
+    found = [result for result in results if result is not None]
+    if not found:
+        raise HTTPException(status_code=404, detail="COG not found")
+
+    # Dates without a COG have no valid value
+    values, _ = found[0]
+    missing = (numpy.zeros_like(values), numpy.zeros(len(body.points), bool))
+    results = [result if result is not None else missing for result in results]
+
+    if ext == ImageType.npy:
+        stack = numpy.stack([values for values, _ in results], axis=1)
+        mask = numpy.stack([valid for _, valid in results]).astype("uint8") * 255
+        content = arrays.encode(stack, mask, config.ARRAY_COMPRESSION_LEVEL)
+        return Response(content, media_type=mimetype[ext.value])
+
+    if body.dates:
+        content = dict(
+            dates=body.dates, values=[columns(*result) for result in results]
+        )
+    else:
+        content = dict(values=columns(*results[0]))
+    return JSONResponse(content)
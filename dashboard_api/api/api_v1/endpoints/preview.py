@@ -0,0 +1,230 @@
+"""API preview and bounding box images."""
+
+from functools import partial
+from typing import Awaitable, Callable, Optional, Tuple, Union
+
+import numpy
+from rio_tiler.utils import render
+
+from dashboard_api.api import cogeo, executors, keys, utils
+from dashboard_api.api.api_v1.endpoints.tiles import (
+    Encoder,
+    cached_tile_response,
+    get_tile_colormap,
+    negotiation_headers,
+    process_tile,
+    read_options,
+    tile_routes_params,
+)
+from dashboard_api.core import config
+from dashboard_api.db.memcache import AsyncCacheLayer
+from dashboard_api.ressources import arrays
+from dashboard_api.ressources.common import drivers
+from dashboard_api.ressources.enums import ImageType
+from dashboard_api.ressources.responses import TileResponse
+
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Depends,
+    Header,
+    HTTPException,
+    Path,
+    Query,
+)
+
+from starlette.responses import Response
+
+_preview = executors.raster_read.bind(cogeo.preview)
+_part = executors.raster_read.bind(cogeo.part)
+
+router = APIRouter()
+preview_routes_params = dict(tile_routes_params, tags=["preview"])
+
+
+def format_image(
+    tile: numpy.ndarray,
+    mask: numpy.ndarray,
+    ext: ImageType,
+    colormap: Optional[numpy.ndarray] = None,
+    encoder: Encoder = Encoder(),
+) -> bytes:
+    """Encode a post-processed image, applying the colormap lookup table if any."""
+    if ext == ImageType.npy:
+        return arrays.encode(tile, mask, config.ARRAY_COMPRESSION_LEVEL)
+
+    if colormap is not None:
+        tile, mask = utils.apply_colormap(tile, mask, colormap)
+
+    options = encoder.options(ext, mask)
+    return render(tile, mask, img_format=drivers[ext.value], **options)
+
+
+_format = executors.cpu_render.bind(format_image)
+
+
+async def render_image(
+    _hash: str,
+    read: Callable[[], Awaitable[Tuple[numpy.ndarray, numpy.ndarray]]],
+    ext: Optional[ImageType],
+    rescale: Optional[str],
+    color_formula: Optional[str],
+    color_map: Optional[utils.ColorMapName],
+    encoder: Encoder,
+    if_none_match: Optional[str],
+    background_tasks: BackgroundTasks,
+    cache_client: Optional[AsyncCacheLayer],
+) -> Response:
+    """Read, post-process and encode an image through the tile cache tiers."""
+    if ext == ImageType.tif:
+        raise HTTPException(status_code=400, detail="tif images are not supported")
+
+    async def _read():
+        with utils.Timer() as t:
+            tile, mask = await read()
+        return tile, mask, [("Read", t.elapsed)]
+
+    colormap = get_tile_colormap(color_map)
+
+    async def _encode(tile: numpy.ndarray, mask: numpy.ndarray, ext: ImageType):
+        return await _format(tile, mask, ext, colormap=colormap, encoder=encoder)
+
+    render = partial(process_tile, _read, _encode, ext, rescale, color_formula, encoder)
+    return await cached_tile_response(
+        _hash,
+        render,
+        ext,
+        1,
+        if_none_match,
+        background_tasks,
+        cache_client,
+        negotiation_headers(ext),
+    )
+
+
+@router.get(r"/preview", **preview_routes_params)
+@router.get(r"/preview\.{ext}", **preview_routes_params)
+async def preview(
+    ext: ImageType = Query(None, description="Output image type. Default is auto."),
+    url: str = Query(..., description="Cloud Optimized GeoTIFF URL."),
+    max_size: int = Query(
+        1024, gt=0, le=config.PREVIEW_MAX_SIZE, description="Largest image side."
+    ),
+    bidx: Optional[str] = Query(None, description="Coma (',') delimited band indexes"),
+    nodata: Optional[Union[str, int, float]] = Query(
+        None, description="Overwrite internal Nodata value."
+    ),
+    rescale: Optional[str] = Query(
+        None, description="Coma (',') delimited Min,Max bounds"
+    ),
+    color_formula: Optional[str] = Query(None, title="rio-color formula"),
+    color_map: Optional[utils.ColorMapName] = Query(
+        None, title="rio-tiler color map name"
+    ),
+    accept: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+    background_tasks: BackgroundTasks = None,
+    cache_client: AsyncCacheLayer = Depends(utils.get_async_cache),
+) -> TileResponse:
+    """
+    Handle /preview requests: a whole COG, at most `max_size` pixels.
+
+    The read is decimated to the output size, so GDAL reads the internal
+    overview closest to it instead of the full resolution data.
+
+    """
+    encoder = Encoder.negotiate(ext, accept)
+    _hash = keys.image_key(
+        "preview",
+        url,
+        None,
+        max_size,
+        ext,
+        bidx,
+        nodata,
+        rescale,
+        color_formula,
+        color_map,
+        encoder.key,
+    )
+    read = partial(_preview, url, max_size=max_size, **read_options(bidx, nodata))
+    return await render_image(
+        _hash,
+        read,
+        ext,
+        rescale,
+        color_formula,
+        color_map,
+        encoder,
+        if_none_match,
+        background_tasks,
+        cache_client,
+    )
+
+
+@router.get(r"/bbox/{minx},{miny},{maxx},{maxy}", **preview_routes_params)
+@router.get(r"/bbox/{minx},{miny},{maxx},{maxy}\.{ext}", **preview_routes_params)
+async def bbox(
+    minx: float = Path(..., ge=-180, le=180, description="Bounding box min X"),
+    miny: float = Path(..., ge=-85.06, le=85.06, description="Bounding box min Y"),
+    maxx: float = Path(..., ge=-180, le=180, description="Bounding box max X"),
+    maxy: float = Path(..., ge=-85.06, le=85.06, description="Bounding box max Y"),
+    ext: ImageType = Query(None, description="Output image type. Default is auto."),
+    url: str = Query(..., description="Cloud Optimized GeoTIFF URL."),
+    max_size: int = Query(
+        1024, gt=0, le=config.PREVIEW_MAX_SIZE, description="Largest image side."
+    ),
+    bidx: Optional[str] = Query(None, description="Coma (',') delimited band indexes"),
+    nodata: Optional[Union[str, int, float]] = Query(
+        None, description="Overwrite internal Nodata value."
+    ),
+    rescale: Optional[str] = Query(
+        None, description="Coma (',') delimited Min,Max bounds"
+    ),
+    color_formula: Optional[str] = Query(None, title="rio-color formula"),
+    color_map: Optional[utils.ColorMapName] = Query(
+        None, title="rio-tiler color map name"
+    ),
+    accept: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+    background_tasks: BackgroundTasks = None,
+    cache_client: AsyncCacheLayer = Depends(utils.get_async_cache),
+) -> TileResponse:
+    """
+    Handle /bbox requests: a WGS84 bounding box of a COG, in Web Mercator.
+
+    As for /preview, the image is at most `max_size` pixels and read from
+    the matching overview whatever the size of the bounding box.
+
+    """
+    if minx >= maxx or miny >= maxy:
+        raise HTTPException(status_code=400, detail="Invalid bounding box")
+
+    bounds = (minx, miny, maxx, maxy)
+    encoder = Encoder.negotiate(ext, accept)
+    _hash = keys.image_key(
+        "bbox",
+        url,
+        bounds,
+        max_size,
+        ext,
+        bidx,
+        nodata,
+        rescale,
+        color_formula,
+        color_map,
+        encoder.key,
+    )
+    read = partial(_part, url, bounds, max_size, **read_options(bidx, nodata))
+    return await render_image(
+        _hash,
+        read,
+        ext,
+        rescale,
+        color_formula,
+        color_map,
+        encoder,
+        if_none_match,
+        background_tasks,
+        cache_client,
+    )
@@ -1,12 +1,19 @@
 """sites endpoint."""
 
-from dashboard_api.api import utils
+from typing import Optional
+
+from dashboard_api.api import keys, utils
 from dashboard_api.db.static.sites import sites as sites_manager
 from dashboard_api.db.memcache import CacheLayer
 from dashboard_api.core import config
 from dashboard_api.models.static import Site, Sites
+from dashboard_api.ressources.responses import (
+    NotModifiedResponse,
+    etag_match,
+    make_etag,
+)
 
-from fastapi import APIRouter, Depends, HTTPException, Response, Request
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, Request
 
 router = APIRouter()
 
@@ -19,25 +26,32 @@ router = APIRouter()
 def get_sites(
         request: Request,
         response: Response,
+        if_none_match: Optional[str] = Header(None),
         cache_client: CacheLayer = Depends(utils.get_cache)):
     """Return list of sites."""
-    sites_hash = utils.get_hash(site_id="_all")
+    sites_hash = keys.json_key("sites", _api_url(request))
+    if cache_client and if_none_match:
+        etag = cache_client.get_etag(sites_hash)
+        if etag_match(if_none_match, etag):
+            return NotModifiedResponse(etag, ttl=0)
+
     sites = None
     if cache_client:
         sites = cache_client.get_dataset_from_cache(sites_hash)
         if sites:
+            sites = Sites.parse_raw(sites)
             response.headers["X-Cache"] = "HIT"
     if not sites:
-        scheme = request.url.scheme
-        host = request.headers["host"]
-        if config.API_VERSION_STR:
-            host += config.API_VERSION_STR
-
-        sites = sites_manager.get_all(api_url=f"{scheme}://{host}")
+        sites = sites_manager.get_all(api_url=_api_url(request))
 
         if cache_client and sites:
             cache_client.set_dataset_cache(sites_hash, sites, 60)
 
+    etag = make_etag(sites_hash, sites.json().encode())
+    if etag_match(if_none_match, etag):
+        return NotModifiedResponse(etag, ttl=0)
+    response.headers["ETag"] = etag
+
     return sites
 
 
@@ -50,16 +64,23 @@ def get_site(
     request: Request,
     site_id: str,
     response: Response,
+    if_none_match: Optional[str] = Header(None),
     cache_client: CacheLayer = Depends(utils.get_cache),
 ):
     """Return site info."""
-    site_hash = utils.get_hash(site_id=site_id)
+    site_hash = keys.json_key("sites", _api_url(request), site_id=site_id)
+    if cache_client and if_none_match:
+        etag = cache_client.get_etag(site_hash)
+        if etag_match(if_none_match, etag):
+            return NotModifiedResponse(etag, ttl=0)
+
     site = None
 
     if cache_client:
         site = cache_client.get_dataset_from_cache(site_hash)
 
     if site:
+        site = Site.parse_raw(site)
         response.headers["X-Cache"] = "HIT"
     else:
         site = sites_manager.get(site_id, _api_url(request))
@@ -71,6 +92,11 @@ def get_site(
             status_code=404, detail=f"Non-existant site identifier: {site_id}"
         )
 
+    etag = make_etag(site_hash, site.json().encode())
+    if etag_match(if_none_match, etag):
+        return NotModifiedResponse(etag, ttl=0)
+    response.headers["ETag"] = etag
+
     return site
     
 
@@ -1,29 +1,65 @@
 """API tiles."""
 
+import asyncio
 import re
-from functools import partial
-from io import BytesIO
-from typing import Any, Dict, Optional, Union
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+)
 
 import numpy
-from rio_tiler.colormap import get_colormap
-from rio_tiler.io import cogeo
+from rasterio.errors import RasterioIOError
+from rio_tiler import reader
+from rio_tiler.errors import TileOutsideBounds
 from rio_tiler.profiles import img_profiles
 from rio_tiler.utils import geotiff_options, render
 
-from dashboard_api.api import utils
-from dashboard_api.db.memcache import CacheLayer
+from dashboard_api.api import cogeo, executors, keys, utils
+from dashboard_api.core import config, metrics
+from dashboard_api.db.memcache import AsyncCacheLayer, CacheLayer
+from dashboard_api.models.tiles import TileBatchRequest
+from dashboard_api.ressources import arrays
 from dashboard_api.ressources.common import drivers, mimetype
 from dashboard_api.ressources.enums import ImageType
-from dashboard_api.ressources.responses import TileResponse
+from dashboard_api.ressources.responses import (
+    NotModifiedResponse,
+    TileResponse,
+    accepts,
+    etag_match,
+    make_etag,
+)
+
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Depends,
+    Header,
+    HTTPException,
+    Path,
+    Query,
+)
+
+from starlette.responses import Response, StreamingResponse
 
-from fastapi import APIRouter, Depends, Path, Query
+_tile = executors.raster_read.bind(cogeo.tile)
+_footprint = executors.raster_read.bind(cogeo.footprints.load)
+_postprocess = executors.cpu_render.bind(utils.postprocess)
 
-from starlette.concurrency import run_in_threadpool
+_batch_executor = ThreadPoolExecutor(max_workers=config.BATCH_MAX_WORKERS)
+metrics.register_executor("batch", _batch_executor)
 
-_tile = partial(run_in_threadpool, cogeo.tile)
-_render = partial(run_in_threadpool, render)
-_postprocess = partial(run_in_threadpool, utils.postprocess)
+# Batch archive record header: z, x, y, status, ext, body length (big-endian)
+BATCH_RECORD = struct.Struct(">BIIH4sI")
 
 
 router = APIRouter()
@@ -44,6 +80,604 @@ tile_routes_params: Dict[str, Any] = dict(
 )
 
 
+def tile_key(
+    z: int,
+    x: int,
+    y: int,
+    ext: Optional[ImageType],
+    scale: int,
+    url: str,
+    bidx: Optional[str],
+    nodata: Optional[Union[str, int, float]],
+    rescale: Optional[str],
+    color_formula: Optional[str],
+    color_map: Optional[utils.ColorMapName],
+    encoder: Optional["Encoder"] = None,
+) -> keys.TileKey:
+    """Return the canonical cache key of a rendered tile."""
+    return keys.TileKey.create(
+        z,
+        x,
+        y,
+        ext,
+        scale,
+        url,
+        bidx,
+        nodata,
+        rescale,
+        color_formula,
+        color_map,
+        encoder.key if encoder else None,
+    )
+
+
+def cache_tile(
+    cache_client: Optional[CacheLayer],
+    key: keys.TileKey,
+    content: bytes,
+    ext: ImageType,
+):
+    """Cache a tile, under the key of the request (auto-format tiles included)."""
+    if not cache_client or not content:
+        return
+
+    cache_client.set_image_cache(key.hash, (content, ext))
+
+
+def read_options(
+    bidx: Optional[str], nodata: Optional[Union[str, int, float]]
+) -> Dict[str, Any]:
+    """Translate bidx/nodata query parameters to reader options."""
+    indexes = tuple(int(s) for s in re.findall(r"\d+", bidx)) if bidx else None
+
+    if nodata is not None:
+        nodata = numpy.nan if nodata == "nan" else float(nodata)
+
+    return dict(indexes=indexes, nodata=nodata)
+
+
+def get_tile_colormap(
+    color_map: Optional[utils.ColorMapName],
+) -> Optional[numpy.ndarray]:
+    """Return the compiled colormap lookup table for a color map name."""
+    if not color_map:
+        return None
+
+    return utils.get_colormap_lut(color_map.value)
+
+
+@lru_cache(maxsize=32)
+def empty_tile(ext: ImageType, tilesize: int) -> Optional[bytes]:
+    """Return a pre-encoded transparent tile, None for formats without alpha."""
+    if ext not in (ImageType.png, ImageType.webp):
+        return None
+
+    driver = drivers[ext.value]
+    return render(
+        numpy.zeros((1, tilesize, tilesize), dtype=numpy.uint8),
+        numpy.zeros((tilesize, tilesize), dtype=numpy.uint8),
+        img_format=driver,
+        **img_profiles.get(driver.lower(), {}),
+    )
+
+
+def negative_status(exc: Exception) -> int:
+    """Return the negative cache status of a failed tile read."""
+    if isinstance(exc, TileOutsideBounds):
+        return 204
+    if isinstance(exc, RasterioIOError) and any(
+        msg in str(exc) for msg in ("does not exist", "No such file", "404")
+    ):
+        return 404
+    return 500
+
+
+def negative_ttl(status: int) -> int:
+    """Return how long to cache a failed tile read, 0 for read errors."""
+    # Errors may be transient (S3 throttling, timeouts): never cached
+    return config.NEGATIVE_CACHE_TTL if status in (204, 404) else 0
+
+
+def set_negative(cache_client: Optional[CacheLayer], _hash: str, status: int):
+    """Cache a failed tile read."""
+    if cache_client and negative_ttl(status):
+        cache_client.set_negative(_hash, status, negative_ttl(status))
+
+
+def negative_response(
+    status: int, ext: Optional[ImageType], scale: int, headers: Dict[str, str]
+) -> Response:
+    """Return the response of an empty, missing or failed tile."""
+    if status == 204:
+        ext = ext or ImageType.png
+        content = empty_tile(ext, scale * 256)
+        headers["X-Tile"] = "empty"
+        if content is None:
+            return Response(status_code=204, headers=headers)
+        return TileResponse(content, media_type=mimetype[ext.value], headers=headers)
+
+    detail = "Tile not found" if status == 404 else "Tile could not be read"
+    raise HTTPException(status_code=status, detail=detail, headers=headers)
+
+
+class Encoder(NamedTuple):
+    """Output format negotiation and WebP encoder settings of a tile request."""
+
+    webp: bool = False
+    quality: Optional[int] = None
+    effort: Optional[int] = None
+
+    @classmethod
+    def negotiate(
+        cls,
+        ext: Optional[ImageType],
+        accept: Optional[str],
+        quality: Optional[int] = None,
+        effort: Optional[int] = None,
+    ) -> "Encoder":
+        """Return the settings of a request, WebP in auto mode if accepted."""
+        webp = bool(
+            ext is None and config.WEBP_NEGOTIATION and accepts(accept, "image/webp")
+        )
+        if webp or ext == ImageType.webp:
+            return cls(webp, quality, effort)
+        return cls()
+
+    @property
+    def key(self) -> Optional[Tuple]:
+        """Return the cache key part of the settings, None for the defaults."""
+        return tuple(self) if self != Encoder() else None
+
+    def resolve(self, mask: numpy.ndarray) -> ImageType:
+        """Return the format of an auto mode tile."""
+        if self.webp:
+            return ImageType.webp
+        return ImageType.jpg if mask.all() else ImageType.png
+
+    def options(self, ext: ImageType, mask: numpy.ndarray) -> Dict[str, Any]:
+        """Return the driver creation options of a tile."""
+        options = dict(img_profiles.get(drivers[ext.value].lower(), {}))
+        if ext == ImageType.webp:
+            options.update(
+                quality=self.quality or config.WEBP_QUALITY,
+                method=config.WEBP_EFFORT if self.effort is None else self.effort,
+            )
+            if self.webp:
+                # Lossless keeps the edges of partial tiles exact
+                options["lossless"] = not mask.all()
+        return options
+
+
+def negotiation_headers(ext: Optional[ImageType]) -> Dict[str, str]:
+    """Return the headers of a tile response, Vary when its format is negotiated."""
+    if ext is None and config.WEBP_NEGOTIATION:
+        return {"Vary": "Accept"}
+    return {}
+
+
+def format_tile(
+    tile: numpy.ndarray,
+    mask: numpy.ndarray,
+    ext: ImageType,
+    x: int,
+    y: int,
+    z: int,
+    tilesize: int,
+    colormap: Optional[numpy.ndarray] = None,
+    encoder: Encoder = Encoder(),
+) -> bytes:
+    """Encode a post-processed tile, applying the colormap lookup table if any."""
+    if ext == ImageType.npy:
+        return arrays.encode(tile, mask, config.ARRAY_COMPRESSION_LEVEL)
+
+    if colormap is not None:
+        tile, mask = utils.apply_colormap(tile, mask, colormap)
+
+    driver = drivers[ext.value]
+    options = encoder.options(ext, mask)
+    if ext == ImageType.tif:
+        options = geotiff_options(x, y, z, tilesize=tilesize)
+
+    return render(tile, mask, img_format=driver, **options)
+
+
+_format = executors.cpu_render.bind(format_tile)
+
+
+def render_metatile(
+    z: int,
+    x: int,
+    y: int,
+    scale: int,
+    ext: Optional[ImageType],
+    url: str,
+    bidx: Optional[str],
+    nodata: Optional[Union[str, int, float]],
+    rescale: Optional[str],
+    color_formula: Optional[str],
+    color_map: Optional[utils.ColorMapName],
+    cache_client: Optional[CacheLayer],
+    size: int,
+    encoder: Encoder = Encoder(),
+) -> Tuple[Dict[Tuple[int, int], Tuple[bytes, ImageType]], List[Tuple[str, float]]]:
+    """
+    Render the `size`x`size` block of tiles containing z/x/y.
+
+    Every sub-tile is read with `reader.tile` from one dataset handle, so
+    that the internal blocks and overviews are fetched and decoded once and
+    the sub-tiles are identical to single tiles. Sub-tiles covering the
+    dataset are post-processed, encoded and written to the cache under
+    their own tile key, except z/x/y, cached by the caller. Returns the
+    body and ext of every sub-tile with the timings of the whole metatile.
+
+    """
+    tilesize = scale * 256
+    minx, miny = x - x % size, y - y % size
+    options = read_options(bidx, nodata)
+
+    reads = {}
+    with utils.Timer() as t:
+        with cogeo.pool.checkout(url) as src_dst:
+            for ty in range(miny, miny + size):
+                for tx in range(minx, minx + size):
+                    try:
+                        reads[(tx, ty)] = reader.tile(
+                            src_dst, tx, ty, z, tilesize, **options
+                        )
+                    except TileOutsideBounds:
+                        continue
+    timings = [("Read", t.elapsed)]
+
+    colormap = get_tile_colormap(color_map)
+    postprocess_time = format_time = 0.0
+    tiles = {}
+    for (tx, ty), (data, mask) in reads.items():
+        sub_ext = ext or encoder.resolve(mask)
+
+        with utils.Timer() as t:
+            tile = utils.postprocess(
+                data, mask, rescale=rescale, color_formula=color_formula
+            )
+        postprocess_time += t.elapsed
+
+        with utils.Timer() as t:
+            body = format_tile(
+                tile,
+                mask,
+                sub_ext,
+                tx,
+                ty,
+                z,
+                tilesize,
+                colormap=colormap,
+                encoder=encoder,
+            )
+        format_time += t.elapsed
+
+        tiles[(tx, ty)] = body, sub_ext
+        if (tx, ty) != (x, y):
+            cache_tile(
+                cache_client,
+                tile_key(
+                    z,
+                    tx,
+                    ty,
+                    ext,
+                    scale,
+                    url,
+                    bidx,
+                    nodata,
+                    rescale,
+                    color_formula,
+                    color_map,
+                    encoder,
+                ),
+                body,
+                sub_ext,
+            )
+
+    timings.append(("Post-process", postprocess_time))
+    timings.append(("Format", format_time))
+    return tiles, timings
+
+
+# Reads dominate the rendering of a metatile
+_metatile = executors.raster_read.bind(render_metatile)
+
+# Identical concurrent tile requests of this process share one rendering
+inflight = utils.SingleFlight()
+
+Timings = List[Tuple[str, float]]
+
+
+def tile_encoder(
+    x: int,
+    y: int,
+    z: int,
+    tilesize: int,
+    color_map: Optional[utils.ColorMapName],
+    encoder: Encoder = Encoder(),
+) -> Callable[[numpy.ndarray, numpy.ndarray, ImageType], Awaitable[bytes]]:
+    """Return the `process_tile` encode function of a tile."""
+    colormap = get_tile_colormap(color_map)
+
+    async def _encode(tile: numpy.ndarray, mask: numpy.ndarray, ext: ImageType):
+        return await _format(
+            tile, mask, ext, x, y, z, tilesize, colormap=colormap, encoder=encoder
+        )
+
+    return _encode
+
+
+async def check_footprint(
+    url: str, z: int, x: int, y: int, cache_client: Optional[CacheLayer]
+):
+    """Raise TileOutsideBounds, without opening the COG, outside its footprint."""
+    footprint = cogeo.footprints.get(url) or await _footprint(url, cache_client)
+    if not cogeo.within_footprint(footprint, z, x, y):
+        raise TileOutsideBounds(f"Tile {z}/{x}/{y} is outside {url}")
+
+
+async def read_tile(
+    url: str,
+    z: int,
+    x: int,
+    y: int,
+    tilesize: int,
+    options: Dict[str, Any],
+    cache_client: Optional[CacheLayer],
+) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    """Read the tile of a COG, raising TileOutsideBounds outside its footprint."""
+    await check_footprint(url, z, x, y, cache_client)
+    return await _tile(url, x, y, z, tilesize=tilesize, **options)
+
+
+async def process_tile(
+    read: Callable[[], Awaitable[Tuple[numpy.ndarray, numpy.ndarray, Timings]]],
+    encode: Callable[[numpy.ndarray, numpy.ndarray, ImageType], Awaitable[bytes]],
+    ext: Optional[ImageType],
+    rescale: Optional[str],
+    color_formula: Optional[str],
+    encoder: Encoder = Encoder(),
+) -> Tuple[bytes, ImageType, Timings]:
+    """
+    Read, post-process and encode a tile.
+
+    `read` returns the data, mask and read timings. Returns the body, ext
+    and timings of every stage.
+
+    """
+    tile, mask, timings = await read()
+    if not ext:
+        ext = encoder.resolve(mask)
+
+    with utils.Timer() as t:
+        tile = await _postprocess(
+            tile, mask, rescale=rescale, color_formula=color_formula
+        )
+    timings.append(("Post-process", t.elapsed))
+
+    with utils.Timer() as t:
+        content = await encode(tile, mask, ext)
+    timings.append(("Format", t.elapsed))
+
+    return content, ext, timings
+
+
+async def _render_tile(
+    z: int,
+    x: int,
+    y: int,
+    scale: int,
+    ext: Optional[ImageType],
+    url: str,
+    bidx: Optional[str],
+    nodata: Optional[Union[str, int, float]],
+    rescale: Optional[str],
+    color_formula: Optional[str],
+    color_map: Optional[utils.ColorMapName],
+    cache_client: Optional[CacheLayer],
+    encoder: Encoder = Encoder(),
+) -> Tuple[bytes, ImageType, Timings]:
+    """
+    Render a tile, with the metatile containing it when `METATILE_SIZE` > 1.
+
+    Concurrent requests for tiles of one metatile share its rendering; the
+    timings are only returned to the request that rendered it.
+
+    """
+    await check_footprint(url, z, x, y, cache_client)
+    if config.METATILE_SIZE > 1:
+        size = min(config.METATILE_SIZE, 2 ** z)
+        key = tile_key(
+            z,
+            x - x % size,
+            y - y % size,
+            ext,
+            scale,
+            url,
+            bidx,
+            nodata,
+            rescale,
+            color_formula,
+            color_map,
+            encoder,
+        )
+        (tiles, timings), shared = await inflight.do(
+            keys.metatile_key(key, size),
+            partial(
+                _metatile,
+                z,
+                x,
+                y,
+                scale,
+                ext,
+                url,
+                bidx,
+                nodata,
+                rescale,
+                color_formula,
+                color_map,
+                cache_client,
+                size,
+                encoder,
+            ),
+        )
+        if (x, y) not in tiles:
+            raise TileOutsideBounds(f"Tile {z}/{x}/{y} is outside {url}")
+        content, tile_ext = tiles[(x, y)]
+        return content, tile_ext, [] if shared else timings
+
+    tilesize = scale * 256
+
+    async def _read():
+        with utils.Timer() as t:
+            tile, mask = await _tile(
+                url, x, y, z, tilesize=tilesize, **read_options(bidx, nodata)
+            )
+        return tile, mask, [("Read", t.elapsed)]
+
+    return await process_tile(
+        _read,
+        tile_encoder(x, y, z, tilesize, color_map, encoder),
+        ext,
+        rescale,
+        color_formula,
+        encoder,
+    )
+
+
+async def _render_locked(
+    _hash: str,
+    render: Callable[[], Awaitable[Tuple[bytes, ImageType, Timings]]],
+    cache_client: Optional[AsyncCacheLayer],
+) -> Tuple[bytes, ImageType, Timings]:
+    """
+    Render a tile and record its stage timings.
+
+    When `TILE_LOCK_TIMEOUT` is set, a memcached lock keyed by the tile hash
+    makes workers of other processes wait for the cached result instead of
+    rendering the same tile, and the tile is cached before the lock is
+    released. Otherwise the caller caches it once the response is sent.
+
+    """
+    locked = False
+    if cache_client and config.TILE_LOCK_TIMEOUT:
+        locked = await cache_client.acquire_lock(_hash, config.TILE_LOCK_TIMEOUT)
+        if not locked:
+            content, cached_ext = await _wait_for_tile(
+                cache_client, _hash, config.TILE_LOCK_TIMEOUT
+            )
+            if content:
+                return content, cached_ext, []
+
+    try:
+        content, ext, timings = await render()
+
+        for stage, elapsed in timings:
+            metrics.TILE_STAGE_LATENCY.observe(elapsed, stage)
+
+        if cache_client and config.TILE_LOCK_TIMEOUT:
+            await cache_client.set_image_cache(_hash, (content, ext))
+
+    finally:
+        if locked:
+            await cache_client.release_lock(_hash)
+
+    return content, ext, timings
+
+
+async def _wait_for_tile(
+    cache_client: AsyncCacheLayer, _hash: str, timeout: int, interval: float = 0.05
+) -> Tuple[Optional[bytes], Optional[ImageType]]:
+    """Poll the cache for a tile rendered by another process."""
+    loop = asyncio.get_event_loop()
+    deadline = loop.time() + timeout
+    while loop.time() < deadline:
+        await asyncio.sleep(interval)
+        content, ext = await cache_client.get_image_from_cache(_hash)
+        if content:
+            return content, ext
+
+    return None, None
+
+
+async def cached_tile_response(
+    _hash: str,
+    render: Callable[[], Awaitable[Tuple[bytes, ImageType, Timings]]],
+    ext: Optional[ImageType],
+    scale: int,
+    if_none_match: Optional[str],
+    background_tasks: BackgroundTasks,
+    cache_client: Optional[AsyncCacheLayer],
+    headers: Optional[Dict[str, str]] = None,
+) -> Response:
+    """
+    Serve a tile through the cache tiers, rendering it on a miss.
+
+    Cached tiles, and empty or missing tiles, are served from the cache, with
+    a 304 when they match `if_none_match`. Otherwise `render`
+    (see `process_tile`) runs once for identical concurrent requests and the
+    tile is cached after the response is sent. Exceptions of `render` are
+    empty, missing or failed tiles (see `negative_status`); failed tiles are
+    raised and not cached.
+
+    """
+    headers = {} if headers is None else headers
+    content = None
+    timings: Timings = []
+    if cache_client:
+        # Image and negative entry in one round trip
+        content, cached_ext, tier, status = await cache_client.get_tile_from_tiers(
+            _hash
+        )
+        if content:
+            ext = cached_ext
+            headers["X-Cache"] = f"HIT-{tier}"
+        elif status:
+            headers["X-Cache"] = "HIT-NEGATIVE"
+            return negative_response(status, ext, scale, headers)
+
+    if not content:
+        try:
+            (content, ext, timings), shared = await inflight.do(
+                _hash, partial(_render_locked, _hash, render, cache_client)
+            )
+        except executors.ExecutorBusy:
+            raise
+        except Exception as e:
+            status = negative_status(e)
+            if status == 500:
+                raise
+            ttl = negative_ttl(status) if cache_client else 0
+            if ttl and status == 204:
+                background_tasks.add_task(cache_client.set_negative, _hash, status, ttl)
+            elif ttl:
+                # Error responses are raised, without background tasks
+                await cache_client.set_negative(_hash, status, ttl)
+            return negative_response(status, ext, scale, headers)
+
+        if shared:
+            headers["X-Cache"] = "COALESCED"
+        elif cache_client and not config.TILE_LOCK_TIMEOUT:
+            # Fire-and-forget: written once the response is sent
+            background_tasks.add_task(
+                cache_client.set_image_cache, _hash, (content, ext)
+            )
+
+    etag = make_etag(_hash, content)
+    if etag_match(if_none_match, etag):
+        return NotModifiedResponse(etag, headers)
+    headers["ETag"] = etag
+
+    if timings:
+        headers["X-Server-Timings"] = "; ".join(
+            ["{} - {:0.2f}".format(name, time * 1000) for (name, time) in timings]
+        )
+
+    return TileResponse(content, media_type=mimetype[ext.value], headers=headers)
+
+
 @router.get(r"/{z}/{x}/{y}", **tile_routes_params)
 @router.get(r"/{z}/{x}/{y}\.{ext}", **tile_routes_params)
 @router.get(r"/{z}/{x}/{y}@{scale}x", **tile_routes_params)
@@ -68,88 +702,246 @@ async def tile(
     color_map: Optional[utils.ColorMapName] = Query(
         None, title="rio-tiler color map name"
     ),
-    cache_client: CacheLayer = Depends(utils.get_cache),
+    webp_quality: Optional[int] = Query(
+        None, ge=1, le=100, description="WebP quality. Default from config."
+    ),
+    webp_effort: Optional[int] = Query(
+        None, ge=0, le=6, description="WebP compression effort. Default from config."
+    ),
+    accept: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+    background_tasks: BackgroundTasks = None,
+    cache_client: AsyncCacheLayer = Depends(utils.get_async_cache),
 ) -> TileResponse:
-    """Handle /tiles requests."""
-    timings = []
-    headers: Dict[str, str] = {}
-
-    tile_hash = utils.get_hash(
-        **dict(
-            z=z,
-            x=x,
-            y=y,
-            ext=ext,
-            scale=scale,
-            url=url,
-            bidx=bidx,
-            nodata=nodata,
-            rescale=rescale,
-            color_formula=color_formula,
-            color_map=color_map.value if color_map else "",
-        )
+    """
+    Handle /tiles requests.
+
+    Without `ext`, tiles are JPEG when fully valid, PNG otherwise, or WebP
+    for clients accepting it (see `Encoder`).
+
+    """
+    encoder = Encoder.negotiate(ext, accept, webp_quality, webp_effort)
+    headers = negotiation_headers(ext)
+    key = tile_key(
+        z,
+        x,
+        y,
+        ext,
+        scale,
+        url,
+        bidx,
+        nodata,
+        rescale,
+        color_formula,
+        color_map,
+        encoder,
     )
-    tilesize = scale * 256
 
-    content = None
+    render = partial(
+        _render_tile,
+        z,
+        x,
+        y,
+        scale,
+        ext,
+        url,
+        bidx,
+        nodata,
+        rescale,
+        color_formula,
+        color_map,
+        cache_client.sync if cache_client else None,
+        encoder,
+    )
+    return await cached_tile_response(
+        key.hash,
+        render,
+        ext,
+        scale,
+        if_none_match,
+        background_tasks,
+        cache_client,
+        headers,
+    )
+
+
+def render_cached_tile(
+    z: int,
+    x: int,
+    y: int,
+    scale: int,
+    ext: Optional[ImageType],
+    url: str,
+    bidx: Optional[str],
+    nodata: Optional[Union[str, int, float]],
+    rescale: Optional[str],
+    color_formula: Optional[str],
+    color_map: Optional[utils.ColorMapName],
+    cache_client: Optional[CacheLayer],
+    encoder: Encoder = Encoder(),
+) -> Tuple[int, Optional[ImageType], bytes]:
+    """
+    Render one tile through the cache. Returns status, ext and body.
+
+    `encoder` is the negotiated encoder of the requests the tile is rendered
+    for (see `Encoder.negotiate`), so that it is cached under their key.
+
+    """
+    key = tile_key(
+        z,
+        x,
+        y,
+        ext,
+        scale,
+        url,
+        bidx,
+        nodata,
+        rescale,
+        color_formula,
+        color_map,
+        encoder,
+    )
+    _hash = key.hash
     if cache_client:
         try:
-            content, ext = cache_client.get_image_from_cache(tile_hash)
-            headers["X-Cache"] = "HIT"
+            content, cached_ext = cache_client.get_image_from_cache(_hash)
+            if content:
+                return 200, cached_ext, content
         except Exception:
-            content = None
+            pass
 
-    if not content:
-        indexes = tuple(int(s) for s in re.findall(r"\d+", bidx)) if bidx else None
+        status = cache_client.get_negative(_hash)
+        if status:
+            return (404 if status == 204 else status), ext, b""
 
-        if nodata is not None:
-            nodata = numpy.nan if nodata == "nan" else float(nodata)
+    tilesize = scale * 256
+    try:
+        footprint = cogeo.footprints.load(url, cache_client)
+        if not cogeo.within_footprint(footprint, z, x, y):
+            return 404, ext, b""
 
-        with utils.Timer() as t:
-            tile, mask = await _tile(
-                url, x, y, z, indexes=indexes, tilesize=tilesize, nodata=nodata
+        with cogeo.pool.checkout(url) as src_dst:
+            tile, mask = reader.tile(
+                src_dst, x, y, z, tilesize, **read_options(bidx, nodata)
             )
-        timings.append(("Read", t.elapsed))
+    except Exception as e:
+        status = negative_status(e)
+        set_negative(cache_client, _hash, status)
+        return (404 if status == 204 else status), ext, b""
 
-        if not ext:
-            ext = ImageType.jpg if mask.all() else ImageType.png
+    if not ext:
+        ext = encoder.resolve(mask)
 
-        with utils.Timer() as t:
-            tile = await _postprocess(
-                tile, mask, rescale=rescale, color_formula=color_formula
-            )
-        timings.append(("Post-process", t.elapsed))
+    tile = utils.postprocess(tile, mask, rescale=rescale, color_formula=color_formula)
+    content = format_tile(
+        tile,
+        mask,
+        ext,
+        x,
+        y,
+        z,
+        tilesize,
+        colormap=get_tile_colormap(color_map),
+        encoder=encoder,
+    )
 
-        if color_map:
-            if color_map.value.startswith("custom_"):
-                color_map = utils.get_custom_cmap(color_map.value)  # type: ignore
-            else:
-                color_map = get_colormap(color_map.value)  # type: ignore
+    cache_tile(cache_client, key, content, ext)
 
-        with utils.Timer() as t:
-            if ext == ImageType.npy:
-                sio = BytesIO()
-                numpy.save(sio, (tile, mask))
-                sio.seek(0)
-                content = sio.getvalue()
-            else:
-                driver = drivers[ext.value]
-                options = img_profiles.get(driver.lower(), {})
-                if ext == ImageType.tif:
-                    options = geotiff_options(x, y, z, tilesize=tilesize)
-
-                content = await _render(
-                    tile, mask, img_format=driver, colormap=color_map, **options
-                )
-
-        timings.append(("Format", t.elapsed))
-
-        if cache_client and content:
-            cache_client.set_image_cache(tile_hash, (content, ext))
+    return 200, ext, content
 
-    if timings:
-        headers["X-Server-Timings"] = "; ".join(
-            ["{} - {:0.2f}".format(name, time * 1000) for (name, time) in timings]
+
+@router.post(
+    r"/batch",
+    responses={
+        200: {
+            "content": {"application/octet-stream": {}},
+            "description": "Return a length-prefixed archive of tiles.",
+        }
+    },
+    tags=["tiles"],
+    response_class=StreamingResponse,
+)
+async def batch(
+    body: TileBatchRequest,
+    scale: int = Query(
+        1, gt=0, lt=4, description="Tile size scale. 1=256x256, 2=512x512..."
+    ),
+    ext: ImageType = Query(None, description="Output image type. Default is auto."),
+    url: str = Query(..., description="Cloud Optimized GeoTIFF URL."),
+    bidx: Optional[str] = Query(None, description="Coma (',') delimited band indexes"),
+    nodata: Optional[Union[str, int, float]] = Query(
+        None, description="Overwrite internal Nodata value."
+    ),
+    rescale: Optional[str] = Query(
+        None, description="Coma (',') delimited Min,Max bounds"
+    ),
+    color_formula: Optional[str] = Query(None, title="rio-color formula"),
+    color_map: Optional[utils.ColorMapName] = Query(
+        None, title="rio-tiler color map name"
+    ),
+    webp_quality: Optional[int] = Query(
+        None, ge=1, le=100, description="WebP quality. Default from config."
+    ),
+    webp_effort: Optional[int] = Query(
+        None, ge=0, le=6, description="WebP compression effort. Default from config."
+    ),
+    accept: Optional[str] = Header(None),
+    cache_client: CacheLayer = Depends(utils.get_cache),
+) -> StreamingResponse:
+    """
+    Handle /batch requests.
+
+    Tiles are rendered concurrently and streamed back as soon as they are
+    ready, each one as a `BATCH_RECORD` header (z, x, y, HTTP-like status,
+    4-byte ext, body length) followed by the tile body. The format is
+    negotiated as for /tiles, so that prefetched tiles are cached under the
+    keys of the tile requests of the same client.
+
+    """
+    if len(body.tiles) > config.BATCH_MAX_TILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many tiles, maximum is {config.BATCH_MAX_TILES}",
         )
 
-    return TileResponse(content, media_type=mimetype[ext.value], headers=headers)
+    encoder = Encoder.negotiate(ext, accept, webp_quality, webp_effort)
+    loop = asyncio.get_event_loop()
+    jobs: List[asyncio.Future] = []
+    for (z, x, y) in body.tiles:
+        job = loop.run_in_executor(
+            _batch_executor,
+            partial(
+                render_cached_tile,
+                z,
+                x,
+                y,
+                scale,
+                ext,
+                url,
+                bidx,
+                nodata,
+                rescale,
+                color_formula,
+                color_map,
+                cache_client,
+                encoder,
+            ),
+        )
+        jobs.append(asyncio.ensure_future(_tag(job, z, x, y)))
+
+    async def _records():
+        for job in asyncio.as_completed(jobs):
+            (z, x, y), (status, tile_ext, content) = await job
+            ext_bytes = tile_ext.value.encode() if tile_ext else b""
+            yield BATCH_RECORD.pack(z, x, y, status, ext_bytes, len(content))
+            yield content
+
+    return StreamingResponse(_records(), media_type="application/octet-stream")
+
+
+async def _tag(job: asyncio.Future, z: int, x: int, y: int):
+    """Attach tile coordinates to an executor result, a 500 record on failure."""
+    try:
+        return (z, x, y), await job
+    except Exception:
+        return (z, x, y), (500, None, b"")
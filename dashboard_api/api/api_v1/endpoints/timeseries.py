@@ -0,0 +1,211 @@
+"""API time-series tiles."""
+
+import asyncio
+import datetime
+from io import BytesIO
+from typing import List, Optional, Tuple, Union
+
+from dashboard_api.api import executors, utils
+from dashboard_api.api.api_v1.endpoints.tiles import (
+    render_cached_tile,
+    tile_key,
+    tile_routes_params,
+)
+from dashboard_api.core import config
+from dashboard_api.db.memcache import CacheLayer
+from dashboard_api.ressources.common import mimetype
+from dashboard_api.ressources.enums import ImageType, TimeUnit
+from dashboard_api.ressources.responses import (
+    NotModifiedResponse,
+    TileResponse,
+    etag_match,
+    make_etag,
+)
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Path, Query
+
+from starlette.responses import Response
+
+try:
+    from PIL import Image
+except ImportError:  # pragma: nocover
+    Image = None  # type: ignore
+
+router = APIRouter()
+timeseries_routes_params = dict(tile_routes_params, tags=["timeseries"])
+
+# Pillow save options of the animated formats
+ANIMATIONS = {
+    ImageType.png: dict(format="PNG"),
+    ImageType.webp: dict(format="WEBP", lossless=True),
+}
+
+
+def parse_dates(
+    dates: Optional[str], start: Optional[str], end: Optional[str], time_unit: str
+) -> List[datetime.date]:
+    """
+    Return the dates of a coma delimited list or of a start/end range.
+
+    Ranges are counted before they are expanded, so that a range of
+    millions of days is rejected without being built.
+
+    """
+    too_many_dates = f"Too many dates, maximum is {config.TIMESERIES_MAX_DATES}"
+    try:
+        if dates:
+            frame_dates = [
+                utils.parse_date(d.strip()) for d in dates.split(",") if d.strip()
+            ]
+        elif start and end:
+            first, last = utils.parse_date(start), utils.parse_date(end)
+            if time_unit == "month":
+                count = (last.year - first.year) * 12 + last.month - first.month + 1
+            else:
+                count = (last - first).days + 1
+            if count > config.TIMESERIES_MAX_DATES:
+                raise HTTPException(status_code=400, detail=too_many_dates)
+            frame_dates = utils.expand_dates([start, end], time_unit, True)
+        else:
+            raise HTTPException(
+                status_code=400, detail="Either dates or start and end are required"
+            )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if len(frame_dates) > config.TIMESERIES_MAX_DATES:
+        raise HTTPException(status_code=400, detail=too_many_dates)
+    return frame_dates
+
+
+def animate(frames: List[bytes], ext: ImageType, duration: int) -> bytes:
+    """Encode PNG frames as an animated PNG or WebP."""
+    images = [Image.open(BytesIO(frame)).convert("RGBA") for frame in frames]
+    buffer = BytesIO()
+    images[0].save(
+        buffer,
+        save_all=True,
+        append_images=images[1:],
+        duration=duration,
+        loop=0,
+        **ANIMATIONS[ext],
+    )
+    return buffer.getvalue()
+
+
+_animate = executors.cpu_render.bind(animate)
+
+
+@router.get(r"/timeseries/{z}/{x}/{y}\.{ext}", **timeseries_routes_params)
+@router.get(r"/timeseries/{z}/{x}/{y}@{scale}x\.{ext}", **timeseries_routes_params)
+async def timeseries(
+    z: int = Path(..., ge=0, le=30, description="Mercator tiles's zoom level"),
+    x: int = Path(..., description="Mercator tiles's column"),
+    y: int = Path(..., description="Mercator tiles's row"),
+    scale: int = Query(
+        1, gt=0, lt=4, description="Tile size scale. 1=256x256, 2=512x512..."
+    ),
+    ext: ImageType = Path(
+        ..., description="npy for a stack of arrays, png or webp for an animation."
+    ),
+    url: str = Query(..., description="Cloud Optimized GeoTIFF URL with a {date}."),
+    dates: Optional[str] = Query(
+        None, description="Coma (',') delimited dates (YYYY-MM-DD)."
+    ),
+    start: Optional[str] = Query(None, description="First date (YYYY-MM-DD)."),
+    end: Optional[str] = Query(None, description="Last date (YYYY-MM-DD)."),
+    time_unit: TimeUnit = Query(
+        TimeUnit.day, description="Step between start and end."
+    ),
+    date_format: Optional[str] = Query(
+        None, description="strftime format of {date}. Default from time unit."
+    ),
+    duration: int = Query(
+        500, gt=0, le=10000, description="Animation frame duration in ms."
+    ),
+    bidx: Optional[str] = Query(None, description="Coma (',') delimited band indexes"),
+    nodata: Optional[Union[str, int, float]] = Query(
+        None, description="Overwrite internal Nodata value."
+    ),
+    rescale: Optional[str] = Query(
+        None, description="Coma (',') delimited Min,Max bounds"
+    ),
+    color_formula: Optional[str] = Query(None, title="rio-color formula"),
+    color_map: Optional[utils.ColorMapName] = Query(
+        None, title="rio-tiler color map name"
+    ),
+    if_none_match: Optional[str] = Header(None),
+    cache_client: CacheLayer = Depends(utils.get_cache),
+) -> Response:
+    """
+    Handle /timeseries requests: one tile of a COG at several dates.
+
+    Frames are rendered concurrently and cached as regular tiles, then
+    returned as concatenated arrays (npy, see `arrays.decode_all`) or as an
+    animated PNG or WebP. Missing dates are skipped.
+
+    """
+    if ext not in (ImageType.npy,) + tuple(ANIMATIONS):
+        raise HTTPException(status_code=400, detail=f"Unsupported format {ext.value}")
+    if ext != ImageType.npy and Image is None:
+        raise HTTPException(status_code=400, detail="Animations are not available")
+    if "{date}" not in url:
+        raise HTTPException(status_code=400, detail="url must contain {date}")
+
+    frame_dates = parse_dates(dates, start, end, time_unit.value)
+
+    date_format = date_format or utils.DATE_FORMATS[time_unit.value]
+    frame_ext = ImageType.npy if ext == ImageType.npy else ImageType.png
+    semaphore = asyncio.Semaphore(config.TIMESERIES_CONCURRENCY)
+
+    async def _frame(date: datetime.date) -> Tuple[int, Optional[ImageType], bytes]:
+        async with semaphore:
+            return await executors.raster_read.run(
+                render_cached_tile,
+                z,
+                x,
+                y,
+                scale,
+                frame_ext,
+                url.replace("{date}", date.strftime(date_format)),
+                bidx,
+                nodata,
+                rescale,
+                color_formula,
+                color_map,
+                cache_client,
+            )
+
+    jobs = [asyncio.ensure_future(_frame(date)) for date in frame_dates]
+    try:
+        results = await asyncio.gather(*jobs)
+    finally:
+        for job in jobs:
+            job.cancel()
+
+    frames = []
+    found = []
+    for date, (status, _, content) in zip(frame_dates, results):
+        if status >= 500:
+            raise HTTPException(status_code=status, detail="Tile could not be read")
+        if status == 200:
+            frames.append(content)
+            found.append(date.isoformat())
+
+    if not frames:
+        return Response(status_code=204)
+
+    if ext == ImageType.npy:
+        content = b"".join(frames)
+    else:
+        content = await _animate(frames, ext, duration)
+
+    key = tile_key(
+        z, x, y, ext, scale, url, bidx, nodata, rescale, color_formula, color_map
+    )
+    etag = make_etag(key.hash, content)
+    if etag_match(if_none_match, etag):
+        return NotModifiedResponse(etag)
+
+    headers = {"ETag": etag, "X-Dates": ",".join(found)}
+    return TileResponse(content, media_type=mimetype[ext.value], headers=headers)
@@ -0,0 +1,443 @@
+"""dashboard_api.api.cogeo: COG access through a process-wide dataset pool."""
+
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy
+import rasterio
+from cachetools import TTLCache
+from rasterio.errors import RasterioIOError
+from rasterio.io import DatasetReader
+from rasterio.transform import rowcol
+from rasterio.warp import transform, transform_bounds
+from rasterio.windows import Window
+from rio_tiler import constants, reader
+from rio_tiler.mercator import get_zooms
+from rio_tiler.utils import has_alpha_band, has_mask_band, tile_exists
+
+from dashboard_api.api.utils import get_hash
+from dashboard_api.core import config
+from dashboard_api.db.memcache import CacheLayer
+from dashboard_api.ressources import arrays
+from dashboard_api.ressources.enums import ImageType
+
+
+class DatasetPool(object):
+    """
+    LRU pool of open rasterio datasets.
+
+    Handles are keyed by address and open options. A handle is leased to a
+    single caller at a time (rasterio datasets are not safe for concurrent
+    reads), and idle handles are closed once they exceed the pool size or
+    have not been used for `ttl` seconds.
+
+    """
+
+    def __init__(self, maxsize: int = 32, ttl: int = 300):
+        """Init Dataset Pool."""
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._idle: "OrderedDict[Tuple, List[Tuple[float, DatasetReader]]]" = (
+            OrderedDict()
+        )
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @contextmanager
+    def checkout(self, address: str, **options: Any) -> Iterator[DatasetReader]:
+        """Lease an open dataset for `address`, opening it on a miss."""
+        key = (address, tuple(sorted(options.items())))
+        src_dst = self._acquire(key)
+        if src_dst is None:
+            src_dst = rasterio.open(address, **options)
+
+        try:
+            yield src_dst
+        except RasterioIOError:
+            # The handle may be in a broken state (e.g. dropped connection).
+            src_dst.close()
+            raise
+        except Exception:
+            self._release(key, src_dst)
+            raise
+        else:
+            self._release(key, src_dst)
+
+    def _acquire(self, key: Tuple) -> DatasetReader:
+        with self._lock:
+            expired = self._expire(time.time())
+            handles = self._idle.get(key)
+            if handles:
+                _, src_dst = handles.pop()
+                self._size -= 1
+                if not handles:
+                    del self._idle[key]
+                self.hits += 1
+            else:
+                src_dst = None
+                self.misses += 1
+
+        for ds in expired:
+            ds.close()
+
+        return src_dst
+
+    def _release(self, key: Tuple, src_dst: DatasetReader):
+        evicted = []
+        with self._lock:
+            self._idle.setdefault(key, []).append((time.time(), src_dst))
+            self._idle.move_to_end(key)
+            self._size += 1
+            while self._size > self.maxsize:
+                oldest = next(iter(self._idle))
+                handles = self._idle[oldest]
+                evicted.append(handles.pop(0)[1])
+                self._size -= 1
+                self.evictions += 1
+                if not handles:
+                    del self._idle[oldest]
+
+        for ds in evicted:
+            ds.close()
+
+    def _expire(self, now: float) -> List[DatasetReader]:
+        """Drop idle handles older than the TTL. Must be called with the lock held."""
+        expired = []
+        for key in list(self._idle.keys()):
+            handles = self._idle[key]
+            fresh = [(ts, ds) for ts, ds in handles if now - ts <= self.ttl]
+            expired.extend(ds for ts, ds in handles if now - ts > self.ttl)
+            if fresh:
+                self._idle[key] = fresh
+            else:
+                del self._idle[key]
+
+        self._size -= len(expired)
+        self.expirations += len(expired)
+        return expired
+
+    def clear(self):
+        """Close every idle dataset."""
+        with self._lock:
+            handles = [ds for entries in self._idle.values() for _, ds in entries]
+            self._idle.clear()
+            self._size = 0
+
+        for ds in handles:
+            ds.close()
+
+    def stats(self) -> Dict:
+        """Return pool counters."""
+        return dict(
+            size=self._size,
+            maxsize=self.maxsize,
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+            expirations=self.expirations,
+        )
+
+
+pool = DatasetPool(maxsize=config.DATASET_POOL_SIZE, ttl=config.DATASET_POOL_TTL)
+
+
+class FootprintIndex(object):
+    """
+    Per-URL index of COG footprints: WGS84 bounds.
+
+    Footprints are filled lazily from `spatial_info`, kept in process for
+    `ttl` seconds and shared through memcached, so that tiles outside a COG
+    can be answered without opening it.
+
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: int = 3600):
+        """Init Footprint Index."""
+        self.ttl = ttl
+        self._index: TTLCache = TTLCache(maxsize, ttl)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, address: str) -> Optional[Dict]:
+        """Return the footprint of `address` if it is in the process index."""
+        with self._lock:
+            footprint = self._index.get(address)
+        if footprint is not None:
+            self.hits += 1
+        return footprint
+
+    def load(self, address: str, cache_client: Optional[CacheLayer] = None) -> Dict:
+        """Return the footprint of `address`, from memcached or the COG itself."""
+        footprint = self.get(address)
+        if footprint is not None:
+            return footprint
+
+        self.misses += 1
+        key = get_hash(footprint=address)
+        if cache_client:
+            footprint = cache_client.get_footprint(key)
+
+        if not footprint:
+            meta = spatial_info(address)
+            footprint = dict(bounds=list(meta["bounds"]))
+            if cache_client:
+                cache_client.set_footprint(key, footprint, self.ttl)
+
+        with self._lock:
+            self._index[address] = footprint
+        return footprint
+
+    def clear(self):
+        """Empty the process index."""
+        with self._lock:
+            self._index.clear()
+
+    def stats(self) -> Dict:
+        """Return index counters."""
+        return dict(size=len(self._index), hits=self.hits, misses=self.misses)
+
+
+footprints = FootprintIndex(
+    maxsize=config.FOOTPRINT_INDEX_SIZE, ttl=config.FOOTPRINT_INDEX_TTL
+)
+
+
+def within_footprint(footprint: Dict, tile_z: int, tile_x: int, tile_y: int) -> bool:
+    """Check if a mercator tile intersects a footprint, at any zoom level."""
+    # COGs are over- and under-zoomed: the native zoom range does not limit tiles
+    return tile_exists(footprint["bounds"], tile_z, tile_x, tile_y)
+
+
+def spatial_info(address: str) -> Dict:
+    """Return COGEO spatial info."""
+    with pool.checkout(address) as src_dst:
+        minzoom, maxzoom = get_zooms(src_dst)
+        bounds = transform_bounds(
+            src_dst.crs, constants.WGS84_CRS, *src_dst.bounds, densify_pts=21
+        )
+
+    center = [(bounds[0] + bounds[2]) / 2, (bounds[1] + bounds[3]) / 2, minzoom]
+    return dict(
+        address=address, bounds=bounds, center=center, minzoom=minzoom, maxzoom=maxzoom
+    )
+
+
+def bounds(address: str) -> Dict:
+    """Retrieve image bounds."""
+    with pool.checkout(address) as src_dst:
+        bounds = transform_bounds(
+            src_dst.crs, constants.WGS84_CRS, *src_dst.bounds, densify_pts=21
+        )
+    return dict(address=address, bounds=bounds)
+
+
+def metadata(
+    address: str,
+    pmin: float = 2.0,
+    pmax: float = 98.0,
+    hist_options: Dict = {},
+    **kwargs: Any,
+) -> Dict:
+    """Return image statistics."""
+    with pool.checkout(address) as src_dst:
+        meta = reader.metadata(
+            src_dst, percentiles=(pmin, pmax), hist_options=hist_options, **kwargs
+        )
+
+    return dict(address=address, **meta)
+
+
+# from rio-tiler 2.0a5
+def info(address: str) -> Dict:
+    """
+    Return simple metadata about the file.
+
+    Attributes
+    ----------
+    address : str or PathLike object
+        A dataset path or URL. Will be opened in "r" mode.
+
+    Returns
+    -------
+    out : dict.
+
+    """
+    with pool.checkout(address) as src_dst:
+        minzoom, maxzoom = get_zooms(src_dst)
+        bounds = transform_bounds(
+            src_dst.crs, constants.WGS84_CRS, *src_dst.bounds, densify_pts=21
+        )
+        center = [(bounds[0] + bounds[2]) / 2, (bounds[1] + bounds[3]) / 2, minzoom]
+
+        def _get_descr(ix):
+            """Return band description."""
+            name = src_dst.descriptions[ix - 1]
+            if not name:
+                name = "band{}".format(ix)
+            return name
+
+        band_descriptions = [(ix, _get_descr(ix)) for ix in src_dst.indexes]
+        tags = [(ix, src_dst.tags(ix)) for ix in src_dst.indexes]
+
+        other_meta = dict()
+        if src_dst.scales[0] and src_dst.offsets[0]:
+            other_meta.update(dict(scale=src_dst.scales[0]))
+            other_meta.update(dict(offset=src_dst.offsets[0]))
+
+        if has_alpha_band(src_dst):
+            nodata_type = "Alpha"
+        elif has_mask_band(src_dst):
+            nodata_type = "Mask"
+        elif src_dst.nodata is not None:
+            nodata_type = "Nodata"
+        else:
+            nodata_type = "None"
+
+        try:
+            cmap = src_dst.colormap(1)
+            other_meta.update(dict(colormap=cmap))
+        except ValueError:
+            pass
+
+        return dict(
+            address=address,
+            bounds=bounds,
+            center=center,
+            minzoom=minzoom,
+            maxzoom=maxzoom,
+            band_metadata=tags,
+            band_descriptions=band_descriptions,
+            dtype=src_dst.meta["dtype"],
+            colorinterp=[src_dst.colorinterp[ix - 1].name for ix in src_dst.indexes],
+            nodata_type=nodata_type,
+            **other_meta,
+        )
+
+
+def tile(
+    address: str,
+    tile_x: int,
+    tile_y: int,
+    tile_z: int,
+    tilesize: int = 256,
+    **kwargs: Any,
+) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    """Create mercator tile from a pooled dataset."""
+    with pool.checkout(address) as src_dst:
+        return reader.tile(src_dst, tile_x, tile_y, tile_z, tilesize, **kwargs)
+
+
+def preview(
+    address: str, max_size: int = 1024, **kwargs: Any
+) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    """Read a whole pooled dataset, at most `max_size` pixels wide or high."""
+    with pool.checkout(address) as src_dst:
+        return reader.preview(src_dst, max_size=max_size, **kwargs)
+
+
+def part(
+    address: str, bounds: Tuple[float, float, float, float], max_size: int, **kwargs
+) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    """Read a WGS84 bounding box of a pooled dataset in Web Mercator."""
+    with pool.checkout(address) as src_dst:
+        return reader.part(
+            src_dst,
+            bounds,
+            dst_crs=constants.WEB_MERCATOR_CRS,
+            bounds_crs=constants.WGS84_CRS,
+            max_size=max_size,
+            **kwargs,
+        )
+
+
+def read_block(
+    src_dst: DatasetReader,
+    address: str,
+    block_row: int,
+    block_col: int,
+    indexes: Sequence[int],
+    nodata: Optional[float] = None,
+    cache_client: Optional[CacheLayer] = None,
+) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    """Read an internal block of a dataset, through the cache tiers."""
+    key = get_hash(
+        block=address,
+        row=block_row,
+        col=block_col,
+        indexes=list(indexes),
+        nodata=repr(nodata),
+        array_format=arrays.VERSION,
+    )
+    if cache_client:
+        content, _ = cache_client.get_image_from_cache(key)
+        if content:
+            return arrays.decode(content)
+
+    block_height, block_width = src_dst.block_shapes[0]
+    window = Window(
+        block_col * block_width, block_row * block_height, block_width, block_height
+    ).intersection(Window(0, 0, src_dst.width, src_dst.height))
+    data = src_dst.read(indexes, window=window)
+    if nodata is None:
+        mask = src_dst.dataset_mask(window=window)
+    elif numpy.isnan(nodata):
+        mask = numpy.where(numpy.isnan(data).all(axis=0), 0, 255).astype("uint8")
+    else:
+        mask = numpy.where((data == nodata).all(axis=0), 0, 255).astype("uint8")
+
+    if cache_client:
+        cache_client.set_image_cache(key, (arrays.encode(data, mask), ImageType.npy))
+    return data, mask
+
+
+def points(
+    address: str,
+    coordinates: Sequence[Tuple[float, float]],
+    indexes: Optional[Sequence[int]] = None,
+    nodata: Optional[float] = None,
+    cache_client: Optional[CacheLayer] = None,
+) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    """
+    Return the (count, points) values at WGS84 coordinates and their validity.
+
+    Points are grouped by internal block of the dataset, so each block is
+    read, or loaded from the cache, once however many points it holds.
+
+    """
+    with pool.checkout(address) as src_dst:
+        indexes = indexes or src_dst.indexes
+        values = numpy.zeros((len(indexes), len(coordinates)), src_dst.dtypes[0])
+        valid = numpy.zeros(len(coordinates), bool)
+        if not len(coordinates):
+            return values, valid
+
+        lons, lats = zip(*coordinates)
+        xs, ys = transform(constants.WGS84_CRS, src_dst.crs, lons, lats)
+        rows, cols = map(numpy.array, rowcol(src_dst.transform, xs, ys))
+
+        block_height, block_width = src_dst.block_shapes[0]
+        inside = (rows >= 0) & (rows < src_dst.height)
+        inside &= (cols >= 0) & (cols < src_dst.width)
+        blocks: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+        for i in numpy.flatnonzero(inside):
+            block = (int(rows[i] // block_height), int(cols[i] // block_width))
+            blocks[block].append(i)
+
+        for (block_row, block_col), ids in blocks.items():
+            data, mask = read_block(
+                src_dst, address, block_row, block_col, indexes, nodata, cache_client
+            )
+            r = rows[ids] - block_row * block_height
+            c = cols[ids] - block_col * block_width
+            values[:, ids] = data[:, r, c]
+            valid[ids] = mask[r, c] > 0
+
+    return values, valid
@@ -0,0 +1,115 @@
+"""
+dashboard_api.api.executors: named, bounded thread pools.
+
+Raster reads, CPU rendering and metadata requests each run in their own
+thread pool instead of the event loop default executor, so one kind of work
+cannot starve the others. Each pool accepts a bounded number of pending
+calls: beyond it, requests fail fast with a 503 and a `Retry-After` header.
+
+"""
+
+import asyncio
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict
+
+from dashboard_api.core import config, metrics
+
+from fastapi import HTTPException
+
+
+class ExecutorBusy(HTTPException):
+    """The queue of an executor is full."""
+
+    def __init__(self, name: str, retry_after: int):
+        """Init Executor Busy."""
+        super().__init__(
+            status_code=503,
+            detail=f"Server busy ({name}), retry later",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+
+class BoundedExecutor(object):
+    """Thread pool rejecting calls once `max_workers + max_queue` are pending."""
+
+    def __init__(
+        self, name: str, max_workers: int, max_queue: int, retry_after: int = 1
+    ):
+        """Init Bounded Executor."""
+        self.name = name
+        self.max_workers = max_workers
+        self.max_pending = max_workers + max_queue
+        self.retry_after = retry_after
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=name
+        )
+        # Only updated from the event loop thread
+        self.pending = 0
+        self.rejected = 0
+        metrics.register_executor(name, self.executor)
+
+    def _call(self, submitted: float, fn: Callable, *args: Any, **kwargs: Any) -> Any:
+        start = time.perf_counter()
+        metrics.EXECUTOR_WAIT.observe(start - submitted, self.name)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            metrics.EXECUTOR_RUN.observe(time.perf_counter() - start, self.name)
+
+    async def run(self, fn: Callable, *args: Any, **kwargs: Any) -> Any:
+        """Run `fn` in the pool, like `starlette.concurrency.run_in_threadpool`."""
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            metrics.EXECUTOR_REJECTED.inc(self.name)
+            raise ExecutorBusy(self.name, self.retry_after)
+
+        self.pending += 1
+        try:
+            loop = asyncio.get_event_loop()
+            call = partial(self._call, time.perf_counter(), fn, *args, **kwargs)
+            # Keep the context variables of the request, as run_in_threadpool
+            context = contextvars.copy_context()
+            return await loop.run_in_executor(self.executor, context.run, call)
+        finally:
+            self.pending -= 1
+
+    def bind(self, fn: Callable) -> Callable:
+        """Return a coroutine function running `fn` in the pool."""
+        return partial(self.run, fn)
+
+    def stats(self) -> Dict:
+        """Return pool counters."""
+        return {
+            "workers": self.max_workers,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "rejected": self.rejected,
+        }
+
+
+raster_read = BoundedExecutor(
+    "raster-read",
+    config.RASTER_READ_WORKERS,
+    config.RASTER_READ_QUEUE,
+    config.EXECUTOR_RETRY_AFTER,
+)
+cpu_render = BoundedExecutor(
+    "cpu-render",
+    config.CPU_RENDER_WORKERS,
+    config.CPU_RENDER_QUEUE,
+    config.EXECUTOR_RETRY_AFTER,
+)
+metadata = BoundedExecutor(
+    "metadata",
+    config.METADATA_WORKERS,
+    config.METADATA_QUEUE,
+    config.EXECUTOR_RETRY_AFTER,
+)
+
+
+def stats() -> Dict:
+    """Return the counters of every executor."""
+    return {e.name: e.stats() for e in (raster_read, cpu_render, metadata)}
@@ -0,0 +1,202 @@
+"""dashboard_api.api.keys: canonical cache keys."""
+
+import math
+import re
+from typing import (
+    Any,
+    Dict,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+from dashboard_api.api.utils import ColorMapName, get_hash, parse_rescale
+from dashboard_api.ressources import arrays
+from dashboard_api.ressources.enums import ImageType
+
+
+def canonical_bidx(bidx: Optional[str]) -> Optional[Tuple[int, ...]]:
+    """Parse band indexes, e.g. `1, 2` and `1,2` give (1, 2)."""
+    if not bidx:
+        return None
+    return tuple(int(s) for s in re.findall(r"\d+", bidx)) or None
+
+
+def canonical_nodata(nodata: Optional[Union[str, int, float]]) -> Optional[str]:
+    """Normalize a nodata value, e.g. `0`, `0.0` give `0.0` and `NaN` gives `nan`."""
+    if nodata is None:
+        return None
+    try:
+        value = float(nodata)
+    except ValueError:
+        return str(nodata).strip()
+    return "nan" if math.isnan(value) else repr(value)
+
+
+def canonical_rescale(rescale: Optional[str]) -> Optional[Tuple]:
+    """Parse Min,Max bounds, e.g. `0,255` and `0.0, 255.0` give ((0.0, 255.0),)."""
+    if not rescale:
+        return None
+    try:
+        return parse_rescale(rescale)
+    except ValueError:
+        return (rescale.strip(),)
+
+
+def canonical_color_formula(color_formula: Optional[str]) -> Optional[str]:
+    """Normalize the whitespace and commas of a rio-color formula, keeping its case."""
+    if not color_formula:
+        return None
+    return " ".join(color_formula.replace(",", "").split()) or None
+
+
+class TileKey(NamedTuple):
+    """Canonical render parameters of a tile."""
+
+    z: int
+    x: int
+    y: int
+    scale: int
+    ext: Optional[str]
+    url: str
+    bidx: Optional[Tuple[int, ...]]
+    nodata: Optional[str]
+    rescale: Optional[Tuple]
+    color_formula: Optional[str]
+    color_map: Optional[str]
+    encoder: Optional[Tuple] = None
+
+    @classmethod
+    def create(
+        cls,
+        z: int,
+        x: int,
+        y: int,
+        ext: Optional[ImageType],
+        scale: int,
+        url: str,
+        bidx: Optional[str],
+        nodata: Optional[Union[str, int, float]],
+        rescale: Optional[str],
+        color_formula: Optional[str],
+        color_map: Optional[ColorMapName],
+        encoder: Optional[Tuple] = None,
+    ) -> "TileKey":
+        """Create a key from the tile endpoint query parameters."""
+        return cls(
+            z=z,
+            x=x,
+            y=y,
+            scale=scale,
+            ext=ext.value if ext else None,
+            url=url.strip(),
+            bidx=canonical_bidx(bidx),
+            nodata=canonical_nodata(nodata),
+            rescale=canonical_rescale(rescale),
+            color_formula=canonical_color_formula(color_formula),
+            color_map=color_map.value if color_map else None,
+            encoder=encoder,
+        )
+
+    def params(self) -> Dict[str, Any]:
+        """Return the key fields, without the default encoder settings."""
+        params = self._asdict()
+        if self.encoder is None:
+            # Keys of tiles encoded with the defaults are unchanged
+            del params["encoder"]
+        return params
+
+    @property
+    def hash(self) -> str:
+        """Return the cache key."""
+        params = self.params()
+        if self.ext == ImageType.npy.value:
+            # Raw arrays cached in a previous format must not be served
+            params["array_format"] = arrays.VERSION
+        return get_hash(route="tile", **params)
+
+
+def mosaic_key(key: TileKey, assets: Sequence[str], pixel_selection: str) -> str:
+    """Return the cache key of a mosaic tile, in asset priority order."""
+    params = key.params()
+    params.update(
+        url=tuple(asset.strip() for asset in assets), pixel_selection=pixel_selection
+    )
+    if key.ext == ImageType.npy.value:
+        params["array_format"] = arrays.VERSION
+    return get_hash(route="mosaic", **params)
+
+
+def metatile_key(key: TileKey, size: int) -> str:
+    """Return the key of the `size`x`size` metatile with `key` in its corner."""
+    return get_hash(route="metatile", size=size, **key.params())
+
+
+def compare_key(key: TileKey, compare_url: str, method: str) -> str:
+    """Return the cache key of a comparison tile of `key.url` and `compare_url`."""
+    params = key.params()
+    params.update(compare_url=compare_url.strip(), method=method)
+    if key.ext == ImageType.npy.value:
+        params["array_format"] = arrays.VERSION
+    return get_hash(route="compare", **params)
+
+
+def image_key(
+    route: str,
+    url: str,
+    bounds: Optional[Tuple[float, ...]],
+    max_size: int,
+    ext: Optional[ImageType],
+    bidx: Optional[str],
+    nodata: Optional[Union[str, int, float]],
+    rescale: Optional[str],
+    color_formula: Optional[str],
+    color_map: Optional[ColorMapName],
+    encoder: Optional[Tuple] = None,
+) -> str:
+    """Return the cache key of a preview or bbox image."""
+    params = dict(
+        url=url.strip(),
+        bounds=bounds,
+        max_size=max_size,
+        ext=ext.value if ext else None,
+        bidx=canonical_bidx(bidx),
+        nodata=canonical_nodata(nodata),
+        rescale=canonical_rescale(rescale),
+        color_formula=canonical_color_formula(color_formula),
+        color_map=color_map.value if color_map else None,
+    )
+    if ext == ImageType.npy:
+        params["array_format"] = arrays.VERSION
+    if encoder is not None:
+        params["encoder"] = encoder
+    return get_hash(route=route, **params)
+
+
+def canonical_query(params: Mapping[str, str]) -> List[Tuple[str, str]]:
+    """Return sorted query parameters with render parameters normalized."""
+    query = []
+    for name, value in sorted(params.items()):
+        if name == "bidx":
+            bidx = canonical_bidx(value)
+            value = ",".join(map(str, bidx)) if bidx else value
+        elif name == "nodata":
+            value = canonical_nodata(value) or value
+        elif name == "rescale":
+            rescale = canonical_rescale(value)
+            if rescale and isinstance(rescale[0], tuple):
+                value = ",".join(repr(v) for bounds in rescale for v in bounds)
+        elif name == "color_formula":
+            value = canonical_color_formula(value) or value
+        query.append((name, value))
+
+    return query
+
+
+def json_key(route: str, api_url: str = "", **params: Optional[str]) -> str:
+    """Return the cache key of a JSON metadata response."""
+    return get_hash(route=route, api_url=api_url, **params)
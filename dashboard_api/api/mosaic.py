@@ -0,0 +1,155 @@
+"""dashboard_api.api.mosaic: mosaic pixel selection and STAC asset search."""
+
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy
+import requests
+from cachetools import TTLCache
+from rio_tiler.utils import tile_exists
+
+from dashboard_api.core import config
+from dashboard_api.ressources.enums import PixelSelection
+
+
+class MosaicTile(object):
+    """
+    Tile merged from the tiles of overlapping assets, in priority order.
+
+    `first` keeps the first valid pixel; `highest` and `lowest` keep the
+    highest or lowest valid value of each band; `mean` averages the valid
+    values. Only a `first` mosaic can be complete before all assets are read.
+
+    """
+
+    def __init__(self, method: PixelSelection = PixelSelection.first):
+        """Init Mosaic Tile."""
+        self.method = method
+        self.tile: Optional[numpy.ndarray] = None
+        self.mask: Optional[numpy.ndarray] = None
+        self.count: Optional[numpy.ndarray] = None
+        self.dtype: Optional[numpy.dtype] = None
+        self.assets = 0
+
+    def add(self, tile: numpy.ndarray, mask: numpy.ndarray):
+        """Merge an asset tile and its mask."""
+        self.assets += 1
+        valid = mask > 0
+        if self.tile is None:
+            self.mask = mask.copy()
+            if self.method == PixelSelection.mean:
+                self.tile = numpy.where(valid, tile, 0).astype("float64")
+                self.count = valid.astype("uint16")
+                self.dtype = tile.dtype
+            else:
+                self.tile = tile.copy()
+            return
+
+        missing = self.mask == 0
+        if self.method == PixelSelection.first:
+            fill = valid & missing
+            self.tile[:, fill] = tile[:, fill]
+        elif self.method == PixelSelection.mean:
+            self.tile += numpy.where(valid, tile, 0)
+            self.count += valid
+        else:
+            better = tile > self.tile
+            if self.method == PixelSelection.lowest:
+                better = tile < self.tile
+            replace = valid & (missing | better)
+            self.tile[replace] = tile[replace]
+
+        numpy.maximum(self.mask, mask, out=self.mask)
+
+    @property
+    def full(self) -> bool:
+        """Check if no later asset can change the mosaic."""
+        return (
+            self.method == PixelSelection.first
+            and self.mask is not None
+            and bool(self.mask.all())
+        )
+
+    @property
+    def empty(self) -> bool:
+        """Check if the mosaic has no valid pixel."""
+        return self.mask is None or not self.mask.any()
+
+    def data(self) -> Tuple[numpy.ndarray, numpy.ndarray]:
+        """Return the mosaic tile and mask."""
+        if self.method == PixelSelection.mean:
+            tile = self.tile / numpy.maximum(self.count, 1)
+            return tile.astype(self.dtype), self.mask
+        return self.tile, self.mask
+
+
+_searches: TTLCache = TTLCache(256, config.STAC_SEARCH_TTL)
+_searches_lock = threading.Lock()
+
+
+def _datetime(date: str) -> str:
+    """Return a STAC datetime interval covering a day, or `date` if already one."""
+    if "/" in date or "T" in date:
+        return date
+    return f"{date}T00:00:00Z/{date}T23:59:59Z"
+
+
+def _asset_href(assets: Dict, name: Optional[str]) -> Optional[str]:
+    """Return the href of the named asset, else of the first GeoTIFF asset."""
+    if name:
+        return assets.get(name, {}).get("href")
+
+    for asset in assets.values():
+        if asset.get("type", "").startswith("image/tiff"):
+            return asset.get("href")
+    return None
+
+
+def stac_search(
+    collection: str, date: str, asset: Optional[str] = None
+) -> List[Tuple[str, List[float]]]:
+    """Return the href and bbox of the items of a collection at a date."""
+    key = (collection, date, asset)
+    with _searches_lock:
+        items = _searches.get(key)
+    if items is not None:
+        return items
+
+    if not config.STAC_API_URL:
+        raise ValueError("No STAC API configured")
+
+    response = requests.post(
+        f"{config.STAC_API_URL}/search",
+        json=dict(
+            collections=[collection],
+            datetime=_datetime(date),
+            limit=config.STAC_SEARCH_LIMIT,
+        ),
+        timeout=10,
+    )
+    response.raise_for_status()
+
+    items = []
+    for feature in response.json().get("features", []):
+        href = _asset_href(feature.get("assets", {}), asset)
+        bbox = feature.get("bbox")
+        if not href or not bbox:
+            continue
+        if len(bbox) == 6:
+            bbox = [bbox[0], bbox[1], bbox[3], bbox[4]]
+        items.append((href, bbox))
+
+    with _searches_lock:
+        _searches[key] = items
+    return items
+
+
+def stac_assets(
+    collection: str, date: str, z: int, x: int, y: int, asset: Optional[str] = None
+) -> List[str]:
+    """Return the assets of a collection at a date overlapping a tile."""
+    return [
+        href
+        for href, bbox in stac_search(collection, date, asset)
+        if tile_exists(bbox, z, x, y)
+    ]
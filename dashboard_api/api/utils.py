@@ -1,42 +1,65 @@
 """dashboard_api.api.utils."""
 
+import asyncio
+import datetime
 import hashlib
 import json
 import re
 import time
 from enum import Enum
-from typing import Any, Dict, Optional, Tuple
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 
 import numpy as np
 
 # Temporary
 import rasterio
 from rasterio import features
-from rasterio.warp import transform_bounds
 from rasterstats.io import bounds_window
 from rio_color.operations import parse_operations
 from rio_color.utils import scale_dtype, to_math_type
-from rio_tiler import constants
-from rio_tiler.mercator import get_zooms
-from rio_tiler.utils import _chunks, has_alpha_band, has_mask_band, linear_rescale
+from rio_tiler.colormap import get_colormap, make_lut
+from rio_tiler.utils import _chunks
 from shapely.geometry import box, shape
 
-from dashboard_api.db.memcache import CacheLayer
+from dashboard_api.core import config
+from dashboard_api.db.memcache import AsyncCacheLayer, CacheLayer
 from dashboard_api.models.timelapse import Feature
 
 from starlette.requests import Request
 
 
+# {date} formats of the COG filenames, by dataset time unit
+DATE_FORMATS = dict(day="%Y_%m_%d", month="%Y%m")
+
+
 def get_cache(request: Request) -> CacheLayer:
     """Get Memcached Layer."""
     return request.state.cache
 
 
+def get_async_cache(request: Request) -> AsyncCacheLayer:
+    """Get asyncio Memcached Layer."""
+    return request.state.async_cache
+
+
 def get_hash(**kwargs: Any) -> str:
     """Create hash from kwargs."""
     return hashlib.sha224(json.dumps(kwargs, sort_keys=True).encode()).hexdigest()
 
 
+@lru_cache(maxsize=512)
+def parse_rescale(rescale: str) -> Tuple[Tuple[float, ...], ...]:
+    """Parse a coma (',') delimited list of Min,Max bounds."""
+    return tuple(tuple(r) for r in _chunks(list(map(float, rescale.split(","))), 2))
+
+
+@lru_cache(maxsize=512)
+def parse_color_formula(color_formula: str) -> Tuple[Callable, ...]:
+    """Parse a rio-color formula into its chain of operations."""
+    return tuple(parse_operations(color_formula))
+
+
 def postprocess(
     tile: np.ndarray,
     mask: np.ndarray,
@@ -45,96 +68,52 @@ def postprocess(
 ) -> np.ndarray:
     """Post-process tile data."""
     if rescale:
-        rescale_arr = list(map(float, rescale.split(",")))
-        rescale_arr = list(_chunks(rescale_arr, 2))
-        if len(rescale_arr) != tile.shape[0]:
-            rescale_arr = ((rescale_arr[0]),) * tile.shape[0]
-
-        for bdx in range(tile.shape[0]):
-            tile[bdx] = np.where(
-                mask,
-                linear_rescale(
-                    tile[bdx], in_range=rescale_arr[bdx], out_range=[0, 255]
-                ),
-                0,
-            )
-        tile = tile.astype(np.uint8)
+        ranges = parse_rescale(rescale)
+        if len(ranges) != tile.shape[0]:
+            ranges = (ranges[0],) * tile.shape[0]
+
+        # Rescale every band at once with per-band (b, 1, 1) bounds, working
+        # in a single float buffer and writing into a preallocated uint8 array.
+        in_range = np.array(ranges, dtype=np.float64)[:, :2, np.newaxis, np.newaxis]
+        imin, imax = in_range[:, 0], in_range[:, 1]
+        data = np.clip(tile, imin, imax, out=np.empty(tile.shape, np.float64))
+        data -= imin
+        data /= imax - imin
+        data *= 255
+        np.copyto(data, 0, where=(mask == 0))
+
+        tile = np.empty(tile.shape, np.uint8)
+        np.copyto(tile, data, casting="unsafe")
 
     if color_formula:
         # make sure one last time we don't have
         # negative value before applying color formula
-        tile[tile < 0] = 0
-        for ops in parse_operations(color_formula):
+        if tile.dtype.kind in ("i", "f"):
+            np.maximum(tile, 0, out=tile)
+        for ops in parse_color_formula(color_formula):
             tile = scale_dtype(ops(to_math_type(tile)), np.uint8)
 
     return tile
 
 
-# from rio-tiler 2.0a5
-def info(address: str) -> Dict:
-    """
-    Return simple metadata about the file.
-
-    Attributes
-    ----------
-    address : str or PathLike object
-        A dataset path or URL. Will be opened in "r" mode.
-
-    Returns
-    -------
-    out : dict.
-
-    """
-    with rasterio.open(address) as src_dst:
-        minzoom, maxzoom = get_zooms(src_dst)
-        bounds = transform_bounds(
-            src_dst.crs, constants.WGS84_CRS, *src_dst.bounds, densify_pts=21
-        )
-        center = [(bounds[0] + bounds[2]) / 2, (bounds[1] + bounds[3]) / 2, minzoom]
-
-        def _get_descr(ix):
-            """Return band description."""
-            name = src_dst.descriptions[ix - 1]
-            if not name:
-                name = "band{}".format(ix)
-            return name
-
-        band_descriptions = [(ix, _get_descr(ix)) for ix in src_dst.indexes]
-        tags = [(ix, src_dst.tags(ix)) for ix in src_dst.indexes]
-
-        other_meta = dict()
-        if src_dst.scales[0] and src_dst.offsets[0]:
-            other_meta.update(dict(scale=src_dst.scales[0]))
-            other_meta.update(dict(offset=src_dst.offsets[0]))
-
-        if has_alpha_band(src_dst):
-            nodata_type = "Alpha"
-        elif has_mask_band(src_dst):
-            nodata_type = "Mask"
-        elif src_dst.nodata is not None:
-            nodata_type = "Nodata"
-        else:
-            nodata_type = "None"
-
-        try:
-            cmap = src_dst.colormap(1)
-            other_meta.update(dict(colormap=cmap))
-        except ValueError:
-            pass
-
-        return dict(
-            address=address,
-            bounds=bounds,
-            center=center,
-            minzoom=minzoom,
-            maxzoom=maxzoom,
-            band_metadata=tags,
-            band_descriptions=band_descriptions,
-            dtype=src_dst.meta["dtype"],
-            colorinterp=[src_dst.colorinterp[ix - 1].name for ix in src_dst.indexes],
-            nodata_type=nodata_type,
-            **other_meta,
-        )
+def compare_tiles(
+    tile: np.ndarray,
+    mask: np.ndarray,
+    other: np.ndarray,
+    other_mask: np.ndarray,
+    method: str = "difference",
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the float32 difference or ratio of two tiles, valid in both."""
+    valid = (mask > 0) & (other_mask > 0)
+    data = tile.astype(np.float32)
+    if method == "ratio":
+        valid &= np.all(other != 0, axis=0)
+        np.divide(data, other, out=data, where=valid)
+    else:
+        data -= other
+
+    data[:, ~valid] = 0
+    return data, np.where(valid, np.uint8(255), np.uint8(0))
 
 
 # This code is copied from marblecutter
@@ -159,6 +138,41 @@ class Timer(object):
         self.elapsed = self.end - self.start
 
 
+class SingleFlight(object):
+    """
+    Coalesce concurrent calls sharing a key into a single execution.
+
+    The first caller for a key runs the coroutine; callers arriving while it
+    is in flight await the same result (or exception) instead of running it
+    again. The execution is shielded, so a cancelled caller does not cancel
+    it for the others.
+
+    """
+
+    def __init__(self):
+        """Init Single Flight."""
+        self._calls: Dict[str, asyncio.Future] = {}
+        self.leaders = 0
+        self.shared = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable]) -> Tuple[Any, bool]:
+        """Return the result of `fn()` and whether it was shared with another call."""
+        call = self._calls.get(key)
+        if call is not None:
+            self.shared += 1
+            return await asyncio.shield(call), True
+
+        call = asyncio.ensure_future(fn())
+        self._calls[key] = call
+        call.add_done_callback(lambda _: self._calls.pop(key, None))
+        self.leaders += 1
+        return await asyncio.shield(call), False
+
+    def stats(self) -> Dict:
+        """Return coalescing counters."""
+        return dict(inflight=len(self._calls), leaders=self.leaders, shared=self.shared)
+
+
 # from https://gist.github.com/perrygeo/721040f8545272832a42#file-pctcover-png
 # author: @perrygeo
 def _rasterize_geom(geom, shape, affinetrans, all_touched):
@@ -677,3 +691,66 @@ COLOR_MAP_NAMES = [
 
 
 ColorMapName = Enum("ColorMapNames", [(a, a) for a in COLOR_MAP_NAMES])  # type: ignore
+
+
+@lru_cache(maxsize=len(COLOR_MAP_NAMES))
+def get_colormap_lut(name: str) -> np.ndarray:
+    """
+    Return the compiled lookup table of a colormap.
+
+    The GDAL RGBA color table is compiled once into a read-only 256x4 uint8
+    LUT, stored channel-first (4, 256) so that indexing it with a band gives
+    a contiguous (4, height, width) RGBA array.
+
+    """
+    cmap = get_custom_cmap(name) if name.startswith("custom_") else get_colormap(name)
+    lut = np.ascontiguousarray(make_lut(cmap).T)
+    lut.setflags(write=False)
+    return lut
+
+
+def apply_colormap(
+    tile: np.ndarray, mask: np.ndarray, lut: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Apply a compiled colormap on 1 band data, returning RGB data and mask."""
+    if tile.shape[0] > 1:
+        raise Exception("Source data must be 1 band")
+
+    rgba = lut[:, tile[0]]
+    return rgba[:-1], np.where(mask, rgba[-1], 0).astype(np.uint8)
+
+
+def parse_date(value: str) -> datetime.date:
+    """Parse the date of a YYYY-MM-DD date or datetime."""
+    return datetime.datetime.strptime(value[:10], config.DT_FORMAT).date()
+
+
+def expand_dates(
+    domain: List[str],
+    time_unit: str = "day",
+    is_periodic: bool = False,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+) -> List[datetime.date]:
+    """Return the dates of a dataset domain, within the optional start/end dates."""
+    dates = sorted({parse_date(d) for d in domain})
+    if is_periodic and dates:
+        first, last = dates[0], dates[-1]
+        dates = []
+        current = first
+        while current <= last:
+            dates.append(current)
+            if time_unit == "month":
+                month = current.month % 12 + 1
+                current = current.replace(
+                    year=current.year + (current.month == 12), month=month
+                )
+            else:
+                current += datetime.timedelta(days=1)
+
+    if start:
+        dates = [d for d in dates if d >= parse_date(start)]
+    if end:
+        dates = [d for d in dates if d <= parse_date(end)]
+
+    return dates
@@ -32,6 +32,24 @@ MEMCACHE_HOST = os.environ.get("MEMCACHE_HOST")
 MEMCACHE_PORT = int(os.environ.get("MEMCACHE_PORT", 11211))
 MEMCACHE_USERNAME = os.environ.get("MEMCACHE_USERNAME")
 MEMCACHE_PASSWORD = os.environ.get("MEMCACHE_PASSWORD")
+# Persistent memcached connections, per pool (one for threads, one for asyncio)
+MEMCACHE_POOL_SIZE = int(os.environ.get("MEMCACHE_POOL_SIZE", 8))
+MEMCACHE_TIMEOUT = float(os.environ.get("MEMCACHE_TIMEOUT", 1.0))
+# Close connections idle for longer, in seconds
+MEMCACHE_IDLE_TIMEOUT = float(os.environ.get("MEMCACHE_IDLE_TIMEOUT", 60))
+# Check connections idle for longer with a NOOP before reusing them, in seconds
+MEMCACHE_HEALTH_CHECK_INTERVAL = float(
+    os.environ.get("MEMCACHE_HEALTH_CHECK_INTERVAL", 30)
+)
+# In-process LRU tier in front of memcached, in bytes (0 disables it)
+L1_CACHE_BYTES = int(os.environ.get("L1_CACHE_BYTES", 32 * 1024 * 1024))
+# In-process TTL of tiles read from memcached, in seconds
+L1_PROMOTION_TTL = int(os.environ.get("L1_PROMOTION_TTL", 300))
+
+# Response compression (text, JSON and raw arrays only)
+COMPRESSION_MIN_SIZE = int(os.environ.get("COMPRESSION_MIN_SIZE", 500))
+GZIP_LEVEL = int(os.environ.get("GZIP_LEVEL", 6))
+BROTLI_QUALITY = int(os.environ.get("BROTLI_QUALITY", 4))
 
 BUCKET = os.environ.get("BUCKET", config_object["BUCKET"])
 
@@ -45,3 +63,67 @@ SITE_METADATA_FILENAME = os.environ.get(
 
 DT_FORMAT = "%Y-%m-%d"
 MT_FORMAT = "%Y%m"
+
+# zlib level of the raw array (npy) tiles, 0 leaves the compression to the
+# HTTP compression middleware and to the cache
+ARRAY_COMPRESSION_LEVEL = int(os.environ.get("ARRAY_COMPRESSION_LEVEL", 0))
+
+# Render an NxN block of tiles on each tile cache miss (1 disables metatiles)
+METATILE_SIZE = int(os.environ.get("METATILE_SIZE", 1))
+
+# Serve WebP to clients accepting it when the tile format is omitted, lossy
+# for fully valid tiles and lossless otherwise (0 disables it)
+WEBP_NEGOTIATION = int(os.environ.get("WEBP_NEGOTIATION", 1))
+# Default WebP quality (1-100) and effort (0-6), per dataset with the
+# webp_quality and webp_effort tile parameters
+WEBP_QUALITY = int(os.environ.get("WEBP_QUALITY", 75))
+WEBP_EFFORT = int(os.environ.get("WEBP_EFFORT", 4))
+
+# Batch tile endpoint
+BATCH_MAX_TILES = int(os.environ.get("BATCH_MAX_TILES", 256))
+BATCH_MAX_WORKERS = int(os.environ.get("BATCH_MAX_WORKERS", 8))
+
+# Thread pools of raster reads, tile rendering and metadata requests: workers
+# and calls allowed to wait for one before requests are rejected with a 503
+RASTER_READ_WORKERS = int(os.environ.get("RASTER_READ_WORKERS", 16))
+RASTER_READ_QUEUE = int(os.environ.get("RASTER_READ_QUEUE", 64))
+CPU_RENDER_WORKERS = int(os.environ.get("CPU_RENDER_WORKERS", os.cpu_count() or 4))
+CPU_RENDER_QUEUE = int(os.environ.get("CPU_RENDER_QUEUE", 64))
+METADATA_WORKERS = int(os.environ.get("METADATA_WORKERS", 4))
+METADATA_QUEUE = int(os.environ.get("METADATA_QUEUE", 16))
+# Retry-After of the 503 responses, in seconds
+EXECUTOR_RETRY_AFTER = int(os.environ.get("EXECUTOR_RETRY_AFTER", 1))
+
+# Mosaic tiles: assets used per tile (the first ones) and concurrent asset reads
+MOSAIC_MAX_ASSETS = int(os.environ.get("MOSAIC_MAX_ASSETS", 20))
+MOSAIC_CONCURRENCY = int(os.environ.get("MOSAIC_CONCURRENCY", 4))
+# STAC API searched for the assets of a collection mosaic
+STAC_API_URL = os.environ.get("STAC_API_URL", config_object.get("STAC_API_URL"))
+STAC_SEARCH_LIMIT = int(os.environ.get("STAC_SEARCH_LIMIT", 500))
+STAC_SEARCH_TTL = int(os.environ.get("STAC_SEARCH_TTL", 600))
+
+# Time-series tiles: maximum dates per request and concurrent frame renderings
+TIMESERIES_MAX_DATES = int(os.environ.get("TIMESERIES_MAX_DATES", 60))
+TIMESERIES_CONCURRENCY = int(os.environ.get("TIMESERIES_CONCURRENCY", 8))
+
+# Largest side of the /preview and /bbox images, in pixels
+PREVIEW_MAX_SIZE = int(os.environ.get("PREVIEW_MAX_SIZE", 2048))
+
+# Point queries: maximum points and dates per request, concurrent date reads
+POINT_MAX_POINTS = int(os.environ.get("POINT_MAX_POINTS", 1000))
+POINT_MAX_DATES = int(os.environ.get("POINT_MAX_DATES", 366))
+POINT_CONCURRENCY = int(os.environ.get("POINT_CONCURRENCY", 8))
+
+# Process-wide pool of open COG dataset handles
+DATASET_POOL_SIZE = int(os.environ.get("DATASET_POOL_SIZE", 32))
+DATASET_POOL_TTL = int(os.environ.get("DATASET_POOL_TTL", 300))
+
+# Per-URL index of COG bounds and zoom range used to skip out-of-footprint tiles
+FOOTPRINT_INDEX_SIZE = int(os.environ.get("FOOTPRINT_INDEX_SIZE", 1024))
+FOOTPRINT_INDEX_TTL = int(os.environ.get("FOOTPRINT_INDEX_TTL", 3600))
+
+# Memcached render lock TTL in seconds, shared across workers (0 disables it)
+TILE_LOCK_TIMEOUT = int(os.environ.get("TILE_LOCK_TIMEOUT", 0))
+
+# Memcached TTL of empty (204) and missing (404) tile reads, errors are not cached
+NEGATIVE_CACHE_TTL = int(os.environ.get("NEGATIVE_CACHE_TTL", 300))
@@ -0,0 +1,299 @@
+"""
+dashboard_api.core.metrics: process metrics in Prometheus text format.
+
+Every thread records into its own shard of each metric, without locks (only
+the first record of a thread registers its shard). Shards are merged when
+the metrics are exposed.
+
+"""
+
+import abc
+import asyncio
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Sequence, Tuple, TypeVar
+
+PREFIX = "dashboard_api"
+
+# Seconds, from a cached tile to a slow S3 read
+DEFAULT_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[Any]) -> str:
+    if not names:
+        return ""
+    labels = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+    return "{" + labels + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric(abc.ABC):
+    """Metric with per-thread shards of values by label values."""
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        """Init Metric."""
+        self.name = f"{PREFIX}_{name}"
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards: List[Dict] = []
+        self._lock = threading.Lock()
+
+    def _shard(self) -> Dict:
+        try:
+            return self._local.values
+        except AttributeError:
+            values = self._local.values = {}
+            with self._lock:
+                self._shards.append(values)
+            return values
+
+    def _snapshots(self) -> List[Dict]:
+        with self._lock:
+            shards = list(self._shards)
+        # dict.copy is atomic: owners keep writing while shards are copied
+        return [shard.copy() for shard in shards]
+
+    @abc.abstractmethod
+    def samples(self) -> Iterator[Tuple[str, Tuple, float]]:
+        """Yield suffix, label values and value of every sample."""
+
+    def expose(self) -> str:
+        """Return the metric in Prometheus text format."""
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        for suffix, labels, value in self.samples():
+            names = self.labelnames + (("le",) if suffix == "_bucket" else ())
+            lines.append(
+                f"{self.name}{suffix}{_format_labels(names, labels)} {_format_value(value)}"
+            )
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """Monotonic counter."""
+
+    type = "counter"
+
+    def inc(self, *labels: Any, amount: float = 1):
+        """Increment the counter of the label values."""
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def values(self) -> Dict[Tuple, float]:
+        """Return the counts by label values."""
+        totals: Dict[Tuple, float] = {}
+        for shard in self._snapshots():
+            for labels, value in shard.items():
+                totals[labels] = totals.get(labels, 0) + value
+        return totals
+
+    def samples(self) -> Iterator[Tuple[str, Tuple, float]]:
+        """Yield suffix, label values and value of every sample."""
+        for labels, value in sorted(self.values().items()):
+            yield "_total", labels, value
+
+
+class Histogram(Metric):
+    """Histogram of observed values (durations in seconds)."""
+
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        """Init Histogram."""
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels: Any):
+        """Record a value for the label values."""
+        shard = self._shard()
+        counts = shard.get(labels)
+        if counts is None:
+            # Per bucket counts, the +Inf bucket, then the sum of the values
+            counts = shard[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    @contextmanager
+    def time(self, *labels: Any) -> Iterator[None]:
+        """Record the duration of a code block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def values(self) -> Dict[Tuple, List[float]]:
+        """Return per bucket counts and the sum by label values."""
+        totals: Dict[Tuple, List[float]] = {}
+        for shard in self._snapshots():
+            for labels, counts in shard.items():
+                total = totals.setdefault(labels, [0] * len(counts))
+                for i, count in enumerate(list(counts)):
+                    total[i] += count
+        return totals
+
+    def samples(self) -> Iterator[Tuple[str, Tuple, float]]:
+        """Yield suffix, label values and value of every sample."""
+        bounds = self.buckets + (float("inf"),)
+        for labels, counts in sorted(self.values().items()):
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                yield "_bucket", labels + (_format_value(bound),), cumulative
+            yield "_sum", labels, counts[-1]
+            yield "_count", labels, cumulative
+
+
+class Gauge(Metric):
+    """Gauge read from a callback returning the values by label values."""
+
+    type = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        callback: Callable[[], Dict[Tuple, float]] = dict,
+    ):
+        """Init Gauge."""
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def samples(self) -> Iterator[Tuple[str, Tuple, float]]:
+        """Yield suffix, label values and value of every sample."""
+        for labels, value in sorted(self.callback().items()):
+            yield "", labels, value
+
+
+M = TypeVar("M", bound=Metric)
+
+
+class Registry(object):
+    """Collection of metrics."""
+
+    def __init__(self):
+        """Init Registry."""
+        self.metrics: List[Metric] = []
+
+    def register(self, metric: M) -> M:
+        """Add a metric."""
+        self.metrics.append(metric)
+        return metric
+
+    def expose(self) -> str:
+        """Return all the metrics in Prometheus text format."""
+        return "\n".join(metric.expose() for metric in self.metrics) + "\n"
+
+
+executors: Dict[str, Any] = {}
+
+
+def register_executor(name: str, executor: Any):
+    """Report the queue depth of a thread pool executor."""
+    executors[name] = executor
+
+
+def _queue_depths() -> Dict[Tuple, float]:
+    pools = dict(executors)
+    try:
+        # run_in_threadpool runs in the event loop default executor
+        default = getattr(asyncio.get_event_loop(), "_default_executor", None)
+    except RuntimeError:
+        default = None
+    if default is not None:
+        pools.setdefault("default", default)
+
+    return {
+        (name,): pool._work_queue.qsize()
+        for name, pool in pools.items()
+        if hasattr(pool, "_work_queue")
+    }
+
+
+REGISTRY = Registry()
+
+REQUEST_LATENCY = REGISTRY.register(
+    Histogram(
+        "request_duration_seconds",
+        "HTTP request latency by route.",
+        ("route", "method", "status"),
+    )
+)
+TILE_STAGE_LATENCY = REGISTRY.register(
+    Histogram(
+        "tile_stage_duration_seconds",
+        "Tile rendering latency by stage.",
+        ("stage",),
+    )
+)
+CACHE_REQUESTS = REGISTRY.register(
+    Counter(
+        "cache_requests",
+        "Cache lookups by value type and result.",
+        ("cache", "result"),
+    )
+)
+CACHE_ERRORS = REGISTRY.register(
+    Counter("cache_errors", "Failed memcached requests by client.", ("client",))
+)
+S3_LATENCY = REGISTRY.register(
+    Histogram("s3_request_duration_seconds", "S3 call latency.", ("operation",))
+)
+EXECUTOR_WAIT = REGISTRY.register(
+    Histogram(
+        "executor_wait_seconds",
+        "Time calls wait for a thread, by executor.",
+        ("executor",),
+    )
+)
+EXECUTOR_RUN = REGISTRY.register(
+    Histogram("executor_run_seconds", "Call duration by executor.", ("executor",))
+)
+EXECUTOR_REJECTED = REGISTRY.register(
+    Counter("executor_rejected", "Calls rejected by a full executor.", ("executor",))
+)
+THREADPOOL_QUEUE_DEPTH = REGISTRY.register(
+    Gauge(
+        "threadpool_queue_depth",
+        "Tasks waiting for a thread, by pool.",
+        ("pool",),
+        _queue_depths,
+    )
+)
@@ -0,0 +1,292 @@
+"""
+dashboard_api.db.aiomemcache: asyncio memcached client.
+
+A small client of the memcached binary protocol, compatible with the values
+written by python-binary-memcached (same flags and serialization), with a
+bounded pool of connections, SASL PLAIN authentication and pipelined
+multi-get.
+
+"""
+
+import asyncio
+import pickle
+import struct
+import zlib
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)
+
+from bmemcached.protocol import Protocol
+
+from dashboard_api.core.metrics import CACHE_ERRORS
+
+HEADER = struct.Struct("!BBHBBHLLQ")
+REQUEST = 0x80
+RESPONSE = 0x81
+
+GET = 0x00
+SET = 0x01
+ADD = 0x02
+DELETE = 0x04
+NOOP = 0x0A
+GETKQ = 0x0D
+SASL_AUTH = 0x21
+
+SUCCESS = 0x00
+
+FLAGS = Protocol.FLAGS
+
+
+class MemcacheError(Exception):
+    """Memcached protocol or connection error."""
+
+
+def serialize(value: Any) -> Tuple[int, bytes]:
+    """Serialize a value like python-binary-memcached, without compression."""
+    if isinstance(value, bytes):
+        return FLAGS["binary"], value
+    if isinstance(value, str):
+        return 0, value.encode("utf8")
+    if isinstance(value, int) and not isinstance(value, bool):
+        return FLAGS["integer"], str(value).encode()
+    return FLAGS["object"], pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+
+def deserialize(value: bytes, flags: int) -> Any:
+    """Deserialize a value written by python-binary-memcached."""
+    if flags & FLAGS["compressed"]:
+        value = zlib.decompress(value)
+    if flags & FLAGS["binary"]:
+        return value
+    if flags & (FLAGS["integer"] | FLAGS["long"]):
+        return int(value)
+    if flags & FLAGS["object"]:
+        return pickle.loads(value)
+    return value.decode("utf8")
+
+
+class Connection(object):
+    """A memcached connection."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Init Connection."""
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def open(
+        cls,
+        host: str,
+        port: int,
+        user: Optional[str] = None,
+        password: Optional[str] = None,
+    ) -> "Connection":
+        """Open (and authenticate) a connection."""
+        reader, writer = await asyncio.open_connection(host, port)
+        conn = cls(reader, writer)
+        if user and password:
+            try:
+                await conn.authenticate(user, password)
+            except Exception:
+                conn.close()
+                raise
+        return conn
+
+    def close(self):
+        """Close the connection."""
+        self.writer.close()
+
+    def send(self, opcode: int, key: bytes = b"", extras: bytes = b"", value=b""):
+        """Buffer a request."""
+        self.writer.write(
+            HEADER.pack(
+                REQUEST,
+                opcode,
+                len(key),
+                len(extras),
+                0,
+                0,
+                len(key) + len(extras) + len(value),
+                0,
+                0,
+            )
+            + extras
+            + key
+            + value
+        )
+
+    async def receive(self) -> Tuple[int, int, bytes, bytes, bytes]:
+        """Read a response. Returns opcode, status, extras, key and value."""
+        header = await self.reader.readexactly(HEADER.size)
+        (magic, opcode, keylen, extlen, _, status, bodylen, _, _) = HEADER.unpack(
+            header
+        )
+        if magic != RESPONSE:
+            raise MemcacheError(f"Invalid response magic: {magic}")
+
+        body = await self.reader.readexactly(bodylen) if bodylen else b""
+        extras = body[:extlen]
+        key = body[extlen : extlen + keylen]
+        return opcode, status, extras, key, body[extlen + keylen :]
+
+    async def request(
+        self, opcode: int, key: bytes = b"", extras: bytes = b"", value=b""
+    ) -> Tuple[int, bytes, bytes]:
+        """Send a request and read its response. Returns status, extras, value."""
+        self.send(opcode, key, extras, value)
+        await self.writer.drain()
+        _, status, extras, _, value = await self.receive()
+        return status, extras, value
+
+    async def authenticate(self, user: str, password: str):
+        """Authenticate with SASL PLAIN."""
+        status, _, value = await self.request(
+            SASL_AUTH, b"PLAIN", value=f"\x00{user}\x00{password}".encode()
+        )
+        if status != SUCCESS:
+            raise MemcacheError(f"Authentication failed: {value!r}")
+
+
+class AsyncClient(object):
+    """asyncio memcached client with a bounded connection pool."""
+
+    def __init__(
+        self,
+        host: str,
+        port: int = 11211,
+        user: Optional[str] = None,
+        password: Optional[str] = None,
+        pool_size: int = 8,
+        timeout: float = 1.0,
+    ):
+        """Init Async Client."""
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pool: "asyncio.Queue[Optional[Connection]]"
+        self.counters: Counter = Counter()
+
+    def _get_pool(self) -> "asyncio.Queue[Optional[Connection]]":
+        # Connections and queues are bound to the loop they were created in.
+        loop = asyncio.get_event_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._pool = asyncio.Queue()
+            for _ in range(self.pool_size):
+                self._pool.put_nowait(None)
+        return self._pool
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[Connection]:
+        """Lease a pooled connection, opening it if needed."""
+        pool = self._get_pool()
+        conn = await pool.get()
+        try:
+            if conn is None:
+                conn = await asyncio.wait_for(
+                    Connection.open(self.host, self.port, self.user, self.password),
+                    self.timeout,
+                )
+                self.counters["created"] += 1
+            else:
+                self.counters["reused"] += 1
+            yield conn
+        except BaseException:
+            # The connection may hold a partial response: never reuse it.
+            if conn is not None:
+                conn.close()
+            pool.put_nowait(None)
+            self.counters["errors"] += 1
+            CACHE_ERRORS.inc("async")
+            raise
+        else:
+            pool.put_nowait(conn)
+
+    def stats(self) -> Dict:
+        """Return pool counters."""
+        idle = self._pool.qsize() if self._loop is not None else self.pool_size
+        return dict(self.counters, size=self.pool_size, idle=idle)
+
+    async def _run(
+        self, fn: Callable[[Connection], Awaitable[Any]], retry: bool = True
+    ) -> Any:
+        # Reconnect once: a pooled connection may have been closed by the server.
+        # Not for add: the server may have applied it before the connection failed.
+        try:
+            async with self.connection() as conn:
+                return await asyncio.wait_for(fn(conn), self.timeout)
+        except (OSError, asyncio.IncompleteReadError):
+            if not retry:
+                raise
+            async with self.connection() as conn:
+                return await asyncio.wait_for(fn(conn), self.timeout)
+
+    async def _request(
+        self, opcode: int, key: str, extras=b"", value=b"", retry: bool = True
+    ):
+        return await self._run(
+            lambda conn: conn.request(opcode, key.encode(), extras, value), retry
+        )
+
+    async def get(self, key: str) -> Any:
+        """Get a value, None on a miss."""
+        status, extras, value = await self._request(GET, key)
+        if status != SUCCESS:
+            return None
+        (flags,) = struct.unpack("!L", extras[:4])
+        return deserialize(value, flags)
+
+    async def get_multi(self, keys: List[str]) -> Dict[str, Any]:
+        """Get values of several keys in one round trip."""
+
+        async def _get_multi(conn: Connection) -> Dict[str, Any]:
+            for key in keys:
+                conn.send(GETKQ, key.encode())
+            conn.send(NOOP)
+            await conn.writer.drain()
+
+            values = {}
+            while True:
+                opcode, status, extras, key, value = await conn.receive()
+                if opcode == NOOP:
+                    return values
+                if status == SUCCESS:
+                    (flags,) = struct.unpack("!L", extras[:4])
+                    values[key.decode()] = deserialize(value, flags)
+
+        return await self._run(_get_multi)
+
+    async def _store(
+        self, opcode: int, key: str, value: Any, time: int, retry: bool = True
+    ) -> bool:
+        flags, data = serialize(value)
+        status, _, _ = await self._request(
+            opcode, key, struct.pack("!LL", flags, time), data, retry
+        )
+        return status == SUCCESS
+
+    async def set(self, key: str, value: Any, time: int = 0) -> bool:
+        """Set a value."""
+        return await self._store(SET, key, value, time)
+
+    async def add(self, key: str, value: Any, time: int = 0) -> bool:
+        """Set a value only if the key does not exist. Errors are not retried."""
+        return await self._store(ADD, key, value, time, retry=False)
+
+    async def delete(self, key: str) -> bool:
+        """Delete a key."""
+        status, _, _ = await self._request(DELETE, key)
+        return status == SUCCESS
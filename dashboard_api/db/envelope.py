@@ -0,0 +1,179 @@
+"""
+dashboard_api.db.envelope: binary format of the cached values.
+
+Every value is a fixed 11 bytes header, the ETag of the value and the payload:
+
+    magic (2s) | version (B) | value type (B) | codec (B) | ext (B) | crc32 (I)
+    | ETag length (B)
+
+The ETag is kept next to the payload so that both expire together, and can
+be read without decoding the payload. Version 1 values, without the ETag
+length and ETag, are still read. The CRC is computed on the uncompressed
+payload. The payload is compressed
+with zstd, LZ4 (when installed) or zlib only for the value types worth it:
+JSON and raw arrays or GeoTIFFs, not PNG, JPEG or WEBP tiles.
+
+"""
+
+import struct
+import zlib
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from dashboard_api.ressources.enums import ImageType
+
+try:
+    import zstandard
+except ImportError:  # pragma: nocover
+    zstandard = None  # type: ignore
+
+try:
+    import lz4.frame as lz4
+except ImportError:  # pragma: nocover
+    lz4 = None  # type: ignore
+
+HEADER = struct.Struct(">2sBBBBIB")
+HEADER_V1 = struct.Struct(">2sBBBBI")
+MAGIC = b"\xdaE"
+VERSION = 2
+
+# Value types
+IMAGE = 1
+JSON = 2
+# An ETag without payload, for responses that are not cached
+VALIDATOR = 3
+
+# Codecs
+RAW = 0
+ZLIB = 1
+ZSTD = 2
+LZ4 = 3
+
+# Stable ext codes, independent of the ImageType declaration order
+EXT_CODES: Dict[ImageType, int] = {
+    ImageType.png: 1,
+    ImageType.npy: 2,
+    ImageType.tif: 3,
+    ImageType.jpg: 4,
+    ImageType.webp: 5,
+}
+EXTS = {code: ext for ext, code in EXT_CODES.items()}
+
+COMPRESSIBLE_EXTS = (ImageType.npy, ImageType.tif)
+MIN_COMPRESS_SIZE = 256
+
+
+class Envelope(NamedTuple):
+    """Decoded cached value."""
+
+    value_type: int
+    ext: Optional[ImageType]
+    payload: bytes
+    etag: Optional[str] = None
+
+
+def default_codec() -> int:
+    """Return the best available codec."""
+    if zstandard is not None:
+        return ZSTD
+    if lz4 is not None:
+        return LZ4
+    return ZLIB
+
+
+def _compress(codec: int, payload: bytes) -> bytes:
+    if codec == ZSTD:
+        return zstandard.ZstdCompressor(level=3).compress(payload)
+    if codec == LZ4:
+        return lz4.compress(payload)
+    return zlib.compress(payload)
+
+
+def _decompress(codec: int, payload: bytes) -> bytes:
+    if codec == ZSTD:
+        return zstandard.ZstdDecompressor().decompress(payload)
+    if codec == LZ4:
+        return lz4.decompress(payload)
+    return zlib.decompress(payload)
+
+
+def pack(
+    payload: bytes,
+    value_type: int,
+    ext: Optional[ImageType] = None,
+    codec: Optional[int] = None,
+    etag: Optional[str] = None,
+) -> bytes:
+    """Wrap a payload and its ETag in an envelope, compressing it if worth it."""
+    if codec is None:
+        compressible = value_type == JSON or ext in COMPRESSIBLE_EXTS
+        codec = (
+            default_codec()
+            if compressible and len(payload) >= MIN_COMPRESS_SIZE
+            else RAW
+        )
+
+    body = payload
+    if codec != RAW:
+        body = _compress(codec, payload)
+        if len(body) >= len(payload):
+            codec, body = RAW, payload
+
+    tag = etag.encode() if etag else b""
+    header = HEADER.pack(
+        MAGIC,
+        VERSION,
+        value_type,
+        codec,
+        EXT_CODES.get(ext, 0) if ext else 0,
+        zlib.crc32(payload),
+        len(tag),
+    )
+    return header + tag + body
+
+
+def is_envelope(value) -> bool:
+    """Check if a cached value is an envelope."""
+    return isinstance(value, bytes) and value[:2] == MAGIC
+
+
+def _unpack_header(value: bytes) -> Tuple[Tuple, Optional[str], int]:
+    """Return the header fields, the ETag and the payload offset of a value."""
+    if len(value) < HEADER_V1.size or value[:2] != MAGIC:
+        raise ValueError("Unknown cache value format")
+
+    version = value[2]
+    if version == 1:
+        return HEADER_V1.unpack_from(value), None, HEADER_V1.size
+    if version != VERSION:
+        raise ValueError("Unknown cache value format")
+
+    if len(value) < HEADER.size:
+        raise ValueError("Truncated cache value")
+    *fields, length = HEADER.unpack_from(value)
+    offset = HEADER.size + length
+    if len(value) < offset:
+        raise ValueError("Truncated cache value")
+    return tuple(fields), value[HEADER.size : offset].decode() or None, offset
+
+
+def read_etag(value: bytes) -> Optional[str]:
+    """Return the ETag of an envelope without decoding its payload."""
+    _, etag, _ = _unpack_header(value)
+    return etag
+
+
+def unpack(value: bytes) -> Envelope:
+    """Decode an envelope. Raises ValueError on corrupted or unknown values."""
+    (_, _, value_type, codec, ext, crc), etag, offset = _unpack_header(value)
+
+    payload = value[offset:]
+    try:
+        if codec != RAW:
+            payload = _decompress(codec, payload)
+    except Exception as e:
+        raise ValueError(f"Cannot decompress cache value: {e}")
+
+    if zlib.crc32(payload) != crc:
+        raise ValueError("Cache value checksum mismatch")
+
+    return Envelope(value_type, EXTS.get(ext), payload, etag)
@@ -1,11 +1,92 @@
 """dashboard_api.cache.memcache: memcached layer."""
 
-from typing import Dict, Optional, Tuple, Union
-
-from bmemcached import Client
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Optional, Tuple, Union
 
+from dashboard_api.core.metrics import CACHE_REQUESTS
+from dashboard_api.db import envelope
+from dashboard_api.db.aiomemcache import AsyncClient
+from dashboard_api.db.memcache_pool import PooledClient
 from dashboard_api.models.static import Datasets
 from dashboard_api.ressources.enums import ImageType
+from dashboard_api.ressources.responses import make_etag
+
+IMAGE_TTL = 432000
+NEGATIVE_TTL = 300
+# In-process TTL of images read from memcached, whose remaining TTL is unknown:
+# bounds how long an L1 entry can outlive its memcached entry
+PROMOTION_TTL = 300
+
+
+class MemoryCache(object):
+    """Byte-budgeted in-process LRU cache with per-entry TTL."""
+
+    def __init__(self, max_bytes: int):
+        """Init Memory Cache."""
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._data: "OrderedDict[str, Tuple[Any, int, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Any:
+        """Return a live entry and mark it as recently used."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, size, expires = entry
+            if expires < time.time():
+                del self._data[key]
+                self.nbytes -= size
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any, size: int, timeout: int) -> bool:
+        """
+        Store an entry, evicting least recently used ones to fit the budget.
+
+        An entry larger than the budget is not stored, and replaces any
+        previous entry of the key so that it is not served stale.
+
+        """
+        with self._lock:
+            previous = self._data.pop(key, None)
+            if previous is not None:
+                self.nbytes -= previous[1]
+
+            if size > self.max_bytes:
+                return False
+
+            self._data[key] = (value, size, time.time() + timeout)
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                _, (_, evicted, _) = self._data.popitem(last=False)
+                self.nbytes -= evicted
+                self.evictions += 1
+
+        return True
+
+    def stats(self) -> Dict:
+        """Return cache counters."""
+        return dict(
+            entries=len(self._data),
+            bytes=self.nbytes,
+            max_bytes=self.max_bytes,
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+        )
 
 
 class CacheLayer(object):
@@ -17,9 +98,139 @@ class CacheLayer(object):
         port: int = 11211,
         user: Optional[str] = None,
         password: Optional[str] = None,
+        local: Optional[MemoryCache] = None,
+        pool_size: int = 8,
+        timeout: float = 1.0,
+        idle_timeout: float = 60.0,
+        health_check_interval: float = 30.0,
+        promotion_ttl: int = PROMOTION_TTL,
     ):
         """Init Cache Layer."""
-        self.client = Client((f"{host}:{port}",), user, password)
+        self.client = PooledClient(
+            host,
+            port,
+            user,
+            password,
+            size=pool_size,
+            timeout=timeout,
+            idle_timeout=idle_timeout,
+            health_check_interval=health_check_interval,
+        )
+        self.local = local
+        self.promotion_ttl = promotion_ttl
+        self.negative_hits: Counter = Counter()
+        self.negative_sets: Counter = Counter()
+        self.value_sizes: Dict[str, Counter] = {}
+
+    def get_image_from_tiers(self, img_hash: str) -> Tuple[bytes, ImageType, str]:
+        """
+        Get image body from the in-process tier, then from memcached.
+
+        Attributes
+        ----------
+            img_hash : str
+                file url.
+
+        Returns
+        -------
+            img : bytes
+                image body.
+            ext : str
+                image ext
+            tier : str
+                "L1" for an in-process hit, "L2" for a memcached hit.
+
+        """
+        if self.local is not None:
+            entry = self.local.get(img_hash)
+            if entry is not None:
+                content, ext = entry
+                CACHE_REQUESTS.inc("tile", "hit_l1")
+                return content, ext, "L1"
+
+        content, ext = self._load_image(self.client.get(img_hash))
+        if self.local is not None and content:
+            self.local.set(img_hash, (content, ext), len(content), self.promotion_ttl)
+
+        CACHE_REQUESTS.inc("tile", "hit_l2" if content else "miss")
+        return content, ext, "L2"
+
+    def _load_image(self, value: Any) -> Tuple[Optional[bytes], Optional[ImageType]]:
+        """Decode a cached image, an envelope or a legacy (bytes, ext) tuple."""
+        if envelope.is_envelope(value):
+            try:
+                entry = envelope.unpack(value)
+            except ValueError:
+                return None, None
+            return entry.payload, entry.ext
+
+        if value:
+            content, ext = value
+            return content, ext
+
+        return None, None
+
+    def _record_size(self, value_type: str, size: int, stored: int):
+        sizes = self.value_sizes.setdefault(value_type, Counter())
+        sizes["values"] += 1
+        sizes["bytes"] += size
+        sizes["stored"] += stored
+
+    def _pack_image(
+        self, img_hash: str, body: Tuple[bytes, ImageType], timeout: int
+    ) -> bytes:
+        """Set an image in the in-process tier and return its envelope."""
+        content, ext = body
+        if self.local is not None:
+            self.local.set(img_hash, body, len(content), timeout)
+
+        value = envelope.pack(
+            content,
+            envelope.IMAGE,
+            ImageType(ext),
+            etag=make_etag(img_hash, content),
+        )
+        self._record_size(ImageType(ext).value, len(content), len(value))
+        return value
+
+    def _load_etag(self, key: str, value: Any) -> Optional[str]:
+        """Return the ETag of a cached value, from its envelope if it has one."""
+        if envelope.is_envelope(value):
+            try:
+                etag = envelope.read_etag(value)
+                if etag is None:
+                    etag = make_etag(key, envelope.unpack(value).payload)
+            except ValueError:
+                return None
+            return etag
+
+        if isinstance(value, tuple):
+            # Legacy (bytes, ext) image
+            return make_etag(key, value[0])
+
+        return None
+
+    def _load_dataset(self, value: Any) -> Union[str, bool]:
+        """Decode a cached JSON response, an envelope or a legacy string."""
+        if envelope.is_envelope(value):
+            try:
+                return envelope.unpack(value).payload.decode()
+            except ValueError:
+                return False
+
+        return value
+
+    def _pack_dataset(self, ds_hash: str, content: bytes) -> bytes:
+        value = envelope.pack(content, envelope.JSON, etag=make_etag(ds_hash, content))
+        self._record_size("json", len(content), len(value))
+        return value
+
+    def value_stats(self) -> Dict:
+        """Return the payload and stored sizes of the values set, by type."""
+        return {
+            value_type: dict(sizes, saved=sizes["bytes"] - sizes["stored"])
+            for value_type, sizes in self.value_sizes.items()
+        }
 
     def get_image_from_cache(self, img_hash: str) -> Tuple[bytes, ImageType]:
         """
@@ -38,14 +249,14 @@ class CacheLayer(object):
                 image ext
 
         """
-        content, ext = self.client.get(img_hash)
+        content, ext, _ = self.get_image_from_tiers(img_hash)
         return content, ext
 
     def set_image_cache(
-        self, img_hash: str, body: Tuple[bytes, ImageType], timeout: int = 432000
+        self, img_hash: str, body: Tuple[bytes, ImageType], timeout: int = IMAGE_TTL
     ) -> bool:
         """
-        Set base64 encoded image body in cache layer.
+        Set image body in cache layer, as a binary envelope.
 
         Attributes
         ----------
@@ -58,20 +269,316 @@ class CacheLayer(object):
             bool
 
         """
+        value = self._pack_image(img_hash, body, timeout)
+        try:
+            # Already compressed (or not worth it): skip client compression
+            return self.client.set(img_hash, value, time=timeout, compress_level=0)
+        except Exception:
+            return False
+
+    def get_etag(self, key: str) -> Optional[str]:
+        """
+        Get the validator of a cached entry without decoding its body.
+
+        ETags are stored in the envelope of the entries, so that an ETag
+        never outlives the body it was computed from.
+
+        """
+        if self.local is not None:
+            entry = self.local.get(key)
+            if entry is not None:
+                return make_etag(key, entry[0])
+
+        try:
+            return self._load_etag(key, self.client.get(key))
+        except Exception:
+            return None
+
+    def set_etag(self, key: str, etag: str, timeout: int = IMAGE_TTL) -> bool:
+        """Set the validator of a response whose body is not cached."""
+        value = envelope.pack(b"", envelope.VALIDATOR, etag=etag)
+        try:
+            return self.client.set(key, value, time=timeout, compress_level=0)
+        except Exception:
+            return False
+
+    def get_negative(self, key: str) -> Optional[int]:
+        """
+        Get the status of a cached failed read of `key`.
+
+        Negative entries are stored under `neg:{key}` with the HTTP status of
+        the failure as value: 204 (empty), 404 (missing) or 500 (error).
+
+        """
+        neg_key = f"neg:{key}"
+        status = self.local.get(neg_key) if self.local is not None else None
+        if status is None:
+            try:
+                status = self.client.get(neg_key)
+            except Exception:
+                status = None
+
+        return self._count_negative(status)
+
+    def _count_negative(self, status: Optional[int]) -> Optional[int]:
+        if not status:
+            return None
+
+        self.negative_hits[status] += 1
+        return status
+
+    def set_negative(self, key: str, status: int, timeout: int = NEGATIVE_TTL) -> bool:
+        """Set the status of a failed read of `key`."""
+        neg_key = f"neg:{key}"
+        self.negative_sets[status] += 1
+        if self.local is not None:
+            self.local.set(neg_key, status, 8, timeout)
+
+        try:
+            return self.client.set(neg_key, status, time=timeout)
+        except Exception:
+            return False
+
+    def negative_stats(self) -> Dict:
+        """Return negative cache counters, by status."""
+        return dict(
+            hits={str(k): v for k, v in self.negative_hits.items()},
+            sets={str(k): v for k, v in self.negative_sets.items()},
+        )
+
+    def acquire_lock(self, key: str, timeout: int) -> bool:
+        """
+        Try to take a cross-process lock, released after `timeout` seconds.
+
+        Uses memcached `add`, which only succeeds if the key does not exist.
+        Fails open: returns True if memcached cannot be reached.
+
+        """
+        try:
+            return bool(self.client.add(f"lock:{key}", 1, time=timeout))
+        except Exception:
+            return True
+
+    def release_lock(self, key: str) -> bool:
+        """Release a cross-process lock."""
         try:
-            return self.client.set(img_hash, body, time=timeout)
+            return self.client.delete(f"lock:{key}")
         except Exception:
             return False
 
-    def get_dataset_from_cache(self, ds_hash: str) -> Union[Dict, bool]:
+    def get_footprint(self, key: str) -> Optional[Dict]:
+        """Get COG footprint from cache layer"""
+        try:
+            return self.client.get(key)
+        except Exception:
+            return None
+
+    def set_footprint(self, key: str, footprint: Dict, timeout: int = 3600) -> bool:
+        """Set COG footprint in cache layer"""
+        try:
+            return self.client.set(key, footprint, time=timeout)
+        except Exception:
+            return False
+
+    def get_dataset_from_cache(self, ds_hash: str) -> Union[str, bool]:
         """Get dataset response from cache layer"""
-        return self.client.get(ds_hash)
+        content = self._load_dataset(self.client.get(ds_hash))
+        CACHE_REQUESTS.inc("json", "hit_l2" if content else "miss")
+        return content
 
     def set_dataset_cache(
         self, ds_hash: str, body: Datasets, timeout: int = 3600
     ) -> bool:
         """Set dataset response in cache layer"""
+        content = body.json().encode()
+        value = self._pack_dataset(ds_hash, content)
+        try:
+            return self.client.set(ds_hash, value, time=timeout, compress_level=0)
+        except Exception:
+            return False
+
+
+class AsyncCacheLayer(object):
+    """
+    asyncio Memcache Wrapper, for the async endpoints.
+
+    Same interface as `CacheLayer`, with coroutines, over a pool of asyncio
+    connections. The in-process tier and counters are shared with `sync`,
+    the CacheLayer used by code running in threads (metatiles, footprints).
+
+    """
+
+    def __init__(
+        self,
+        host,
+        port: int = 11211,
+        user: Optional[str] = None,
+        password: Optional[str] = None,
+        sync: Optional[CacheLayer] = None,
+        pool_size: int = 8,
+        timeout: float = 1.0,
+    ):
+        """Init Async Cache Layer."""
+        self.client = AsyncClient(host, port, user, password, pool_size, timeout)
+        self.sync = sync or CacheLayer(host, port, user, password)
+        self.local = self.sync.local
+
+    async def get_image_from_tiers(self, img_hash: str) -> Tuple[bytes, ImageType, str]:
+        """Get image body from the in-process tier, then from memcached."""
+        content, ext, tier, _ = await self.get_tile_from_tiers(img_hash, False)
+        return content, ext, tier
+
+    async def get_tile_from_tiers(
+        self, img_hash: str, negative: bool = True
+    ) -> Tuple[Optional[bytes], Optional[ImageType], str, Optional[int]]:
+        """
+        Get image body and negative entry status in one round trip.
+
+        Returns
+        -------
+            img : bytes
+                image body, None on a miss.
+            ext : str
+                image ext
+            tier : str
+                "L1" for an in-process hit, "L2" for a memcached hit.
+            status : int
+                status of a cached failed read, None if there is none.
+
+        """
+        neg_key = f"neg:{img_hash}"
+        if self.local is not None:
+            entry = self.local.get(img_hash)
+            if entry is not None:
+                content, ext = entry
+                CACHE_REQUESTS.inc("tile", "hit_l1")
+                return content, ext, "L1", None
+
+            if negative:
+                status = self.local.get(neg_key)
+                if status is not None:
+                    CACHE_REQUESTS.inc("tile", "negative")
+                    return None, None, "L1", self.sync._count_negative(status)
+
+        keys = [img_hash, neg_key] if negative else [img_hash]
+        try:
+            values = await self.client.get_multi(keys)
+        except Exception:
+            values = {}
+
+        content, ext = self.sync._load_image(values.get(img_hash))
+        if content:
+            if self.local is not None:
+                self.local.set(
+                    img_hash, (content, ext), len(content), self.sync.promotion_ttl
+                )
+            CACHE_REQUESTS.inc("tile", "hit_l2")
+            return content, ext, "L2", None
+
+        status = self.sync._count_negative(values.get(neg_key))
+        CACHE_REQUESTS.inc("tile", "negative" if status else "miss")
+        return None, None, "L2", status
+
+    async def get_image_from_cache(self, img_hash: str) -> Tuple[bytes, ImageType]:
+        """Get image body from cache layer."""
+        content, ext, _ = await self.get_image_from_tiers(img_hash)
+        return content, ext
+
+    async def set_image_cache(
+        self, img_hash: str, body: Tuple[bytes, ImageType], timeout: int = IMAGE_TTL
+    ) -> bool:
+        """Set image body in cache layer, as a binary envelope."""
+        value = self.sync._pack_image(img_hash, body, timeout)
+        try:
+            return await self.client.set(img_hash, value, time=timeout)
+        except Exception:
+            return False
+
+    async def get_etag(self, key: str) -> Optional[str]:
+        """Get the validator of a cached entry without decoding its body."""
+        if self.local is not None:
+            entry = self.local.get(key)
+            if entry is not None:
+                return make_etag(key, entry[0])
+
+        try:
+            return self.sync._load_etag(key, await self.client.get(key))
+        except Exception:
+            return None
+
+    async def set_etag(self, key: str, etag: str, timeout: int = IMAGE_TTL) -> bool:
+        """Set the validator of a response whose body is not cached."""
+        value = envelope.pack(b"", envelope.VALIDATOR, etag=etag)
+        try:
+            return await self.client.set(key, value, time=timeout)
+        except Exception:
+            return False
+
+    async def get_negative(self, key: str) -> Optional[int]:
+        """Get the status of a cached failed read of `key`."""
+        _, _, _, status = await self.get_tile_from_tiers(key)
+        return status
+
+    async def set_negative(
+        self, key: str, status: int, timeout: int = NEGATIVE_TTL
+    ) -> bool:
+        """Set the status of a failed read of `key`."""
+        neg_key = f"neg:{key}"
+        self.sync.negative_sets[status] += 1
+        if self.local is not None:
+            self.local.set(neg_key, status, 8, timeout)
+
+        try:
+            return await self.client.set(neg_key, status, time=timeout)
+        except Exception:
+            return False
+
+    async def acquire_lock(self, key: str, timeout: int) -> bool:
+        """Try to take a cross-process lock. Fails open."""
+        try:
+            return await self.client.add(f"lock:{key}", 1, time=timeout)
+        except Exception:
+            return True
+
+    async def release_lock(self, key: str) -> bool:
+        """Release a cross-process lock."""
+        try:
+            return await self.client.delete(f"lock:{key}")
+        except Exception:
+            return False
+
+    async def get_footprint(self, key: str) -> Optional[Dict]:
+        """Get COG footprint from cache layer"""
+        try:
+            return await self.client.get(key)
+        except Exception:
+            return None
+
+    async def set_footprint(
+        self, key: str, footprint: Dict, timeout: int = 3600
+    ) -> bool:
+        """Set COG footprint in cache layer"""
+        try:
+            return await self.client.set(key, footprint, time=timeout)
+        except Exception:
+            return False
+
+    async def get_dataset_from_cache(self, ds_hash: str) -> Union[str, bool]:
+        """Get dataset response from cache layer"""
+        try:
+            content = self.sync._load_dataset(await self.client.get(ds_hash))
+        except Exception:
+            content = False
+        CACHE_REQUESTS.inc("json", "hit_l2" if content else "miss")
+        return content
+
+    async def set_dataset_cache(
+        self, ds_hash: str, body: Datasets, timeout: int = 3600
+    ) -> bool:
+        """Set dataset response in cache layer"""
+        content = body.json().encode()
+        value = self.sync._pack_dataset(ds_hash, content)
         try:
-            return self.client.set(ds_hash, body.json(), time=timeout)
+            return await self.client.set(ds_hash, value, time=timeout)
         except Exception:
             return False
@@ -0,0 +1,318 @@
+"""
+dashboard_api.db.memcache_pool: pooled memcached client for threads.
+
+Blocking counterpart of `dashboard_api.db.aiomemcache`, with the same
+protocol and serialization: persistent connections shared by all threads,
+checked with a NOOP when they were idle for a while, closed when idle for
+too long and replaced on errors.
+
+"""
+
+import logging
+import socket
+import struct
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+from dashboard_api.core.metrics import CACHE_ERRORS
+from dashboard_api.db.aiomemcache import (
+    ADD,
+    DELETE,
+    GET,
+    GETKQ,
+    HEADER,
+    NOOP,
+    REQUEST,
+    RESPONSE,
+    SASL_AUTH,
+    SET,
+    SUCCESS,
+    MemcacheError,
+    deserialize,
+    serialize,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class Connection(object):
+    """A blocking memcached connection."""
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        user: Optional[str] = None,
+        password: Optional[str] = None,
+        timeout: float = 1.0,
+    ):
+        """Open (and authenticate) a connection."""
+        self.sock = socket.create_connection((host, port), timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.sock.makefile("rb")
+        self.last_used = time.monotonic()
+        self._buffer: List[bytes] = []
+
+        if user and password:
+            try:
+                status, _, value = self.request(
+                    SASL_AUTH, b"PLAIN", value=f"\x00{user}\x00{password}".encode()
+                )
+                if status != SUCCESS:
+                    raise MemcacheError(f"Authentication failed: {value!r}")
+            except Exception:
+                self.close()
+                raise
+
+    def close(self):
+        """Close the connection."""
+        self.reader.close()
+        self.sock.close()
+
+    def send(self, opcode: int, key: bytes = b"", extras: bytes = b"", value=b""):
+        """Buffer a request."""
+        body_length = len(key) + len(extras) + len(value)
+        self._buffer.append(
+            HEADER.pack(REQUEST, opcode, len(key), len(extras), 0, 0, body_length, 0, 0)
+            + extras
+            + key
+            + value
+        )
+
+    def flush(self):
+        """Send the buffered requests."""
+        data, self._buffer = b"".join(self._buffer), []
+        self.sock.sendall(data)
+
+    def _read(self, size: int) -> bytes:
+        data = self.reader.read(size)
+        if len(data) != size:
+            raise MemcacheError("Connection closed by the server")
+        return data
+
+    def receive(self) -> Tuple[int, int, bytes, bytes, bytes]:
+        """Read a response. Returns opcode, status, extras, key and value."""
+        (magic, opcode, keylen, extlen, _, status, bodylen, _, _) = HEADER.unpack(
+            self._read(HEADER.size)
+        )
+        if magic != RESPONSE:
+            raise MemcacheError(f"Invalid response magic: {magic}")
+
+        body = self._read(bodylen) if bodylen else b""
+        extras = body[:extlen]
+        key = body[extlen : extlen + keylen]
+        return opcode, status, extras, key, body[extlen + keylen :]
+
+    def request(
+        self, opcode: int, key: bytes = b"", extras: bytes = b"", value=b""
+    ) -> Tuple[int, bytes, bytes]:
+        """Send a request and read its response. Returns status, extras, value."""
+        self.send(opcode, key, extras, value)
+        self.flush()
+        _, status, extras, _, value = self.receive()
+        return status, extras, value
+
+
+class ConnectionPool(object):
+    """Bounded, thread-safe pool of memcached connections."""
+
+    def __init__(
+        self,
+        host: str,
+        port: int = 11211,
+        user: Optional[str] = None,
+        password: Optional[str] = None,
+        size: int = 8,
+        timeout: float = 1.0,
+        idle_timeout: float = 60.0,
+        health_check_interval: float = 30.0,
+    ):
+        """Init Connection Pool."""
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.size = size
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+
+        self._idle: Deque[Connection] = deque()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+        self.counters: Counter = Counter()
+
+    def _open(self) -> Connection:
+        conn = Connection(self.host, self.port, self.user, self.password, self.timeout)
+        self.counters["created"] += 1
+        return conn
+
+    def _healthy(self, conn: Connection) -> bool:
+        self.counters["health_checks"] += 1
+        try:
+            status, _, _ = conn.request(NOOP)
+            return status == SUCCESS
+        except Exception:
+            return False
+
+    def reap(self, now: Optional[float] = None):
+        """Close the connections idle for more than `idle_timeout`."""
+        now = now or time.monotonic()
+        with self._lock:
+            # Most recently used connections are on the right
+            while self._idle and now - self._idle[0].last_used > self.idle_timeout:
+                self._idle.popleft().close()
+                self.counters["reaped"] += 1
+
+    def _checkout(self) -> Connection:
+        now = time.monotonic()
+        self.reap(now)
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+
+        if conn is not None:
+            if now - conn.last_used < self.health_check_interval or self._healthy(conn):
+                self.counters["reused"] += 1
+                return conn
+
+            conn.close()
+            self.counters["unhealthy"] += 1
+
+        return self._open()
+
+    @contextmanager
+    def connection(self) -> Iterator[Connection]:
+        """Lease a connection, waiting at most `timeout` for a free one."""
+        if not self._slots.acquire(timeout=self.timeout):
+            self.counters["exhausted"] += 1
+            raise MemcacheError("No memcached connection available")
+
+        conn = None
+        try:
+            conn = self._checkout()
+            yield conn
+        except BaseException:
+            # The connection may hold a partial response: never reuse it.
+            if conn is not None:
+                conn.close()
+                conn = None
+            self.counters["errors"] += 1
+            CACHE_ERRORS.inc("sync")
+            raise
+        finally:
+            if conn is not None:
+                conn.last_used = time.monotonic()
+                with self._lock:
+                    self._idle.append(conn)
+            self._slots.release()
+
+    def close(self):
+        """Close the idle connections."""
+        with self._lock:
+            while self._idle:
+                self._idle.pop().close()
+
+    def stats(self) -> Dict:
+        """Return pool counters."""
+        with self._lock:
+            idle = len(self._idle)
+        return dict(self.counters, size=self.size, idle=idle)
+
+
+class PooledClient(object):
+    """memcached client over a `ConnectionPool`, bmemcached `Client` compatible."""
+
+    def __init__(self, host: str, port: int = 11211, *args: Any, **kwargs: Any):
+        """Init Pooled Client."""
+        self.pool = ConnectionPool(host, port, *args, **kwargs)
+
+    def _call(
+        self, fn: Callable[[Connection], Any], default: Any = None, retry: bool = True
+    ) -> Any:
+        # Reconnect once: a pooled connection may have been closed by the server.
+        # Like bmemcached, connection errors are logged and treated as misses.
+        # Without `retry` (add), errors are raised: the server may have applied
+        # the request before the connection failed.
+        for _ in range(2 if retry else 1):
+            try:
+                with self.pool.connection() as conn:
+                    return fn(conn)
+            except (OSError, MemcacheError) as e:
+                if not retry:
+                    raise
+                error = e
+
+        logger.warning(f"memcached {self.pool.host}:{self.pool.port}: {error!r}")
+        return default
+
+    def get(self, key: str) -> Any:
+        """Get a value, None on a miss."""
+
+        def _get(conn: Connection) -> Any:
+            status, extras, value = conn.request(GET, key.encode())
+            if status != SUCCESS:
+                return None
+            (flags,) = struct.unpack("!L", extras[:4])
+            return deserialize(value, flags)
+
+        return self._call(_get)
+
+    def get_multi(self, keys: List[str]) -> Dict[str, Any]:
+        """Get values of several keys in one round trip."""
+
+        def _get_multi(conn: Connection) -> Dict[str, Any]:
+            for key in keys:
+                conn.send(GETKQ, key.encode())
+            conn.send(NOOP)
+            conn.flush()
+
+            values = {}
+            while True:
+                opcode, status, extras, key, value = conn.receive()
+                if opcode == NOOP:
+                    return values
+                if status == SUCCESS:
+                    (flags,) = struct.unpack("!L", extras[:4])
+                    values[key.decode()] = deserialize(value, flags)
+
+        return self._call(_get_multi, {})
+
+    def _store(
+        self, opcode: int, key: str, value: Any, time: int, retry: bool = True
+    ) -> bool:
+        flags, data = serialize(value)
+        extras = struct.pack("!LL", flags, time)
+
+        def _store(conn: Connection) -> bool:
+            status, _, _ = conn.request(opcode, key.encode(), extras, data)
+            return status == SUCCESS
+
+        return self._call(_store, False, retry)
+
+    def set(self, key: str, value: Any, time: int = 0, compress_level: int = -1):
+        """Set a value. Values are never compressed by the client."""
+        return self._store(SET, key, value, time)
+
+    def add(self, key: str, value: Any, time: int = 0, compress_level: int = -1):
+        """Set a value only if the key does not exist. Raises on errors."""
+        return self._store(ADD, key, value, time, retry=False)
+
+    def delete(self, key: str) -> bool:
+        """Delete a key."""
+
+        def _delete(conn: Connection) -> bool:
+            status, _, _ = conn.request(DELETE, key.encode())
+            return status == SUCCESS
+
+        return self._call(_delete, False)
+
+    def disconnect_all(self):
+        """Close the idle connections."""
+        self.pool.close()
+
+    def stats(self) -> Dict:
+        """Return pool counters."""
+        return self.pool.stats()
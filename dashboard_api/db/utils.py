@@ -9,6 +9,7 @@ import boto3
 from botocore import config
 
 from dashboard_api.core.config import DT_FORMAT, BUCKET
+from dashboard_api.core.metrics import S3_LATENCY
 from dashboard_api.models.static import IndicatorObservation
 
 s3 = boto3.client("s3")
@@ -86,8 +87,9 @@ def invoke_lambda(
 
 def s3_get(bucket: str, key: str):
     """Get AWS S3 Object."""
-    response = s3.get_object(Bucket=bucket, Key=key)
-    return response["Body"].read()
+    with S3_LATENCY.time("get_object"):
+        response = s3.get_object(Bucket=bucket, Key=key)
+        return response["Body"].read()
 
 
 def get_indicator_site_metadata(identifier: str, folder: str) -> Dict:
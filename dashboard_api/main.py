@@ -1,17 +1,20 @@
 """dashboard_api app."""
+import time
 from typing import Any, Dict
 
 from dashboard_api import version
+from dashboard_api.api import cogeo, executors
 from dashboard_api.api.api_v1.api import api_router
-from dashboard_api.core import config
-from dashboard_api.db.memcache import CacheLayer
+from dashboard_api.api.api_v1.endpoints import tiles
+from dashboard_api.core import config, metrics
+from dashboard_api.db.memcache import AsyncCacheLayer, CacheLayer, MemoryCache
+from dashboard_api.middleware import CompressionMiddleware
 
 from fastapi import FastAPI
 
 from starlette.middleware.cors import CORSMiddleware
-from starlette.middleware.gzip import GZipMiddleware
 from starlette.requests import Request
-from starlette.responses import HTMLResponse
+from starlette.responses import HTMLResponse, PlainTextResponse
 from starlette.templating import Jinja2Templates
 
 templates = Jinja2Templates(directory="dashboard_api/templates")
@@ -25,9 +28,29 @@ if config.MEMCACHE_HOST and not config.DISABLE_CACHE:
         )
         if v
     }
-    cache = CacheLayer(config.MEMCACHE_HOST, **kwargs)
+    if config.L1_CACHE_BYTES:
+        kwargs["local"] = MemoryCache(config.L1_CACHE_BYTES)
+    cache = CacheLayer(
+        config.MEMCACHE_HOST,
+        pool_size=config.MEMCACHE_POOL_SIZE,
+        timeout=config.MEMCACHE_TIMEOUT,
+        idle_timeout=config.MEMCACHE_IDLE_TIMEOUT,
+        health_check_interval=config.MEMCACHE_HEALTH_CHECK_INTERVAL,
+        promotion_ttl=config.L1_PROMOTION_TTL,
+        **kwargs,
+    )
+    async_cache = AsyncCacheLayer(
+        config.MEMCACHE_HOST,
+        config.MEMCACHE_PORT,
+        config.MEMCACHE_USERNAME,
+        config.MEMCACHE_PASSWORD,
+        sync=cache,
+        pool_size=config.MEMCACHE_POOL_SIZE,
+        timeout=config.MEMCACHE_TIMEOUT,
+    )
 else:
     cache = None
+    async_cache = None
 
 
 app = FastAPI(
@@ -48,17 +71,34 @@ if config.BACKEND_CORS_ORIGINS:
         allow_headers=["*"],
     )
 
-app.add_middleware(GZipMiddleware, minimum_size=0)
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=config.COMPRESSION_MIN_SIZE,
+    gzip_level=config.GZIP_LEVEL,
+    brotli_quality=config.BROTLI_QUALITY,
+)
 
 
 @app.middleware("http")
 async def cache_middleware(request: Request, call_next):
-    """Add cache layer."""
+    """Add cache layer and record the request latency."""
     request.state.cache = cache
-    response = await call_next(request)
-    if cache:
-        request.state.cache.client.disconnect_all()
-    return response
+    request.state.async_cache = async_cache
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # The router sets the matched endpoint in the (shared) scope
+        endpoint = request.scope.get("endpoint")
+        metrics.REQUEST_LATENCY.observe(
+            time.perf_counter() - start,
+            endpoint.__name__ if endpoint else "unmatched",
+            request.method,
+            status,
+        )
 
 
 @app.get(
@@ -110,4 +150,34 @@ def ping():
     return {"ping": "pong!"}
 
 
+@app.get("/stats", description="Process statistics")
+def stats():
+    """Return process-wide pool and cache counters."""
+    stats = {
+        "datasets": cogeo.pool.stats(),
+        "footprints": cogeo.footprints.stats(),
+        "tiles": tiles.inflight.stats(),
+        "executors": executors.stats(),
+    }
+    if cache:
+        stats["negative"] = cache.negative_stats()
+        stats["values"] = cache.value_stats()
+        stats["memcached"] = {
+            "sync": cache.client.stats(),
+            "async": async_cache.client.stats(),
+        }
+    if cache and cache.local is not None:
+        stats["l1"] = cache.local.stats()
+    return stats
+
+
+@app.get("/metrics", description="Prometheus metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Return process metrics in Prometheus text format."""
+    # async: the thread pool queue depths are read from the running loop
+    return PlainTextResponse(
+        metrics.REGISTRY.expose(), media_type="text/plain; version=0.0.4"
+    )
+
+
 app.include_router(api_router, prefix=config.API_VERSION_STR)
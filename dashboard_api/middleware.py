@@ -0,0 +1,162 @@
+"""dashboard_api middlewares."""
+
+import zlib
+from typing import Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # pragma: nocover
+    brotli = None  # type: ignore
+
+# Media types worth compressing. Images (PNG, JPEG, WEBP, deflated GeoTIFF)
+# are already compressed and tile archives are made of images.
+COMPRESSIBLE_TYPES: Tuple[str, ...] = (
+    "text/",
+    "application/json",
+    "application/xml",
+    "application/javascript",
+    "application/x-binary",
+)
+
+
+class CompressionMiddleware(object):
+    """
+    Compress text and JSON responses with Brotli or GZip.
+
+    Brotli is used when the client accepts it and the `brotli` package is
+    installed, GZip otherwise. Bodies of other media types, bodies smaller than
+    `minimum_size`, already encoded bodies and empty (204/304) responses are
+    sent as is.
+
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 500,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+    ) -> None:
+        """Init Compression Middleware."""
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """Handle ASGI call."""
+        if scope["type"] == "http":
+            encoding = self.select_encoding(
+                Headers(scope=scope).get("Accept-Encoding", "")
+            )
+            if encoding:
+                responder = CompressionResponder(self, encoding)
+                await responder(scope, receive, send)
+                return
+
+        await self.app(scope, receive, send)
+
+    def select_encoding(self, accept_encoding: str) -> Optional[str]:
+        """Return the preferred supported encoding of an Accept-Encoding header."""
+        accepted = set()
+        for coding in accept_encoding.split(","):
+            name, _, params = coding.partition(";")
+            if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+                continue
+            accepted.add(name.strip().lower())
+
+        if brotli is not None and "br" in accepted:
+            return "br"
+        if "gzip" in accepted:
+            return "gzip"
+        return None
+
+
+class CompressionResponder(object):
+    """Compress the response of a single request."""
+
+    def __init__(self, middleware: CompressionMiddleware, encoding: str) -> None:
+        """Init Compression Responder."""
+        self.app = middleware.app
+        self.minimum_size = middleware.minimum_size
+        self.encoding = encoding
+        if encoding == "br":
+            self.compressor = brotli.Compressor(quality=middleware.brotli_quality)
+        else:
+            self.compressor = zlib.compressobj(
+                middleware.gzip_level, zlib.DEFLATED, zlib.MAX_WBITS | 16
+            )
+
+        self.initial_message: Message = {}
+        self.started = False
+        self.compress = False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """Handle ASGI call."""
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    def _process(self, body: bytes) -> bytes:
+        if self.encoding == "br":
+            return self.compressor.process(body)
+        return self.compressor.compress(body)
+
+    def _finish(self) -> bytes:
+        if self.encoding == "br":
+            return self.compressor.finish()
+        return self.compressor.flush()
+
+    def _compressible(self, body: bytes, more_body: bool) -> bool:
+        headers = Headers(raw=self.initial_message["headers"])
+        if self.initial_message["status"] in (204, 304):
+            return False
+        if "content-encoding" in headers:
+            return False
+        if not headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES):
+            return False
+        return more_body or len(body) >= self.minimum_size
+
+    async def send_compressed(self, message: Message) -> None:
+        """Compress the body of compressible responses."""
+        message_type = message["type"]
+        if message_type == "http.response.start":
+            # Hold the headers until the first body chunk tells us whether to
+            # compress.
+            self.initial_message = message
+            return
+
+        if message_type != "http.response.body":
+            # Like starlette's GZipResponder, only response messages go through
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if not self.started:
+            self.started = True
+            self.compress = self._compressible(body, more_body)
+            if self.compress:
+                headers = MutableHeaders(raw=self.initial_message["headers"])
+                headers["Content-Encoding"] = self.encoding
+                headers.add_vary_header("Accept-Encoding")
+                if more_body:
+                    del headers["Content-Length"]
+            start = self.initial_message
+        else:
+            start = None
+
+        if self.compress:
+            body = self._process(body)
+            if not more_body:
+                body += self._finish()
+                if start is not None:
+                    headers = MutableHeaders(raw=self.initial_message["headers"])
+                    headers["Content-Length"] = str(len(body))
+            message["body"] = body
+
+        if start is not None:
+            await self.send(start)
+        await self.send(message)
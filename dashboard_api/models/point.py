@@ -0,0 +1,12 @@
+"""Point request models."""
+
+from typing import List, Optional, Tuple
+
+from pydantic import BaseModel
+
+
+class PointRequest(BaseModel):
+    """Point values request model."""
+
+    points: List[Tuple[float, float]]
+    dates: Optional[List[str]] = None
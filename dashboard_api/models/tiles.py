@@ -0,0 +1,19 @@
+"""Tile request models."""
+
+from typing import List, Tuple
+
+from pydantic import BaseModel, conint, validator
+
+
+class TileBatchRequest(BaseModel):
+    """Batch tile request model."""
+
+    tiles: List[Tuple[conint(ge=0, le=30), conint(ge=0), conint(ge=0)]]  # type: ignore
+
+    @validator("tiles", each_item=True)
+    def tile_in_zoom(cls, tile):
+        """Check tile x/y against the zoom level."""
+        z, x, y = tile
+        if x >= 2 ** z or y >= 2 ** z:
+            raise ValueError(f"Tile {z}/{x}/{y} does not exist")
+        return tile
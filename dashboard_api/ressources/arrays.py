@@ -0,0 +1,145 @@
+"""
+dashboard_api.ressources.arrays: binary format of the raw array tiles (npy).
+
+A fixed 21 bytes header followed by the body:
+
+    magic (4s) | version (B) | flags (B) | mask encoding (B) | dtype (4s) |
+    band count (H) | height (H) | width (H) | body length (I)
+
+All header fields are big-endian. `dtype` is the numpy type string of the
+data (e.g. `|u1`, `<u2`, `<f4`), right-padded with null bytes. The body is
+the C-ordered data (count x height x width values) followed by the mask, one
+bit per pixel in row-major order, most significant bit first, 1 for valid
+pixels. When the `COMPRESSED` flag is set, the body is zlib-compressed.
+
+See docs/array-format.md for client-side decoders.
+
+"""
+
+import struct
+import zlib
+from typing import Iterator, NamedTuple, Tuple
+
+import numpy
+
+HEADER = struct.Struct(">4sBBB4sHHHI")
+MAGIC = b"DAPI"
+VERSION = 1
+
+# Flags
+COMPRESSED = 0x01
+
+# Mask encodings
+MASK_NONE = 0
+MASK_BITS = 1
+
+
+class ArrayHeader(NamedTuple):
+    """Decoded array header."""
+
+    version: int
+    flags: int
+    mask_encoding: int
+    dtype: numpy.dtype
+    count: int
+    height: int
+    width: int
+    length: int
+
+
+def encode(tile: numpy.ndarray, mask: numpy.ndarray, compress: int = 0) -> bytes:
+    """
+    Encode a (count, height, width) tile and its (height, width) mask.
+
+    The data is written from its buffer without intermediate copies unless it
+    is not C-contiguous; `compress` is a zlib level (0 disables compression).
+
+    """
+    tile = numpy.ascontiguousarray(tile)
+    count, height, width = tile.shape
+    bits = numpy.packbits(mask, axis=None)
+
+    flags = 0
+    body: Tuple = (memoryview(tile).cast("B"), memoryview(bits))
+    length = tile.nbytes + bits.nbytes
+    if compress:
+        compressor = zlib.compressobj(compress)
+        body = (compressor.compress(body[0]), compressor.compress(body[1]))
+        body += (compressor.flush(),)
+        flags |= COMPRESSED
+        length = sum(len(b) for b in body)
+
+    header = HEADER.pack(
+        MAGIC,
+        VERSION,
+        flags,
+        MASK_BITS,
+        tile.dtype.str.encode(),
+        count,
+        height,
+        width,
+        length,
+    )
+    return b"".join((header,) + body)
+
+
+def decode_header(data: bytes) -> ArrayHeader:
+    """Decode an array header. Raises ValueError on unknown formats."""
+    if len(data) < HEADER.size:
+        raise ValueError("Truncated array")
+
+    (
+        magic,
+        version,
+        flags,
+        mask_encoding,
+        dtype,
+        count,
+        height,
+        width,
+        length,
+    ) = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Unknown array format")
+
+    return ArrayHeader(
+        version,
+        flags,
+        mask_encoding,
+        numpy.dtype(dtype.rstrip(b"\x00").decode()),
+        count,
+        height,
+        width,
+        length,
+    )
+
+
+def decode(data: bytes) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    """Decode an array to a (count, height, width) tile and a 0/255 mask."""
+    header = decode_header(data)
+    body = memoryview(data)[HEADER.size : HEADER.size + header.length]
+    if header.flags & COMPRESSED:
+        body = memoryview(zlib.decompress(body))
+
+    size = header.height * header.width
+    shape = (header.count, header.height, header.width)
+    tile = numpy.frombuffer(body, header.dtype, header.count * size).reshape(shape)
+
+    if header.mask_encoding == MASK_BITS:
+        bits = numpy.frombuffer(body, numpy.uint8, offset=tile.nbytes)
+        mask = numpy.unpackbits(bits, count=size).reshape(shape[1:]) * numpy.uint8(255)
+    else:
+        mask = numpy.full(shape[1:], 255, numpy.uint8)
+
+    return tile, mask
+
+
+def decode_all(data: bytes) -> Iterator[Tuple[numpy.ndarray, numpy.ndarray]]:
+    """Decode concatenated arrays (e.g. time-series stacks), in order."""
+    offset = 0
+    view = memoryview(data)
+    while offset < len(data):
+        header = decode_header(view[offset:])
+        end = offset + HEADER.size + header.length
+        yield decode(view[offset:end])
+        offset = end
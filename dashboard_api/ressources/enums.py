@@ -11,3 +11,26 @@ class ImageType(str, Enum):
     tif = "tif"
     jpg = "jpg"
     webp = "webp"
+
+
+class PixelSelection(str, Enum):
+    """Mosaic pixel selection methods."""
+
+    first = "first"
+    highest = "highest"
+    lowest = "lowest"
+    mean = "mean"
+
+
+class TimeUnit(str, Enum):
+    """Dataset time units."""
+
+    day = "day"
+    month = "month"
+
+
+class CompareMethod(str, Enum):
+    """Dataset comparison methods."""
+
+    difference = "difference"
+    ratio = "ratio"
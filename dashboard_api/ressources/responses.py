@@ -1,9 +1,48 @@
 """Common response models."""
 
+import hashlib
+from typing import Optional
+
 from starlette.background import BackgroundTask
 from starlette.responses import Response
 
 
+def make_etag(key: str, content: bytes) -> str:
+    """Return a strong ETag from a cache key and the digest of the content."""
+    digest = hashlib.blake2b(content, digest_size=16).hexdigest()
+    return f'"{key[:16]}-{digest}"'
+
+
+def etag_match(if_none_match: Optional[str], etag: Optional[str]) -> bool:
+    """Check an If-None-Match header against an ETag (weak comparison)."""
+    if not if_none_match or not etag:
+        return False
+
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in [t[2:] if t.startswith("W/") else t for t in tags]
+
+
+def accepts(accept: Optional[str], media_type: str) -> bool:
+    """Check if an Accept header explicitly allows a media type."""
+    if not accept:
+        return False
+
+    for item in accept.split(","):
+        value, *params = [part.strip() for part in item.split(";")]
+        if value.lower() != media_type:
+            continue
+        for param in params:
+            name, _, q = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    return float(q) > 0
+                except ValueError:
+                    return False
+        return True
+
+    return False
+
+
 class XMLResponse(Response):
     """XML Response"""
 
@@ -31,3 +70,14 @@ class TileResponse(Response):
         self.media_type = media_type
         self.background = background
         self.init_headers(headers)
+
+
+class NotModifiedResponse(Response):
+    """304 Not Modified response."""
+
+    def __init__(self, etag: str, headers: dict = {}, ttl: int = 3600) -> None:
+        """Init Not Modified response."""
+        headers = {**headers, "ETag": etag}
+        if ttl:
+            headers.update({"Cache-Control": f"max-age={ttl}"})
+        super().__init__(status_code=304, headers=headers)
@@ -0,0 +1,368 @@
+"""
+dashboard_api.seed: pre-warm the tile cache.
+
+Renders the tiles of a dataset over a site extent, for a zoom range and the
+dataset's domain dates, and stores them in memcached under the keys used by
+the tile endpoint. Tiles without an extension are rendered in both formats
+the tile endpoint negotiates, for browsers accepting WebP and the others.
+
+Usage
+-----
+    python -m dashboard_api.seed --dataset no2 --site ny --zoom 6 10 --dry-run
+    python -m dashboard_api.seed --dataset no2 --site ny --zoom 6 10 \\
+        --start 2020-03-01 --workers 8 --rate 20 --state no2-ny.state
+
+"""
+
+import argparse
+import datetime
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Iterator, List, NamedTuple, Optional, Set, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import mercantile
+from shapely.geometry import box, shape
+
+from dashboard_api.api import utils
+from dashboard_api.api.api_v1.endpoints.tiles import (
+    Encoder,
+    render_cached_tile,
+    tile_key,
+)
+from dashboard_api.api.utils import DATE_FORMATS, expand_dates
+from dashboard_api.core import config
+from dashboard_api.db.memcache import CacheLayer
+from dashboard_api.models.static import Site
+from dashboard_api.ressources.enums import ImageType
+
+
+class TileParams(NamedTuple):
+    """Tile endpoint parameters of a dataset tile URL."""
+
+    scale: int
+    ext: Optional[ImageType]
+    url: str
+    bidx: Optional[str]
+    nodata: Optional[str]
+    rescale: Optional[str]
+    color_formula: Optional[str]
+    color_map: Optional[utils.ColorMapName]
+
+
+class SeedTile(NamedTuple):
+    """A tile to render."""
+
+    z: int
+    x: int
+    y: int
+    params: TileParams
+    encoder: Encoder = Encoder()
+
+    @property
+    def key(self) -> str:
+        """Return the tile cache key."""
+        p = self.params
+        return tile_key(
+            self.z,
+            self.x,
+            self.y,
+            p.ext,
+            p.scale,
+            p.url,
+            p.bidx,
+            p.nodata,
+            p.rescale,
+            p.color_formula,
+            p.color_map,
+            self.encoder,
+        ).hash
+
+
+def parse_tile_url(tile_url: str) -> TileParams:
+    """Parse a `{z}/{x}/{y}@{scale}x.{ext}?{query}` tile URL."""
+    parsed = urlparse(tile_url)
+    name = parsed.path.rsplit("/", 1)[-1]
+    name, _, ext = name.partition(".")
+    scale = int(name.split("@")[1].rstrip("x")) if "@" in name else 1
+
+    query = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+    color_map = query.get("color_map")
+    return TileParams(
+        scale=scale,
+        ext=ImageType(ext) if ext else None,
+        url=query["url"],
+        bidx=query.get("bidx"),
+        nodata=query.get("nodata"),
+        rescale=query.get("rescale"),
+        color_formula=query.get("color_formula"),
+        color_map=utils.ColorMapName(color_map) if color_map else None,
+    )
+
+
+def tile_encoders(tile_url: str) -> List[Encoder]:
+    """Return the encoders the tile endpoint negotiates for a tile URL."""
+    params = parse_tile_url(tile_url)
+    query = {k: v[0] for k, v in parse_qs(urlparse(tile_url).query).items()}
+    quality, effort = query.get("webp_quality"), query.get("webp_effort")
+    encoders = {
+        Encoder.negotiate(
+            params.ext,
+            accept,
+            int(quality) if quality else None,
+            int(effort) if effort else None,
+        )
+        for accept in (None, "image/webp")
+    }
+    return sorted(encoders)
+
+
+def site_tiles(site: Site, minzoom: int, maxzoom: int) -> Iterator[mercantile.Tile]:
+    """Yield the mercator tiles intersecting a site polygon or bounding box."""
+    if site.polygon:
+        geom = shape(site.polygon.dict())
+    else:
+        xs, ys = site.bounding_box[0::2], site.bounding_box[1::2]
+        geom = box(min(xs), min(ys), max(xs), max(ys))
+
+    for tile in mercantile.tiles(*geom.bounds, range(minzoom, maxzoom + 1)):
+        if geom.intersects(box(*mercantile.bounds(tile))):
+            yield tile
+
+
+def seed_tiles(
+    tile_urls: List[str],
+    site: Site,
+    dates: List[datetime.date],
+    date_format: str,
+    minzoom: int,
+    maxzoom: int,
+) -> Iterator[Tuple[datetime.date, SeedTile]]:
+    """Yield every (date, tile) to render."""
+    tiles = list(site_tiles(site, minzoom, maxzoom))
+    for date in dates:
+        for tile_url in tile_urls:
+            url = tile_url.replace("{date}", date.strftime(date_format)).replace(
+                "{spotlightId}", site.id
+            )
+            params = parse_tile_url(url)
+            encoders = tile_encoders(url)
+            for tile in tiles:
+                for encoder in encoders:
+                    yield date, SeedTile(tile.z, tile.x, tile.y, params, encoder)
+
+
+class RateLimiter(object):
+    """Allow at most `rate` calls per second (0 disables it)."""
+
+    def __init__(self, rate: float):
+        """Init Rate Limiter."""
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """Block until the next call is allowed."""
+        if not self.interval:
+            return
+
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+
+        if delay > 0:
+            time.sleep(delay)
+
+
+class SeedState(object):
+    """Keys of the tiles already seeded, appended to a file as they complete."""
+
+    def __init__(self, path: Optional[str]):
+        """Load previous progress."""
+        self.path = path
+        self.done: Set[str] = set()
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.done = {line.strip() for line in f if line.strip()}
+        self._file = open(path, "a") if path else None
+
+    def add(self, key: str):
+        """Record a seeded tile."""
+        with self._lock:
+            self.done.add(key)
+            if self._file:
+                self._file.write(f"{key}\n")
+                self._file.flush()
+
+    def close(self):
+        """Close the state file."""
+        if self._file:
+            self._file.close()
+
+
+def _seed_one(
+    tile: SeedTile, cache_client: CacheLayer, limiter: RateLimiter
+) -> Tuple[str, str]:
+    """Render and cache one tile. Returns the key and outcome."""
+    if cache_client.get_etag(tile.key):
+        return tile.key, "cached"
+
+    limiter.wait()
+    try:
+        status, _, _ = render_cached_tile(
+            tile.z,
+            tile.x,
+            tile.y,
+            *tile.params,
+            cache_client=cache_client,
+            encoder=tile.encoder,
+        )
+    except Exception:
+        status = 500
+
+    return tile.key, {200: "rendered", 404: "empty"}.get(status, "error")
+
+
+def seed(
+    jobs: Iterator[SeedTile],
+    cache_client: CacheLayer,
+    state: SeedState,
+    workers: int = 4,
+    rate: float = 0,
+    log_every: int = 100,
+) -> Dict[str, int]:
+    """Render tiles with a bounded worker pool. Returns outcome counts."""
+    counts: Counter = Counter()
+    limiter = RateLimiter(rate)
+    start = time.time()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending: Set = set()
+
+        def _collect(futures):
+            for future in futures:
+                key, outcome = future.result()
+                counts[outcome] += 1
+                if outcome != "error":
+                    state.add(key)
+
+                total = sum(counts.values())
+                if total % log_every == 0:
+                    elapsed = time.time() - start
+                    print(
+                        f"{total} tiles, {dict(counts)}, {total / elapsed:.1f} tiles/s",
+                        file=sys.stderr,
+                    )
+
+        for tile in jobs:
+            if tile.key in state.done:
+                counts["resumed"] += 1
+                continue
+
+            # Keep the queue bounded so huge seeds do not hold every job in memory
+            if len(pending) >= workers * 4:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                _collect(done)
+
+            pending.add(executor.submit(_seed_one, tile, cache_client, limiter))
+
+        _collect(wait(pending).done)
+
+    return dict(counts)
+
+
+def main(argv: Optional[List[str]] = None):
+    """Seed the tile cache from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--dataset", required=True, help="Dataset identifier.")
+    parser.add_argument("--site", required=True, help="Site identifier.")
+    parser.add_argument(
+        "--zoom", type=int, nargs=2, required=True, metavar=("MIN", "MAX")
+    )
+    parser.add_argument("--start", help="First date to seed (YYYY-MM-DD).")
+    parser.add_argument("--end", help="Last date to seed (YYYY-MM-DD).")
+    parser.add_argument(
+        "--date-format", help="strftime format of {date} (default from time unit)."
+    )
+    parser.add_argument("--workers", type=int, default=4, help="Render threads.")
+    parser.add_argument(
+        "--rate", type=float, default=0, help="Max rendered tiles per second."
+    )
+    parser.add_argument("--state", help="Progress file, to resume a seed.")
+    parser.add_argument(
+        "--dry-run", action="store_true", help="Only report the tile counts."
+    )
+    parser.add_argument("--memcache-host", default=config.MEMCACHE_HOST)
+    parser.add_argument("--memcache-port", type=int, default=config.MEMCACHE_PORT)
+    args = parser.parse_args(argv)
+
+    # Imported here: the metadata managers create their AWS clients on import
+    from dashboard_api.db.static.datasets import datasets
+    from dashboard_api.db.static.sites import sites
+
+    dataset = next(
+        (d for d in datasets.get_all(api_url="").datasets if d.id == args.dataset),
+        None,
+    )
+    if dataset is None or not getattr(dataset.source, "tiles", None):
+        parser.error(f"Invalid raster dataset identifier: {args.dataset}")
+
+    site = sites.get(args.site, api_url="")
+    if site is None:
+        parser.error(f"Invalid site identifier: {args.site}")
+
+    time_unit = dataset.time_unit or "day"
+    dates = expand_dates(
+        dataset.domain or [], time_unit, dataset.is_periodic, args.start, args.end
+    )
+    jobs = seed_tiles(
+        dataset.source.tiles,
+        site,
+        dates,
+        args.date_format or DATE_FORMATS.get(time_unit, DATE_FORMATS["day"]),
+        *args.zoom,
+    )
+
+    if args.dry_run:
+        zooms: Counter = Counter(tile.z for _, tile in jobs)
+        report = dict(
+            dates=len(dates),
+            tiles=sum(zooms.values()),
+            tiles_per_zoom=dict(sorted(zooms.items())),
+        )
+        print(json.dumps(report, indent=2))
+        return
+
+    if not args.memcache_host:
+        parser.error("A memcached host is required (MEMCACHE_HOST or --memcache-host)")
+
+    cache_client = CacheLayer(
+        args.memcache_host,
+        args.memcache_port,
+        config.MEMCACHE_USERNAME,
+        config.MEMCACHE_PASSWORD,
+    )
+    state = SeedState(args.state)
+    try:
+        counts = seed(
+            (tile for _, tile in jobs),
+            cache_client,
+            state,
+            workers=args.workers,
+            rate=args.rate,
+        )
+    finally:
+        state.close()
+
+    print(json.dumps(counts, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -26,6 +26,10 @@ inst_reqs = [
 extra_reqs = {
     "dev": ["pytest", "pytest-cov", "pytest-asyncio", "pre-commit"],
     "server": ["uvicorn", "click==7.0"],
+    "brotli": ["brotli"],
+    "zstd": ["zstandard"],
+    "lz4": ["lz4"],
+    "animation": ["pillow"],
     "deploy": [
         "docker",
         "attrs==20.1.0",
@@ -71,4 +75,5 @@ setup(
     zip_safe=False,
     install_requires=inst_reqs,
     extras_require=extra_reqs,
+    entry_points={"console_scripts": ["dashboard-api-seed=dashboard_api.seed:main"]},
 )
@@ -1,11 +1,16 @@
 """``pytest`` configuration."""
 
+import asyncio
 import os
+import struct
+import threading
 
 import pytest
 import rasterio
 from rasterio.io import DatasetReader
 
+from dashboard_api.db.aiomemcache import HEADER
+
 from starlette.testclient import TestClient
 
 
@@ -38,3 +43,109 @@ def dataset_manager(monkeypatch):
     from dashboard_api.db.static.datasets import DatasetManager
 
     return DatasetManager
+
+
+class FakeMemcached(object):
+    """In-process memcached binary protocol server (no expiry)."""
+
+    def __init__(self, user=None, password=None):
+        self.data = {}
+        self.opcodes = []
+        self.user = user
+        self.password = password
+
+    def _response(self, opcode, status=0, extras=b"", key=b"", value=b""):
+        return (
+            HEADER.pack(
+                0x81,
+                opcode,
+                len(key),
+                len(extras),
+                0,
+                status,
+                len(extras) + len(key) + len(value),
+                0,
+                0,
+            )
+            + extras
+            + key
+            + value
+        )
+
+    async def handle(self, reader, writer):
+        authenticated = not self.user
+        try:
+            while True:
+                header = await reader.readexactly(HEADER.size)
+                _, opcode, keylen, extlen, _, _, bodylen, _, _ = HEADER.unpack(header)
+                body = await reader.readexactly(bodylen)
+                extras = body[:extlen]
+                key = body[extlen : extlen + keylen]
+                value = body[extlen + keylen :]
+                self.opcodes.append(opcode)
+
+                if opcode == 0x21:
+                    authenticated = (
+                        value == f"\x00{self.user}\x00{self.password}".encode()
+                    )
+                    writer.write(self._response(opcode, 0 if authenticated else 0x20))
+                elif not authenticated:
+                    writer.write(self._response(opcode, 0x20))
+                elif opcode in (0x00, 0x0D):
+                    if key in self.data:
+                        flags, data = self.data[key]
+                        writer.write(
+                            self._response(
+                                opcode,
+                                extras=struct.pack("!L", flags),
+                                key=key if opcode == 0x0D else b"",
+                                value=data,
+                            )
+                        )
+                    elif opcode == 0x00:
+                        writer.write(self._response(opcode, 0x01))
+                elif opcode in (0x01, 0x02):
+                    if opcode == 0x02 and key in self.data:
+                        writer.write(self._response(opcode, 0x02))
+                    else:
+                        flags, _ = struct.unpack("!LL", extras)
+                        self.data[key] = (flags, value)
+                        writer.write(self._response(opcode))
+                elif opcode == 0x04:
+                    status = 0 if self.data.pop(key, None) else 0x01
+                    writer.write(self._response(opcode, status))
+                else:
+                    writer.write(self._response(opcode))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+
+
+@pytest.fixture
+def memcached():
+    """Run a fake memcached server in a thread."""
+    server = FakeMemcached()
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+
+    def _run():
+        asyncio.set_event_loop(loop)
+        srv = loop.run_until_complete(
+            asyncio.start_server(server.handle, "127.0.0.1", 0)
+        )
+        server.port = srv.sockets[0].getsockname()[1]
+        started.set()
+        loop.run_forever()
+        srv.close()
+        tasks = asyncio.all_tasks(loop)
+        for task in tasks:
+            task.cancel()
+        loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+        loop.close()
+
+    thread = threading.Thread(target=_run, daemon=True)
+    thread.start()
+    started.wait()
+    yield server
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
@@ -0,0 +1,69 @@
+"""test /v1/compare endpoints."""
+
+from mock import Mock, patch
+
+from dashboard_api.api import cogeo
+from dashboard_api.ressources import arrays
+
+from ...conftest import mock_rio
+
+URLS = "url=https://myurl.com/a.tif&compare_url=https://myurl.com/b.tif"
+
+
+@patch("dashboard_api.api.api_v1.endpoints.tiles.cogeo.rasterio")
+def test_compare(rio, app):
+    """Both COGs are read and compared."""
+    rio.open = Mock(side_effect=mock_rio)
+    cogeo.pool.clear()
+    cogeo.footprints.clear()
+
+    response = app.get(f"/v1/compare/8/87/48?{URLS}&rescale=-100,100")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/jpg"
+    timings = response.headers["x-server-timings"]
+    assert "Read compare" in timings and "Compare" in timings
+    assert rio.open.call_count == 2
+    assert response.headers["vary"] == "Accept"
+
+    response = app.get(
+        f"/v1/compare/8/87/48?{URLS}&rescale=-100,100",
+        headers={"Accept": "image/webp"},
+    )
+    assert response.headers["content-type"] == "image/webp"
+
+    response = app.get(f"/v1/compare/8/87/48.npy?{URLS}")
+    assert response.status_code == 200
+    tile, mask = arrays.decode(response.content)
+    assert tile.dtype == "float32"
+    # Same COG: no difference
+    assert not tile.any()
+    assert mask.all()
+
+    response = app.get(f"/v1/compare/8/87/48.npy?{URLS}&method=ratio")
+    assert response.status_code == 200
+    tile, mask = arrays.decode(response.content)
+    assert (tile[:, mask > 0] == 1).all()
+
+    response = app.get(
+        f"/v1/compare/8/84/47.png?{URLS}&rescale=-100,100&color_map=rdbu"
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/png"
+
+    # float32 results need a rescale for 8-bit formats
+    response = app.get(f"/v1/compare/8/87/48.png?{URLS}")
+    assert response.status_code == 400
+    response = app.get(f"/v1/compare/8/87/48?{URLS}")
+    assert response.status_code == 400
+
+    response = app.get(f"/v1/compare/8/87/48.tif?{URLS}")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/tiff"
+
+    # outside of the COGs
+    response = app.get(f"/v1/compare/8/0/0.png?{URLS}&rescale=-100,100")
+    assert response.status_code == 200
+    assert response.headers["x-tile"] == "empty"
+
+    response = app.get(f"/v1/compare/8/87/48?{URLS}&method=sum")
+    assert response.status_code == 422
@@ -53,6 +53,11 @@ def test_datasets(app):
 
     assert "co2" in [d["id"] for d in content["datasets"]]
 
+    etag = response.headers["etag"]
+    response = app.get("v1/datasets", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+
 
 @mock_s3
 def test_spotlight_datasets(app):
@@ -25,6 +25,13 @@ def test_tilejson(rio, app):
     assert body["bounds"]
     assert body["center"]
 
+    etag = response.headers["etag"]
+    response = app.get(
+        "/v1/tilejson.json?url=https://myurl.com/cog.tif",
+        headers={"If-None-Match": f"W/{etag}"},
+    )
+    assert response.status_code == 304
+
     response = app.get(
         "/v1/tilejson.json?url=https://myurl.com/cog.tif&tile_format=png&tile_scale=2"
     )
@@ -0,0 +1,70 @@
+"""test /v1/mosaic endpoints."""
+
+from mock import Mock, patch
+
+from dashboard_api.api import cogeo, mosaic
+from dashboard_api.core import config
+
+from ...conftest import mock_rio
+
+ASSETS = "url=https://myurl.com/a.tif&url=https://myurl.com/b.tif&url=https://myurl.com/c.tif"
+
+
+@patch("dashboard_api.api.api_v1.endpoints.tiles.cogeo.rasterio")
+def test_mosaic(rio, app, monkeypatch):
+    """Assets are read until the mosaic is full."""
+    rio.open = Mock(side_effect=mock_rio)
+    cogeo.pool.clear()
+    cogeo.footprints.clear()
+    monkeypatch.setattr(config, "MOSAIC_CONCURRENCY", 1)
+
+    # full tile: the first asset is enough
+    response = app.get(f"/v1/mosaic/8/87/48?{ASSETS}&rescale=0,1000")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/jpg"
+    assert response.headers["x-mosaic-assets"] == "1/3"
+    assert response.headers["x-server-timings"].startswith("Read 0 - ")
+    assert "Read 1" not in response.headers["x-server-timings"]
+    assert rio.open.call_count == 1
+
+    # partial tile: all the assets are read
+    response = app.get(f"/v1/mosaic/8/84/47.png?{ASSETS}&rescale=0,1000")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/png"
+    assert response.headers["x-mosaic-assets"] == "3/3"
+    assert "Read 2" in response.headers["x-server-timings"]
+
+    response = app.get(
+        f"/v1/mosaic/8/84/47.png?{ASSETS}&rescale=0,1000&pixel_selection=mean"
+    )
+    assert response.status_code == 200
+
+    # outside of every asset
+    response = app.get(f"/v1/mosaic/8/0/0.jpg?{ASSETS}")
+    assert response.status_code == 204
+
+
+@patch("dashboard_api.api.api_v1.endpoints.tiles.cogeo.rasterio")
+def test_mosaic_max_assets(rio, app, monkeypatch):
+    """Only the first assets, in priority order, are used."""
+    rio.open = Mock(side_effect=mock_rio)
+    cogeo.pool.clear()
+    cogeo.footprints.clear()
+    monkeypatch.setattr(config, "MOSAIC_MAX_ASSETS", 2)
+
+    response = app.get(f"/v1/mosaic/8/84/47.png?{ASSETS}&rescale=0,1000")
+    assert response.status_code == 200
+    assert response.headers["x-mosaic-assets"] == "2/2"
+    assert "Read 2" not in response.headers["x-server-timings"]
+    assert rio.open.call_count == 2
+
+
+def test_mosaic_validation(app, monkeypatch):
+    """Assets are required."""
+    response = app.get("/v1/mosaic/8/87/48")
+    assert response.status_code == 400
+
+    monkeypatch.setattr(config, "STAC_API_URL", None)
+    mosaic._searches.clear()
+    response = app.get("/v1/mosaic/8/87/48?collection=no2&date=2020-01-01")
+    assert response.status_code == 400
@@ -0,0 +1,102 @@
+"""test /v1/point endpoints."""
+
+from mock import Mock, patch
+from rasterio.errors import RasterioIOError
+
+from dashboard_api.api import cogeo
+from dashboard_api.core import config
+from dashboard_api.ressources import arrays
+
+from ...conftest import mock_rio
+
+POINTS = [[-56, 73.5], [-56.001, 73.5], [-58, 73], [0, 0]]
+
+
+def mock_rio_missing(src_path: str):
+    """Mock rasterio.open, without the 2020-01-02 COG."""
+    if "2020_01_02" in src_path:
+        raise RasterioIOError(f"{src_path}: No such file or directory")
+    return mock_rio(src_path)
+
+
+@patch("dashboard_api.api.api_v1.endpoints.tiles.cogeo.rasterio")
+def test_point(rio, app):
+    """Values are returned by band and point, null outside of the COG."""
+    rio.open = Mock(side_effect=mock_rio)
+    cogeo.pool.clear()
+
+    response = app.post(
+        "/v1/point?url=https://myurl.com/cog.tif", json=dict(points=POINTS)
+    )
+    assert response.status_code == 200
+    assert response.json() == {"values": [[3776, 3776, 3744, None]]}
+
+    response = app.post(
+        "/v1/point.npy?url=https://myurl.com/cog.tif", json=dict(points=POINTS)
+    )
+    assert response.status_code == 200
+    values, mask = arrays.decode(response.content)
+    assert values.shape == (1, 1, 4)
+    assert values[0, 0, :3].tolist() == [3776, 3776, 3744]
+    assert mask.tolist() == [[255, 255, 255, 0]]
+
+
+@patch("dashboard_api.api.api_v1.endpoints.tiles.cogeo.rasterio")
+def test_point_dates(rio, app):
+    """Dates are read concurrently, null for missing COGs."""
+    rio.open = Mock(side_effect=mock_rio_missing)
+    cogeo.pool.clear()
+
+    url = "url=https://myurl.com/cog_{date}.tif"
+    dates = ["2020-01-01", "2020-01-02", "2020-01-03"]
+    response = app.post(f"/v1/point?{url}", json=dict(points=POINTS[:2], dates=dates))
+    assert response.status_code == 200
+    assert response.json() == {
+        "dates": dates,
+        "values": [[[3776, 3776]], [[None, None]], [[3776, 3776]]],
+    }
+
+    response = app.post(
+        f"/v1/point.npy?{url}", json=dict(points=POINTS[:2], dates=dates)
+    )
+    values, mask = arrays.decode(response.content)
+    assert values.shape == (1, 3, 2)
+    assert mask.tolist() == [[255, 255], [0, 0], [255, 255]]
+
+    response = app.post(
+        f"/v1/point?{url}", json=dict(points=POINTS, dates=["2020-01-02"])
+    )
+    assert response.status_code == 404
+
+
+def test_point_cache():
+    """Each block is read once, then from the cache."""
+    cache = Mock()
+    cache.get_image_from_cache = Mock(return_value=(None, None))
+    path = "tests/fixtures/cog.tif"
+    values, valid = cogeo.points(path, POINTS, cache_client=cache)
+    # 3 points in 2 blocks
+    assert cache.set_image_cache.call_count == 2
+
+    blocks = [call[0][1][0] for call in cache.set_image_cache.call_args_list]
+    cache.get_image_from_cache = Mock(side_effect=[(b, None) for b in blocks])
+    with patch.object(cogeo.DatasetPool, "_acquire", return_value=None):
+        cached, cached_valid = cogeo.points(path, POINTS, cache_client=cache)
+    assert cached.tolist() == values.tolist()
+    assert cached_valid.tolist() == valid.tolist()
+
+
+def test_point_validation(app, monkeypatch):
+    """Points, dates and formats are validated."""
+    url = "url=https://myurl.com/cog.tif"
+    response = app.post(f"/v1/point.png?{url}", json=dict(points=POINTS))
+    assert response.status_code == 400
+
+    response = app.post(
+        f"/v1/point?{url}", json=dict(points=POINTS, dates=["2020-01-01"])
+    )
+    assert response.status_code == 400
+
+    monkeypatch.setattr(config, "POINT_MAX_POINTS", 2)
+    response = app.post(f"/v1/point?{url}", json=dict(points=POINTS))
+    assert response.status_code == 400
@@ -0,0 +1,77 @@
+"""test /v1/preview and /v1/bbox endpoints."""
+
+from mock import Mock, patch
+
+from dashboard_api.api import cogeo
+from dashboard_api.core import config
+from dashboard_api.ressources import arrays
+
+from ...conftest import mock_rio
+
+URL = "url=https://myurl.com/cog.tif"
+
+
+@patch("dashboard_api.api.api_v1.endpoints.tiles.cogeo.rasterio")
+def test_preview(rio, app):
+    """Whole COGs are read at most max_size pixels."""
+    rio.open = Mock(side_effect=mock_rio)
+    cogeo.pool.clear()
+
+    response = app.get(f"/v1/preview.npy?{URL}&max_size=128")
+    assert response.status_code == 200
+    tile, mask = arrays.decode(response.content)
+    assert tile.shape == (1, 128, 128)
+
+    response = app.get(
+        f"/v1/preview.png?{URL}&max_size=256&rescale=0,10000&color_map=viridis"
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/png"
+    assert "Read" in response.headers["x-server-timings"]
+
+    response = app.get(f"/v1/preview?{URL}&rescale=0,10000")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/jpg"
+    assert response.headers["vary"] == "Accept"
+
+    response = app.get(
+        f"/v1/preview?{URL}&rescale=0,10000", headers={"Accept": "image/webp"}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/webp"
+
+    response = app.get(f"/v1/preview.tif?{URL}")
+    assert response.status_code == 400
+
+    response = app.get(f"/v1/preview?{URL}&max_size={config.PREVIEW_MAX_SIZE + 1}")
+    assert response.status_code == 422
+
+
+@patch("dashboard_api.api.api_v1.endpoints.tiles.cogeo.rasterio")
+def test_bbox(rio, app):
+    """Bounding boxes are read in Web Mercator, at most max_size pixels."""
+    rio.open = Mock(side_effect=mock_rio)
+    cogeo.pool.clear()
+
+    response = app.get(f"/v1/bbox/-60,73,-55,74.npy?{URL}&max_size=256")
+    assert response.status_code == 200
+    tile, mask = arrays.decode(response.content)
+    assert tile.shape[0] == 1
+    assert max(tile.shape[1:]) == 256
+    assert mask.any()
+
+    response = app.get(f"/v1/bbox/-60,73,-55,74.png?{URL}&rescale=0,10000")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/png"
+
+    # larger than the COG: the same bounded size
+    response = app.get(f"/v1/bbox/-100,0,0,80.npy?{URL}&max_size=256")
+    assert response.status_code == 200
+    tile, mask = arrays.decode(response.content)
+    assert max(tile.shape[1:]) == 256
+
+    response = app.get(f"/v1/bbox/-55,73,-60,74.png?{URL}")
+    assert response.status_code == 400
+
+    response = app.get(f"/v1/bbox/-60,73,-55,90.png?{URL}")
+    assert response.status_code == 422
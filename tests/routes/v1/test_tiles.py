@@ -1,12 +1,18 @@
 """test /v1/tiles endpoints."""
 
-from io import BytesIO
+import asyncio
 from typing import Dict
 
 import numpy
-from mock import patch
+import pytest
+from mock import Mock, patch
+from rasterio.errors import RasterioIOError
 from rasterio.io import MemoryFile
 
+from dashboard_api.api import cogeo
+from dashboard_api.ressources import arrays
+from dashboard_api.ressources.enums import ImageType
+
 from ...conftest import mock_rio
 
 
@@ -62,9 +68,11 @@ def test_tile(rio, app):
     response = app.get("/v1/8/87/48.npy?url=https://myurl.com/cog.tif&nodata=0")
     assert response.status_code == 200
     assert response.headers["content-type"] == "application/x-binary"
-    t, m = numpy.load(BytesIO(response.content), allow_pickle=True)
+    t, m = arrays.decode(response.content)
     assert t.shape == (1, 256, 256)
     assert m.shape == (256, 256)
+    assert t.dtype == "uint16"
+    assert set(numpy.unique(m)) <= {0, 255}
 
     # partial
     response = app.get("/v1/8/84/47?url=https://myurl.com/cog.tif&rescale=0,1000")
@@ -76,3 +84,301 @@ def test_tile(rio, app):
     )
     assert response.status_code == 200
     assert response.headers["content-type"] == "image/png"
+
+    # conditional requests
+    response = app.get("/v1/8/87/48?url=https://myurl.com/cog.tif&rescale=0,1000")
+    etag = response.headers["etag"]
+    response = app.get(
+        "/v1/8/87/48?url=https://myurl.com/cog.tif&rescale=0,1000",
+        headers={"If-None-Match": etag},
+    )
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert not response.content
+
+    response = app.get(
+        "/v1/8/87/48?url=https://myurl.com/cog.tif&rescale=0,2000",
+        headers={"If-None-Match": etag},
+    )
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+
+@patch("dashboard_api.api.api_v1.endpoints.tiles.cogeo.rasterio")
+def test_batch(rio, app):
+    """test batch tile endpoint."""
+    from dashboard_api.api.api_v1.endpoints.tiles import BATCH_RECORD
+
+    rio.open = mock_rio
+
+    response = app.post(
+        "/v1/batch?url=https://myurl.com/cog.tif&rescale=0,1000",
+        json={"tiles": [[8, 87, 48], [8, 84, 47], [8, 0, 0]]},
+    )
+    assert response.status_code == 200
+
+    records = {}
+    body = response.content
+    while body:
+        z, x, y, status, ext, length = BATCH_RECORD.unpack_from(body)
+        offset = BATCH_RECORD.size
+        records[(z, x, y)] = (
+            status,
+            ext.rstrip(b"\x00"),
+            body[offset : offset + length],
+        )
+        body = body[offset + length :]
+
+    assert records[(8, 87, 48)][:2] == (200, b"jpg")
+    assert parse_img(records[(8, 87, 48)][2])["width"] == 256
+    assert records[(8, 84, 47)][:2] == (200, b"png")
+    assert records[(8, 0, 0)] == (404, b"", b"")
+
+    response = app.post(
+        "/v1/batch?url=https://myurl.com/cog.tif",
+        json={"tiles": [[8, 256, 48]]},
+    )
+    assert response.status_code == 422
+
+    response = app.post(
+        "/v1/batch?url=https://myurl.com/cog.tif&rescale=a,b",
+        json={"tiles": [[8, 87, 48]]},
+    )
+    assert response.status_code == 200
+    assert BATCH_RECORD.unpack(response.content) == (8, 87, 48, 500, b"\x00" * 4, 0)
+
+    # Negotiated as for /tiles
+    response = app.post(
+        "/v1/batch?url=https://myurl.com/cog.tif&rescale=0,1000",
+        json={"tiles": [[8, 87, 48]]},
+        headers={"Accept": "image/webp,*/*"},
+    )
+    assert BATCH_RECORD.unpack_from(response.content)[3:5] == (200, b"webp")
+
+
+@patch("dashboard_api.api.api_v1.endpoints.tiles.cogeo.rasterio")
+def test_metatile(rio, app, monkeypatch):
+    """Metatile sub-tiles are identical to single tiles."""
+    from dashboard_api.core import config
+
+    rio.open = mock_rio
+    url = "url=https://myurl.com/cog.tif&rescale=0,1000"
+    tiles = [
+        "7/42/24.npy",
+        "7/43/24.npy",
+        "7/42/25.npy",
+        "7/43/25.npy",
+        "8/84/47.npy",
+        "8/87/48@2x.npy",
+        "8/84/47.png",
+        "8/87/48",
+    ]
+
+    single = {}
+    for tile in tiles:
+        response = app.get(f"/v1/{tile}?{url}")
+        assert response.status_code == 200
+        single[tile] = response.content
+
+    monkeypatch.setattr(config, "METATILE_SIZE", 2)
+    for tile in tiles:
+        response = app.get(f"/v1/{tile}?{url}")
+        assert response.status_code == 200
+        assert "Read" in response.headers["X-Server-Timings"]
+        assert response.content == single[tile], tile
+
+
+@patch("dashboard_api.api.api_v1.endpoints.tiles.cogeo.rasterio")
+def test_metatile_coalescing(rio, monkeypatch):
+    """Concurrent requests for tiles of one metatile share its rendering."""
+    from dashboard_api.api.api_v1.endpoints import tiles
+    from dashboard_api.core import config
+
+    rio.open = mock_rio
+    monkeypatch.setattr(config, "METATILE_SIZE", 2)
+    read = Mock(side_effect=tiles.reader.tile)
+    monkeypatch.setattr(tiles.reader, "tile", read)
+
+    async def _render(x, y):
+        return await tiles._render_tile(
+            7, x, y, 1, ImageType.npy, "https://myurl.com/cog.tif", *[None] * 6
+        )
+
+    async def _main():
+        return await asyncio.gather(
+            *[_render(x, y) for x, y in ((42, 24), (43, 24), (42, 25), (43, 25))]
+        )
+
+    results = asyncio.get_event_loop().run_until_complete(_main())
+    assert read.call_count == 4
+    assert len({content for content, _, _ in results}) == 4
+    assert sum(bool(timings) for _, _, timings in results) == 1
+
+
+@patch("dashboard_api.api.api_v1.endpoints.tiles.cogeo.rasterio")
+def test_tile_outside_footprint(rio, app):
+    """Tiles outside the COG footprint never open the raster."""
+    rio.open = mock_rio
+    cogeo.footprints.load("https://myurl.com/cog.tif")
+    cogeo.pool.clear()
+    rio.open = Mock(side_effect=AssertionError("raster opened"))
+
+    response = app.get("/v1/8/0/0?url=https://myurl.com/cog.tif")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/png"
+    assert response.headers["x-tile"] == "empty"
+    meta = parse_img(response.content)
+    assert meta["width"] == 256
+
+    # at another zoom level
+    response = app.get("/v1/2/2/1@2x.png?url=https://myurl.com/cog.tif")
+    assert response.status_code == 200
+    assert parse_img(response.content)["width"] == 512
+
+    response = app.get("/v1/8/0/0.jpg?url=https://myurl.com/cog.tif")
+    assert response.status_code == 204
+    assert not response.content
+
+
+@patch("dashboard_api.api.api_v1.endpoints.tiles.cogeo.rasterio")
+def test_tile_zoom_range(rio, app):
+    """Tiles out of the COG zoom range (5-8) are under- and over-zoomed."""
+    rio.open = mock_rio
+    cogeo.footprints.clear()
+
+    for tile in ("4/5/3", "3/2/1", "9/174/96", "10/348/192"):
+        response = app.get(f"/v1/{tile}.npy?url=https://myurl.com/cog.tif")
+        assert response.status_code == 200
+        assert "x-tile" not in response.headers
+        _, mask = arrays.decode(response.content)
+        assert mask.any()
+
+
+@patch("dashboard_api.api.api_v1.endpoints.tiles.cogeo.rasterio")
+def test_tile_negative_cache(rio, app, memcached, monkeypatch):
+    """Missing COGs are remembered and not opened again."""
+    from dashboard_api import main
+    from dashboard_api.db.memcache import AsyncCacheLayer, CacheLayer
+
+    cache = CacheLayer("127.0.0.1", memcached.port)
+    monkeypatch.setattr(main, "cache", cache)
+    monkeypatch.setattr(
+        main, "async_cache", AsyncCacheLayer("127.0.0.1", memcached.port, sync=cache)
+    )
+
+    rio.open = Mock(side_effect=RasterioIOError("'missing.tif' does not exist"))
+    response = app.get("/v1/8/87/48?url=https://myurl.com/missing.tif")
+    assert response.status_code == 404
+    assert rio.open.call_count == 1
+    assert [v for k, v in memcached.data.items() if k.startswith(b"neg:")] == [
+        (2, b"404")
+    ]
+
+    response = app.get("/v1/8/87/48?url=https://myurl.com/missing.tif")
+    assert response.status_code == 404
+    assert response.headers["x-cache"] == "HIT-NEGATIVE"
+    assert rio.open.call_count == 1
+    assert cache.negative_stats()["hits"] == {"404": 1}
+
+    # Read errors may be transient: raised and never cached
+    rio.open = Mock(side_effect=RasterioIOError("Read timed out"))
+    with pytest.raises(RasterioIOError):
+        app.get("/v1/8/87/48?url=https://myurl.com/flaky.tif")
+    with pytest.raises(RasterioIOError):
+        app.get("/v1/8/87/48?url=https://myurl.com/flaky.tif")
+    assert rio.open.call_count == 2
+    assert cache.negative_stats()["sets"] == {"404": 1}
+
+
+@patch("dashboard_api.api.api_v1.endpoints.tiles.cogeo.rasterio")
+def test_tile_cache(rio, app, memcached, monkeypatch):
+    """Tiles are cached after the response and served from memcached."""
+    from dashboard_api import main
+    from dashboard_api.db.memcache import AsyncCacheLayer, CacheLayer
+
+    rio.open = mock_rio
+    cache = CacheLayer("127.0.0.1", memcached.port)
+    monkeypatch.setattr(main, "cache", cache)
+    monkeypatch.setattr(
+        main, "async_cache", AsyncCacheLayer("127.0.0.1", memcached.port, sync=cache)
+    )
+
+    response = app.get("/v1/8/87/48.tif?url=https://myurl.com/cog.tif")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/tiff"
+    assert "x-cache" not in response.headers
+
+    response = app.get("/v1/8/87/48.tif?url=https://myurl.com/cog.tif")
+    assert response.status_code == 200
+    assert response.headers["x-cache"] == "HIT-L2"
+    assert response.headers["content-type"] == "image/tiff"
+    assert not [k for k in memcached.data if k.startswith(b"etag:")]
+
+    response = app.get(
+        "/v1/8/87/48.tif?url=https://myurl.com/cog.tif",
+        headers={"If-None-Match": response.headers["etag"]},
+    )
+    assert response.status_code == 304
+
+    # Auto-format tiles are written once, under the key of the request
+    keys = set(memcached.data)
+    response = app.get("/v1/8/87/48?url=https://myurl.com/cog.tif&rescale=0,1000")
+    assert response.status_code == 200
+    assert len([k for k in set(memcached.data) - keys if b":" not in k]) == 1
+
+
+@patch("dashboard_api.api.api_v1.endpoints.tiles.cogeo.rasterio")
+def test_tile_busy(rio, app, monkeypatch):
+    """Tile reads beyond the queue limit fail fast with a 503."""
+    from dashboard_api.api import executors
+
+    rio.open = mock_rio
+    monkeypatch.setattr(
+        executors.raster_read, "pending", executors.raster_read.max_pending
+    )
+    response = app.get("/v1/8/87/48?url=https://myurl.com/cog.tif&rescale=0,1000")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+
+@patch("dashboard_api.api.api_v1.endpoints.tiles.cogeo.rasterio")
+def test_tile_negotiation(rio, app, monkeypatch):
+    """Auto tiles are WebP for clients accepting it."""
+    from dashboard_api.core import config
+
+    rio.open = mock_rio
+    url = "url=https://myurl.com/cog.tif&rescale=0,1000"
+    webp = {"Accept": "image/avif,image/webp,*/*"}
+
+    # full tile: lossy
+    response = app.get(f"/v1/8/87/48?{url}", headers=webp)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/webp"
+    assert response.headers["vary"] == "Accept"
+    assert response.content[12:16] == b"VP8 "
+    etag = response.headers["etag"]
+
+    response = app.get(f"/v1/8/87/48?{url}&webp_quality=10", headers=webp)
+    assert response.headers["etag"] != etag
+
+    # partial tile: lossless
+    response = app.get(f"/v1/8/84/47?{url}", headers=webp)
+    assert response.headers["content-type"] == "image/webp"
+    assert response.content[12:16] == b"VP8L"
+
+    response = app.get(f"/v1/8/87/48?{url}", headers={"Accept": "image/webp;q=0"})
+    assert response.headers["content-type"] == "image/jpg"
+    assert response.headers["vary"] == "Accept"
+
+    response = app.get(f"/v1/8/87/48.png?{url}", headers=webp)
+    assert response.headers["content-type"] == "image/png"
+    assert "vary" not in response.headers
+
+    monkeypatch.setattr(config, "METATILE_SIZE", 2)
+    response = app.get(f"/v1/8/84/47?{url}", headers=webp)
+    assert response.headers["content-type"] == "image/webp"
+
+    monkeypatch.setattr(config, "WEBP_NEGOTIATION", 0)
+    response = app.get(f"/v1/8/87/48?{url}", headers=webp)
+    assert response.headers["content-type"] == "image/jpg"
+    assert "vary" not in response.headers
@@ -0,0 +1,126 @@
+"""test /v1/timeseries endpoints."""
+
+from io import BytesIO
+
+import pytest
+from mock import Mock, patch
+from rasterio.errors import RasterioIOError
+
+from dashboard_api.api import cogeo, utils
+from dashboard_api.api.api_v1.endpoints import timeseries
+from dashboard_api.core import config
+from dashboard_api.ressources import arrays
+from dashboard_api.ressources.enums import ImageType
+
+from ...conftest import mock_rio
+
+URL = "url=https://myurl.com/cog_{date}.tif"
+
+
+def mock_rio_missing(src_path: str):
+    """Mock rasterio.open, without the 2020-01-02 COG."""
+    if "2020_01_02" in src_path:
+        raise RasterioIOError(f"{src_path}: No such file or directory")
+    return mock_rio(src_path)
+
+
+@pytest.fixture(autouse=True)
+def clear_pools():
+    """Reset the COG handles and footprints of other tests."""
+    cogeo.pool.clear()
+    cogeo.footprints.clear()
+
+
+@patch("dashboard_api.api.api_v1.endpoints.tiles.cogeo.rasterio")
+def test_timeseries_npy(rio, app):
+    """Frames are stacked, missing dates skipped."""
+    rio.open = Mock(side_effect=mock_rio_missing)
+
+    response = app.get(
+        f"/v1/timeseries/8/87/48.npy?{URL}&dates=2020-01-01,2020-01-02,2020-01-03"
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-binary"
+    assert response.headers["x-dates"] == "2020-01-01,2020-01-03"
+    frames = list(arrays.decode_all(response.content))
+    assert len(frames) == 2
+    assert frames[0][0].shape == (1, 256, 256)
+
+    response = app.get(
+        f"/v1/timeseries/8/87/48@2x.npy?{URL}&start=2020-01-01&end=2020-01-04"
+    )
+    assert response.status_code == 200
+    assert response.headers["x-dates"] == "2020-01-01,2020-01-03,2020-01-04"
+    assert list(arrays.decode_all(response.content))[0][0].shape == (1, 512, 512)
+
+    response = app.get(
+        f"/v1/timeseries/8/87/48.npy?{URL}&start=2020-01-01&end=2020-03-01"
+        "&time_unit=month"
+    )
+    assert response.status_code == 200
+    assert response.headers["x-dates"] == "2020-01-01,2020-02-01,2020-03-01"
+    assert rio.open.call_args[0][0] == "https://myurl.com/cog_202003.tif"
+
+    response = app.get(f"/v1/timeseries/8/0/0.npy?{URL}&dates=2020-01-01")
+    assert response.status_code == 204
+
+
+@patch("dashboard_api.api.api_v1.endpoints.tiles.cogeo.rasterio")
+def test_timeseries_animation(rio, app):
+    """Frames are encoded as an animation."""
+    Image = pytest.importorskip("PIL.Image")
+    rio.open = Mock(side_effect=mock_rio)
+
+    for ext in ("png", "webp"):
+        response = app.get(
+            f"/v1/timeseries/8/87/48.{ext}?{URL}&dates=2020-01-01,2020-01-02"
+            "&rescale=0,1000&color_map=viridis"
+        )
+        assert response.status_code == 200
+        assert response.headers["content-type"] == f"image/{ext}"
+        # Identical frames are merged by the encoder
+        assert Image.open(BytesIO(response.content)).size == (256, 256)
+
+    frames = []
+    for value in (0, 255):
+        buffer = BytesIO()
+        Image.new("RGBA", (4, 4), (value, 0, 0, 255)).save(buffer, format="PNG")
+        frames.append(buffer.getvalue())
+    for ext in (ImageType.png, ImageType.webp):
+        image = Image.open(BytesIO(timeseries.animate(frames, ext, 250)))
+        assert image.n_frames == 2
+
+
+def test_timeseries_validation(app, monkeypatch):
+    """Dates and formats are validated."""
+    response = app.get(f"/v1/timeseries/8/87/48.npy?{URL}")
+    assert response.status_code == 400
+
+    response = app.get(f"/v1/timeseries/8/87/48.jpg?{URL}&dates=2020-01-01")
+    assert response.status_code == 400
+
+    response = app.get(
+        "/v1/timeseries/8/87/48.npy?url=https://myurl.com/cog.tif&dates=2020-01-01"
+    )
+    assert response.status_code == 400
+
+    response = app.get(f"/v1/timeseries/8/87/48.npy?{URL}&dates=2020-13-01")
+    assert response.status_code == 400
+
+    monkeypatch.setattr(config, "TIMESERIES_MAX_DATES", 2)
+    response = app.get(
+        f"/v1/timeseries/8/87/48.npy?{URL}&start=2020-01-01&end=2020-01-03"
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Too many dates, maximum is 2"
+
+    # Rejected before the range is expanded
+    monkeypatch.setattr(utils, "expand_dates", Mock(side_effect=AssertionError))
+    response = app.get(
+        f"/v1/timeseries/8/87/48.npy?{URL}&start=0001-01-01&end=9999-12-31"
+    )
+    assert response.status_code == 400
+    response = app.get(
+        f"/v1/timeseries/8/87/48.npy?{URL}&start=2020-01-01&end=2020-03-01&time_unit=month"
+    )
+    assert response.status_code == 400
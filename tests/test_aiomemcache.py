@@ -0,0 +1,110 @@
+"""Test dashboard_api.db.aiomemcache."""
+
+import asyncio
+
+import pytest
+from bmemcached import Client
+
+from dashboard_api.db.aiomemcache import AsyncClient, MemcacheError
+from dashboard_api.db.memcache import AsyncCacheLayer, CacheLayer
+
+
+@pytest.mark.asyncio
+async def test_async_client(memcached):
+    """Values round trip and are readable by python-binary-memcached."""
+    client = AsyncClient("127.0.0.1", memcached.port, pool_size=2)
+
+    assert await client.get("missing") is None
+    assert await client.set("bytes", b"\x00body", time=60)
+    assert await client.set("str", "etag")
+    assert await client.set("int", 404)
+    assert await client.set("object", {"bounds": [0, 1]})
+    assert await client.get("bytes") == b"\x00body"
+    assert await client.get("int") == 404
+
+    assert await client.add("lock", 1)
+    assert not await client.add("lock", 1)
+    assert await client.delete("lock")
+    assert not await client.delete("lock")
+
+    # pipelined: one NOOP terminates the GETKQ batch, misses are skipped
+    memcached.opcodes.clear()
+    assert await client.get_multi(["str", "missing", "object"]) == {
+        "str": "etag",
+        "object": {"bounds": [0, 1]},
+    }
+    assert memcached.opcodes == [0x0D, 0x0D, 0x0D, 0x0A]
+
+    sync = Client((f"127.0.0.1:{memcached.port}",))
+    assert sync.get("object") == {"bounds": [0, 1]}
+    assert sync.get("str") == "etag"
+    sync.set("legacy", (b"body", "png"))
+    assert await client.get("legacy") == (b"body", "png")
+    sync.disconnect_all()
+
+
+@pytest.mark.asyncio
+async def test_async_client_auth(memcached):
+    """SASL PLAIN authentication."""
+    memcached.user, memcached.password = "user", "secret"
+
+    client = AsyncClient("127.0.0.1", memcached.port, "user", "secret")
+    assert await client.set("key", "value")
+    assert await client.get("key") == "value"
+
+    client = AsyncClient("127.0.0.1", memcached.port, "user", "wrong")
+    with pytest.raises(MemcacheError):
+        await client.get("key")
+
+
+@pytest.mark.asyncio
+async def test_async_client_reconnect(memcached):
+    """Requests on a broken connection are retried once, except add."""
+    client = AsyncClient("127.0.0.1", memcached.port, pool_size=1)
+    assert await client.set("key", "value")
+
+    async with client.connection() as conn:
+        pass
+    conn.writer.transport.abort()
+    assert await client.get("key") == "value"
+
+    async with client.connection() as conn:
+        pass
+    conn.writer.transport.abort()
+    with pytest.raises((OSError, asyncio.IncompleteReadError)):
+        await client.add("lock", 1)
+    assert await client.add("lock", 1)
+
+
+@pytest.mark.asyncio
+async def test_async_cache_layer(memcached):
+    """The async layer shares values and counters with the sync one."""
+    sync = CacheLayer("127.0.0.1", memcached.port)
+    cache = AsyncCacheLayer("127.0.0.1", memcached.port, sync=sync)
+
+    assert await cache.get_tile_from_tiers("tile") == (None, None, "L2", None)
+
+    await cache.set_image_cache("tile", (b"png", "png"))
+    assert await cache.get_image_from_tiers("tile") == (b"png", "png", "L2")
+    assert await cache.get_etag("tile") == sync.get_etag("tile")
+    assert sync.get_image_from_cache("tile") == (b"png", "png")
+
+    await cache.set_negative("empty", 204, 60)
+    assert await cache.get_tile_from_tiers("empty") == (None, None, "L2", 204)
+    assert sync.get_negative("empty") == 204
+    assert sync.negative_stats()["hits"] == {"204": 2}
+
+    assert await cache.acquire_lock("tile", 10)
+    assert not await cache.acquire_lock("tile", 10)
+    assert await cache.release_lock("tile")
+    sync.client.disconnect_all()
+
+
+@pytest.mark.asyncio
+async def test_async_cache_layer_unreachable():
+    """Cache errors are misses."""
+    cache = AsyncCacheLayer("127.0.0.1", 1, timeout=0.1)
+    assert await cache.get_tile_from_tiers("tile") == (None, None, "L2", None)
+    assert await cache.get_etag("tile") is None
+    assert not await cache.set_image_cache("tile", (b"png", "png"))
+    assert await cache.acquire_lock("tile", 10)
@@ -0,0 +1,58 @@
+"""Test dashboard_api.ressources.arrays."""
+
+import numpy
+import pytest
+
+from dashboard_api.ressources import arrays
+
+
+@pytest.mark.parametrize("dtype", ["uint8", "uint16", "int16", "float32"])
+@pytest.mark.parametrize("compress", [0, 6])
+def test_arrays(dtype, compress):
+    """Tiles and masks round trip."""
+    tile = (numpy.random.rand(3, 256, 256) * 100).astype(dtype)
+    mask = numpy.zeros((256, 256), dtype="uint8")
+    mask[:100] = 255
+
+    value = arrays.encode(tile, mask, compress)
+    header = arrays.decode_header(value)
+    assert header.dtype == dtype
+    assert (header.count, header.height, header.width) == (3, 256, 256)
+    assert header.mask_encoding == arrays.MASK_BITS
+    assert bool(header.flags & arrays.COMPRESSED) == bool(compress)
+    assert len(value) == arrays.HEADER.size + header.length
+    if not compress:
+        # Data, then one bit per pixel
+        assert header.length == tile.nbytes + 256 * 256 // 8
+
+    t, m = arrays.decode(value)
+    numpy.testing.assert_array_equal(t, tile)
+    numpy.testing.assert_array_equal(m, mask)
+
+
+def test_arrays_layout():
+    """Non contiguous tiles are written in C order, masks MSB first."""
+    tile = numpy.asfortranarray(numpy.arange(12, dtype="uint8").reshape(1, 3, 4))
+    mask = numpy.array([[255, 0, 0, 0], [0] * 4, [0, 0, 0, 255]], dtype="uint8")
+    value = arrays.encode(tile, mask)
+    body = value[arrays.HEADER.size :]
+    assert body[:12] == bytes(range(12))
+    assert body[12:] == b"\x80\x10"
+
+    with pytest.raises(ValueError):
+        arrays.decode(b"\x93NUMPY" + value)
+    with pytest.raises(ValueError):
+        arrays.decode(value[:10])
+
+
+def test_arrays_decode_all():
+    """Concatenated arrays are decoded in order."""
+    tiles = [numpy.full((1, 4, 4), i, dtype="uint16") for i in range(3)]
+    mask = numpy.full((4, 4), 255, dtype="uint8")
+    value = b"".join(arrays.encode(t, mask, i) for i, t in enumerate(tiles))
+
+    decoded = list(arrays.decode_all(value))
+    assert len(decoded) == 3
+    for (t, m), tile in zip(decoded, tiles):
+        numpy.testing.assert_array_equal(t, tile)
+        numpy.testing.assert_array_equal(m, mask)
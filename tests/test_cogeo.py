@@ -0,0 +1,55 @@
+"""Test dashboard_api.api.cogeo."""
+
+import os
+
+from dashboard_api.api.cogeo import DatasetPool
+
+PREFIX = os.path.join(os.path.dirname(__file__), "fixtures")
+COG_PATH = os.path.join(PREFIX, "cog.tif")
+
+
+def test_pool_reuses_handles():
+    """Checked-in handles are handed out again."""
+    pool = DatasetPool(maxsize=2, ttl=60)
+
+    with pool.checkout(COG_PATH) as src_dst:
+        first = src_dst
+    with pool.checkout(COG_PATH) as src_dst:
+        assert src_dst is first
+
+    assert pool.stats()["misses"] == 1
+    assert pool.stats()["hits"] == 1
+    pool.clear()
+    assert first.closed
+
+
+def test_pool_leases_exclusively():
+    """A leased handle is never shared."""
+    pool = DatasetPool(maxsize=2, ttl=60)
+
+    with pool.checkout(COG_PATH) as one:
+        with pool.checkout(COG_PATH) as two:
+            assert one is not two
+
+    assert pool.stats()["size"] == 2
+    pool.clear()
+
+
+def test_pool_eviction_and_ttl():
+    """Pool size and idle TTL are enforced."""
+    pool = DatasetPool(maxsize=1, ttl=60)
+
+    with pool.checkout(COG_PATH) as one:
+        with pool.checkout(COG_PATH) as two:
+            pass
+
+    assert pool.stats()["evictions"] == 1
+    assert two.closed
+    assert not one.closed
+
+    pool.ttl = -1
+    with pool.checkout(COG_PATH):
+        pass
+    assert one.closed
+    assert pool.stats()["expirations"] == 1
+    pool.clear()
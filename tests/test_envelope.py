@@ -0,0 +1,73 @@
+"""Test dashboard_api.db.envelope."""
+
+import zlib
+
+import pytest
+
+from dashboard_api.db import envelope
+from dashboard_api.ressources.enums import ImageType
+
+
+def test_roundtrip():
+    """Values are decoded to their payload, type and ext."""
+    png = b"\x89PNG" + b"\x00" * 1000
+    value = envelope.pack(png, envelope.IMAGE, ImageType.png)
+    assert envelope.is_envelope(value)
+    assert len(value) == envelope.HEADER.size + len(png)
+    assert envelope.unpack(value) == (envelope.IMAGE, ImageType.png, png, None)
+
+    npy = b"\x00" * 10000
+    value = envelope.pack(npy, envelope.IMAGE, ImageType.npy)
+    assert len(value) < 1000
+    assert envelope.unpack(value).payload == npy
+
+    doc = b'{"datasets": []}' * 100
+    value = envelope.pack(doc, envelope.JSON)
+    assert len(value) < len(doc)
+    assert envelope.unpack(value) == (envelope.JSON, None, doc, None)
+
+    # incompressible payloads are stored raw
+    value = envelope.pack(bytes(range(256)), envelope.JSON)
+    assert len(value) == envelope.HEADER.size + 256
+
+
+def test_etag():
+    """ETags are stored next to the payload and read without decoding it."""
+    npy = b"\x00" * 10000
+    value = envelope.pack(npy, envelope.IMAGE, ImageType.npy, etag='"abc-123"')
+    assert envelope.read_etag(value) == '"abc-123"'
+    assert envelope.unpack(value) == (envelope.IMAGE, ImageType.npy, npy, '"abc-123"')
+
+    value = envelope.pack(b"", envelope.VALIDATOR, etag='"abc"')
+    assert envelope.unpack(value) == (envelope.VALIDATOR, None, b"", '"abc"')
+
+    # version 1 values, without ETag
+    png = b"\x89PNG"
+    header = envelope.HEADER_V1.pack(
+        envelope.MAGIC, 1, envelope.IMAGE, envelope.RAW, 1, zlib.crc32(png)
+    )
+    assert envelope.read_etag(header + png) is None
+    assert envelope.unpack(header + png) == (envelope.IMAGE, ImageType.png, png, None)
+
+
+def test_invalid():
+    """Corrupted or foreign values are rejected."""
+    value = envelope.pack(b"\x00" * 1000, envelope.IMAGE, ImageType.tif)
+
+    with pytest.raises(ValueError):
+        envelope.unpack(value[:-1])
+
+    with pytest.raises(ValueError):
+        envelope.unpack(value[:5])
+
+    corrupted = bytearray(envelope.pack(b"body", envelope.IMAGE, ImageType.png))
+    corrupted[-1] ^= 0xFF
+    with pytest.raises(ValueError):
+        envelope.unpack(bytes(corrupted))
+
+    assert not envelope.is_envelope(("body", "png"))
+    assert not envelope.is_envelope(b'{"datasets": []}')
+
+    value = envelope.pack(b"body", envelope.IMAGE, ImageType.png, etag='"abc"')
+    with pytest.raises(ValueError):
+        envelope.read_etag(value[: envelope.HEADER.size + 2])
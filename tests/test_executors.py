@@ -0,0 +1,46 @@
+"""Test dashboard_api.api.executors."""
+
+import asyncio
+import contextvars
+import threading
+
+import pytest
+
+from dashboard_api.api.executors import BoundedExecutor, ExecutorBusy
+
+request_id: contextvars.ContextVar = contextvars.ContextVar("request_id")
+
+
+@pytest.mark.asyncio
+async def test_bounded_executor():
+    """Calls run in the named pool with the caller context."""
+    executor = BoundedExecutor("test-run", max_workers=2, max_queue=0)
+    request_id.set("abc")
+
+    def _call(value):
+        return threading.current_thread().name, request_id.get(), value
+
+    name, rid, value = await executor.bind(_call)(1)
+    assert name.startswith("test-run")
+    assert rid == "abc"
+    assert value == 1
+    assert executor.stats()["pending"] == 0
+
+
+@pytest.mark.asyncio
+async def test_bounded_executor_busy():
+    """Calls beyond the queue limit are rejected with a 503."""
+    executor = BoundedExecutor("test-busy", max_workers=1, max_queue=1, retry_after=2)
+    release = threading.Event()
+
+    jobs = [asyncio.ensure_future(executor.run(release.wait)) for _ in range(2)]
+    await asyncio.sleep(0)
+    with pytest.raises(ExecutorBusy) as e:
+        await executor.run(release.wait)
+    assert e.value.status_code == 503
+    assert e.value.headers == {"Retry-After": "2"}
+    assert executor.stats()["rejected"] == 1
+
+    release.set()
+    await asyncio.gather(*jobs)
+    assert await executor.run(lambda: "ok") == "ok"
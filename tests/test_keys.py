@@ -0,0 +1,134 @@
+"""Test dashboard_api.api.keys."""
+
+from dashboard_api.api.keys import (
+    TileKey,
+    canonical_query,
+    compare_key,
+    json_key,
+    metatile_key,
+    mosaic_key,
+)
+from dashboard_api.api.utils import ColorMapName
+from dashboard_api.ressources.enums import ImageType
+
+
+def _key(**kwargs):
+    params = dict(
+        z=8,
+        x=87,
+        y=48,
+        ext=None,
+        scale=1,
+        url="https://myurl.com/cog.tif",
+        bidx=None,
+        nodata=None,
+        rescale=None,
+        color_formula=None,
+        color_map=None,
+    )
+    params.update(kwargs)
+    return TileKey.create(**params).hash
+
+
+def test_equivalent_tiles_collide():
+    """Equivalent render parameters give the same key."""
+    assert _key(bidx="1,2") == _key(bidx="1, 2")
+    assert _key(rescale="0,255") == _key(rescale="0.0, 255.0")
+    assert _key(rescale="0,1.5e16") == _key(rescale="0,15000000000000000")
+    assert _key(nodata="nan") == _key(nodata="NaN")
+    assert _key(nodata="0") == _key(nodata=0) == _key(nodata="0.0")
+    assert _key(color_formula="Gamma R 3, Saturation 2") == _key(
+        color_formula=" Gamma R 3  Saturation 2"
+    )
+    assert _key(color_map=ColorMapName("viridis")) == _key(
+        color_map=ColorMapName("viridis")
+    )
+
+
+def test_different_tiles_differ():
+    """Different render parameters give different keys."""
+    assert _key(bidx="1,2") != _key(bidx="2,1")
+    assert _key(rescale="0,255") != _key(rescale="0,254")
+    assert _key(nodata="0") != _key(nodata="nan")
+    assert _key() != _key(ext=ImageType.png)
+    assert _key(scale=1) != _key(scale=2)
+    assert _key(color_formula="Gamma R 3") != _key(color_formula="gamma r 3")
+
+
+def test_canonical_query():
+    """Query strings are sorted and normalized."""
+    assert canonical_query(
+        {"url": "s3://cog.tif", "rescale": "0, 255", "bidx": "1, 2", "nodata": "NaN"}
+    ) == [
+        ("bidx", "1,2"),
+        ("nodata", "nan"),
+        ("rescale", "0.0,255.0"),
+        ("url", "s3://cog.tif"),
+    ]
+    assert canonical_query({"rescale": "invalid"}) == [("rescale", "invalid")]
+
+
+def test_json_key():
+    """Metadata keys include the route and API URL."""
+    assert json_key("datasets", "http://a") != json_key("sites", "http://a")
+    assert json_key("datasets", "http://a") != json_key("datasets", "http://b")
+    assert json_key("datasets", "http://a") != json_key(
+        "datasets", "http://a", spotlight_id="all"
+    )
+
+
+def test_mosaic_key():
+    """Mosaic keys depend on the assets order and the pixel selection."""
+    key = TileKey.create(8, 87, 48, None, 1, "", None, None, None, None, None)
+    assets = ["https://a.tif", "https://b.tif"]
+    assert mosaic_key(key, assets, "first") == mosaic_key(
+        key, [" https://a.tif", "https://b.tif"], "first"
+    )
+    assert mosaic_key(key, assets, "first") != mosaic_key(key, assets[::-1], "first")
+    assert mosaic_key(key, assets, "first") != mosaic_key(key, assets, "mean")
+    assert mosaic_key(key, assets[:1], "first") != key.hash
+
+
+def test_metatile_key():
+    """Metatile keys depend on the block size and differ from tile keys."""
+    key = TileKey.create(8, 86, 48, None, 1, "", None, None, None, None, None)
+    assert metatile_key(key, 2) != metatile_key(key, 4)
+    assert metatile_key(key, 2) != metatile_key(key._replace(x=88), 2)
+    assert metatile_key(key, 2) != key.hash
+
+
+def test_compare_key():
+    """Comparison keys depend on both COGs and the method."""
+    key = TileKey.create(
+        8, 87, 48, None, 1, "https://a.tif", None, None, None, None, None
+    )
+    assert compare_key(key, "https://b.tif", "difference") == compare_key(
+        key, " https://b.tif ", "difference"
+    )
+    assert compare_key(key, "https://b.tif", "difference") != compare_key(
+        key, "https://c.tif", "difference"
+    )
+    assert compare_key(key, "https://b.tif", "difference") != compare_key(
+        key, "https://b.tif", "ratio"
+    )
+    other = key._replace(url="https://c.tif")
+    assert compare_key(key, "https://b.tif", "ratio") != compare_key(
+        other, "https://b.tif", "ratio"
+    )
+    assert compare_key(key, "https://b.tif", "ratio") != key.hash
+
+
+def test_encoder_key():
+    """Encoder settings change the key, the defaults keep it unchanged."""
+    key = TileKey.create(
+        8, 87, 48, None, 1, "https://a.tif", None, None, None, None, None
+    )
+    assert key.hash == _key(url="https://a.tif")
+    assert "encoder" not in key.params()
+
+    webp = key._replace(encoder=(True, None, None))
+    assert webp.hash != key.hash
+    assert webp.hash != webp._replace(encoder=(True, 50, None)).hash
+    assert mosaic_key(key, ["https://b.tif"], "first") != mosaic_key(
+        webp, ["https://b.tif"], "first"
+    )
@@ -10,12 +10,35 @@ def test_health(app):
 
 def test_index(app):
     """Test /ping endpoint."""
-    response = app.get("/")
+    response = app.get("/", headers={"Accept-Encoding": "gzip"})
     assert response.status_code == 200
     assert response.headers["content-type"] == "text/html; charset=utf-8"
     assert response.headers["content-encoding"] == "gzip"
 
-    response = app.get("/index.html")
+    response = app.get("/index.html", headers={"Accept-Encoding": "gzip"})
     assert response.status_code == 200
     assert response.headers["content-type"] == "text/html; charset=utf-8"
     assert response.headers["content-encoding"] == "gzip"
+
+
+def test_stats(app):
+    """Test /stats endpoint."""
+    response = app.get("/stats")
+    assert response.status_code == 200
+    assert "hits" in response.json()["datasets"]
+    assert "shared" in response.json()["tiles"]
+
+
+def test_metrics(app):
+    """Test /metrics endpoint."""
+    app.get("/ping")
+    response = app.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = response.text
+    assert "# TYPE dashboard_api_request_duration_seconds histogram" in body
+    assert (
+        'dashboard_api_request_duration_seconds_count{route="ping",method="GET",status="200"}'
+        in body
+    )
+    assert "# TYPE dashboard_api_threadpool_queue_depth gauge" in body
@@ -0,0 +1,143 @@
+"""Test dashboard_api.db.memcache."""
+
+from mock import Mock
+
+from dashboard_api.db import envelope
+from dashboard_api.db.memcache import CacheLayer, MemoryCache
+from dashboard_api.ressources.responses import make_etag
+
+
+def test_memory_cache_budget():
+    """Least recently used entries are evicted to respect the byte budget."""
+    cache = MemoryCache(max_bytes=10)
+    cache.set("a", b"aaaa", 4, 60)
+    cache.set("b", b"bbbb", 4, 60)
+    assert cache.get("a") == b"aaaa"
+
+    cache.set("c", b"cccc", 4, 60)
+    assert cache.get("b") is None
+    assert cache.get("a") == b"aaaa"
+    assert cache.get("c") == b"cccc"
+    assert cache.stats()["bytes"] == 8
+    assert cache.stats()["evictions"] == 1
+
+    assert not cache.set("d", b"d" * 11, 11, 60)
+
+    # an oversized value replaces the previous entry of its key
+    assert not cache.set("a", b"a" * 11, 11, 60)
+    assert cache.get("a") is None
+    assert cache.get("c") == b"cccc"
+    assert cache.stats()["bytes"] == 4
+
+
+def test_memory_cache_ttl():
+    """Expired entries are not served."""
+    cache = MemoryCache(max_bytes=10)
+    cache.set("a", b"aaaa", 4, -1)
+    assert cache.get("a") is None
+    assert cache.stats()["bytes"] == 0
+
+
+def test_l1_promotion_ttl():
+    """memcached hits are kept in process for the promotion TTL only."""
+    local = MemoryCache(max_bytes=1024)
+    local.set = Mock(wraps=local.set)
+    cache = CacheLayer("localhost", local=local, promotion_ttl=60)
+    cache.client = Mock()
+    cache.client.get.return_value = (b"body", "png")
+
+    assert cache.get_image_from_tiers("tile") == (b"body", "png", "L2")
+    local.set.assert_called_once_with("tile", (b"body", "png"), 4, 60)
+    assert cache.get_image_from_tiers("tile") == (b"body", "png", "L1")
+
+
+def test_render_lock():
+    """Locks use memcached add and fail open."""
+    cache = CacheLayer("localhost")
+    cache.client = Mock()
+
+    cache.client.add.return_value = True
+    assert cache.acquire_lock("tile", 10)
+    cache.client.add.assert_called_with("lock:tile", 1, time=10)
+
+    cache.client.add.return_value = False
+    assert not cache.acquire_lock("tile", 10)
+
+    cache.client.add.side_effect = Exception("unreachable")
+    assert cache.acquire_lock("tile", 10)
+
+    cache.release_lock("tile")
+    cache.client.delete.assert_called_with("lock:tile")
+
+
+def test_etag_envelope():
+    """Validators are stored in the envelope of the entries, with one set."""
+    cache = CacheLayer("localhost", local=MemoryCache(max_bytes=1024))
+    cache.client = Mock()
+
+    cache.set_image_cache("tile", (b"body", "png"))
+    assert cache.client.set.call_count == 1
+    value = cache.client.set.call_args[0][1]
+    etag = make_etag("tile", b"body")
+    assert envelope.read_etag(value) == etag
+    assert cache.get_etag("tile") == etag
+
+    cache.client.get.return_value = value
+    assert cache.get_etag("other") == etag
+    cache.client.get.assert_called_with("other")
+
+    cache.client.get.return_value = (b"legacy", "png")
+    assert cache.get_etag("legacy") == make_etag("legacy", b"legacy")
+
+    cache.client.get.return_value = None
+    assert cache.get_etag("missing") is None
+
+    # Responses not cached keep only their validator
+    cache.set_etag("info", '"abc"', 60)
+    cache.client.get.return_value = cache.client.set.call_args[0][1]
+    assert cache.get_etag("info") == '"abc"'
+
+
+def test_negative_cache():
+    """Failed reads are stored as a status marker under their own key."""
+    cache = CacheLayer("localhost")
+    cache.client = Mock()
+
+    cache.set_negative("tile", 204, 60)
+    cache.client.set.assert_called_with("neg:tile", 204, time=60)
+
+    cache.client.get.return_value = 204
+    assert cache.get_negative("tile") == 204
+    cache.client.get.assert_called_with("neg:tile")
+
+    cache.client.get.return_value = None
+    assert cache.get_negative("other") is None
+    assert cache.negative_stats() == {"hits": {"204": 1}, "sets": {"204": 1}}
+
+
+def test_value_envelope():
+    """Values are stored as envelopes and legacy values are still read."""
+    cache = CacheLayer("localhost")
+    cache.client = Mock()
+
+    cache.set_image_cache("tile", (b"\x00" * 1000, "npy"))
+    value = cache.client.set.call_args[0][1]
+    assert value.startswith(envelope.MAGIC)
+    assert cache.client.set.call_args[1]["compress_level"] == 0
+
+    cache.client.get.return_value = value
+    assert cache.get_image_from_cache("tile") == (b"\x00" * 1000, "npy")
+
+    cache.client.get.return_value = (b"legacy", "png")
+    assert cache.get_image_from_cache("tile") == (b"legacy", "png")
+
+    cache.client.get.return_value = value[:-1]
+    assert cache.get_image_from_cache("tile") == (None, None)
+
+    cache.client.get.return_value = None
+    assert cache.get_image_from_cache("tile") == (None, None)
+
+    sizes = cache.value_stats()["npy"]
+    assert sizes["values"] == 1
+    assert sizes["bytes"] == 1000
+    assert sizes["saved"] == 1000 - sizes["stored"] > 0
@@ -0,0 +1,120 @@
+"""Test dashboard_api.db.memcache_pool."""
+
+import socket
+import time
+
+import pytest
+from bmemcached import Client
+
+from dashboard_api.db.aiomemcache import MemcacheError
+from dashboard_api.db.memcache import CacheLayer
+from dashboard_api.db.memcache_pool import ConnectionPool, PooledClient
+
+
+def test_pooled_client(memcached):
+    """Values round trip, are readable by python-binary-memcached, connections are reused."""
+    client = PooledClient("127.0.0.1", memcached.port, size=2)
+
+    assert client.get("missing") is None
+    assert client.set("bytes", b"\x00body", time=60, compress_level=0)
+    assert client.set("object", {"bounds": [0, 1]})
+    assert client.get("bytes") == b"\x00body"
+    assert client.get_multi(["bytes", "missing", "object"]) == {
+        "bytes": b"\x00body",
+        "object": {"bounds": [0, 1]},
+    }
+    assert client.add("lock", 1)
+    assert not client.add("lock", 1)
+    assert client.delete("lock")
+
+    sync = Client((f"127.0.0.1:{memcached.port}",))
+    assert sync.get("object") == {"bounds": [0, 1]}
+    sync.set("legacy", (b"body", "png"))
+    assert client.get("legacy") == (b"body", "png")
+    sync.disconnect_all()
+
+    stats = client.stats()
+    assert stats["created"] == 1
+    assert stats["reused"] == 8
+    assert stats["idle"] == 1
+    client.disconnect_all()
+    assert client.stats()["idle"] == 0
+
+
+def test_pool_reap_and_health_check(memcached):
+    """Idle connections are reaped, or checked with a NOOP before reuse."""
+    pool = ConnectionPool(
+        "127.0.0.1", memcached.port, idle_timeout=60, health_check_interval=10
+    )
+    with pool.connection() as conn:
+        pass
+
+    conn.last_used -= 30
+    memcached.opcodes.clear()
+    with pool.connection() as reused:
+        assert reused is conn
+    assert memcached.opcodes == [0x0A]
+    assert pool.stats()["health_checks"] == 1
+
+    pool.reap(time.monotonic() + 61)
+    assert pool.stats()["reaped"] == 1
+    with pool.connection() as conn:
+        assert conn is not reused
+    assert pool.stats()["created"] == 2
+
+    # unhealthy connections are replaced
+    conn.sock.shutdown(socket.SHUT_RDWR)
+    conn.last_used -= 30
+    with pool.connection() as fresh:
+        assert fresh is not conn
+    assert pool.stats()["unhealthy"] == 1
+    pool.close()
+
+
+def test_pooled_client_reconnect(memcached):
+    """Broken connections are dropped and the request retried."""
+    client = PooledClient("127.0.0.1", memcached.port)
+    assert client.set("key", "value")
+    with client.pool.connection() as conn:
+        pass
+    conn.sock.shutdown(socket.SHUT_RDWR)
+
+    assert client.get("key") == "value"
+    stats = client.stats()
+    assert stats["errors"] == 1
+    assert stats["created"] == 2
+    client.disconnect_all()
+
+
+def test_pooled_client_add_not_retried(memcached):
+    """add errors are raised, the lock then fails open."""
+    cache = CacheLayer("127.0.0.1", memcached.port)
+    client = cache.client
+    with client.pool.connection() as conn:
+        pass
+    conn.sock.shutdown(socket.SHUT_RDWR)
+
+    with pytest.raises((OSError, MemcacheError)):
+        client.add("lock:tile", 1)
+    assert client.stats()["created"] == 1
+
+    with client.pool.connection() as conn:
+        pass
+    conn.sock.shutdown(socket.SHUT_RDWR)
+    assert cache.acquire_lock("tile", 10)
+    client.disconnect_all()
+
+
+def test_pooled_client_errors():
+    """Connection errors are misses, an exhausted pool raises."""
+    client = PooledClient("127.0.0.1", 1, timeout=0.1)
+    assert client.get("key") is None
+    assert client.get_multi(["key"]) == {}
+    assert not client.set("key", "value")
+
+    pool = ConnectionPool("127.0.0.1", 1, size=1, timeout=0.1)
+    assert pool._slots.acquire()
+    with pytest.raises(MemcacheError):
+        with pool.connection():
+            pass
+    assert pool.stats()["exhausted"] == 1
@@ -0,0 +1,75 @@
+"""Test dashboard_api.core.metrics."""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from dashboard_api.core.metrics import Counter, Gauge, Histogram, Metric, Registry
+
+
+def test_metric_abstract():
+    """Metrics must define their samples."""
+    with pytest.raises(TypeError):
+        Metric("base", "Base.")
+
+
+def test_counter():
+    """Counts of all the threads are merged."""
+    counter = Counter("hits", "Hits.", ("cache", "result"))
+
+    def _record():
+        for _ in range(1000):
+            counter.inc("tile", "hit")
+
+    threads = [threading.Thread(target=_record) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    counter.inc("tile", "miss", amount=2)
+
+    assert counter.values() == {("tile", "hit"): 4000, ("tile", "miss"): 2}
+    assert len(counter._shards) == 5
+    assert counter.expose().splitlines() == [
+        "# HELP dashboard_api_hits Hits.",
+        "# TYPE dashboard_api_hits counter",
+        'dashboard_api_hits_total{cache="tile",result="hit"} 4000',
+        'dashboard_api_hits_total{cache="tile",result="miss"} 2',
+    ]
+
+
+def test_histogram():
+    """Buckets are cumulative, values on a bound fall in its bucket."""
+    histogram = Histogram("latency", "Latency.", ("stage",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value, "Read")
+    with histogram.time("Format"):
+        pass
+
+    lines = histogram.expose().splitlines()
+    assert lines[1] == "# TYPE dashboard_api_latency histogram"
+    assert 'dashboard_api_latency_bucket{stage="Read",le="0.1"} 2' in lines
+    assert 'dashboard_api_latency_bucket{stage="Read",le="1.0"} 3' in lines
+    assert 'dashboard_api_latency_bucket{stage="Read",le="+Inf"} 4' in lines
+    assert 'dashboard_api_latency_sum{stage="Read"} 2.65' in lines
+    assert 'dashboard_api_latency_count{stage="Read"} 4' in lines
+    assert 'dashboard_api_latency_count{stage="Format"} 1' in lines
+
+
+def test_registry():
+    """Gauges are read on exposition, label values are escaped."""
+    registry = Registry()
+    executor = ThreadPoolExecutor(max_workers=1)
+    registry.register(
+        Gauge(
+            "queue_depth",
+            "Queue depth.",
+            ("pool",),
+            lambda: {('a "b"\n',): executor._work_queue.qsize()},
+        )
+    )
+    assert registry.expose().endswith(
+        'dashboard_api_queue_depth{pool="a \\"b\\"\\n"} 0\n'
+    )
+    executor.shutdown()
@@ -0,0 +1,86 @@
+"""Test dashboard_api.middleware."""
+
+import pytest
+
+from dashboard_api.middleware import CompressionMiddleware
+
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.testclient import TestClient
+
+
+@pytest.fixture
+def client() -> TestClient:
+    """Application with a few response types."""
+    app = Starlette()
+
+    @app.route("/json")
+    def json_route(request):
+        return JSONResponse({"data": "x" * 1000})
+
+    @app.route("/small")
+    def small_route(request):
+        return JSONResponse({"data": "x"})
+
+    @app.route("/png")
+    def png_route(request):
+        return Response(b"\x89PNG" + b"\x00" * 1000, media_type="image/png")
+
+    @app.route("/notmodified")
+    def not_modified_route(request):
+        return Response(status_code=304, headers={"ETag": '"abc"'})
+
+    @app.route("/stream")
+    def stream_route(request):
+        async def body():
+            for _ in range(10):
+                yield b"x" * 100
+
+        return StreamingResponse(body(), media_type="text/plain")
+
+    app.add_middleware(CompressionMiddleware, minimum_size=500)
+    return TestClient(app)
+
+
+def test_compression(client):
+    """Compress text bodies only."""
+    response = client.get("/json", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.json()["data"] == "x" * 1000
+
+    response = client.get("/json", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+
+    response = client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+
+    response = client.get("/png", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.content.startswith(b"\x89PNG")
+
+    response = client.get("/notmodified", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 304
+    assert "content-encoding" not in response.headers
+    assert not response.content
+
+
+def test_streaming_compression(client):
+    """Compress streamed bodies."""
+    response = client.get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert response.content == b"x" * 1000
+
+
+def test_brotli(client):
+    """Prefer Brotli when available."""
+    pytest.importorskip("brotli")
+
+    response = client.get("/json", headers={"Accept-Encoding": "gzip, br"})
+    assert response.headers["content-encoding"] == "br"
+    assert int(response.headers["content-length"]) < 1000
+    assert response.json()["data"] == "x" * 1000
+
+    response = client.get("/json", headers={"Accept-Encoding": "br;q=0, gzip"})
+    assert response.headers["content-encoding"] == "gzip"
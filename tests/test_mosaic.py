@@ -0,0 +1,76 @@
+"""Test dashboard_api.api.mosaic."""
+
+import numpy
+from mock import patch
+
+from dashboard_api.api import mosaic
+from dashboard_api.ressources.enums import PixelSelection
+
+
+def _tile(value, valid):
+    tile = numpy.full((1, 2, 2), value, dtype="uint16")
+    mask = numpy.array(valid, dtype="uint8") * 255
+    return tile, mask
+
+
+def test_mosaic_tile():
+    """Pixels are selected among the valid pixels."""
+    a = _tile(10, [[1, 0], [0, 0]])
+    b = _tile(20, [[1, 1], [0, 0]])
+    c = _tile(5, [[1, 1], [1, 1]])
+
+    first = mosaic.MosaicTile(PixelSelection.first)
+    for data in (a, b):
+        first.add(*data)
+    assert not first.full
+    first.add(*c)
+    assert first.full
+    tile, mask = first.data()
+    assert tile[0].tolist() == [[10, 20], [5, 5]]
+    assert mask.all()
+
+    highest = mosaic.MosaicTile(PixelSelection.highest)
+    lowest = mosaic.MosaicTile(PixelSelection.lowest)
+    mean = mosaic.MosaicTile(PixelSelection.mean)
+    for data in (a, b, c):
+        highest.add(*data)
+        lowest.add(*data)
+        mean.add(*data)
+    assert not highest.full
+    assert highest.data()[0][0].tolist() == [[20, 20], [5, 5]]
+    assert lowest.data()[0][0].tolist() == [[5, 5], [5, 5]]
+    tile, mask = mean.data()
+    assert tile.dtype == "uint16"
+    assert tile[0].tolist() == [[11, 12], [5, 5]]
+
+    assert mosaic.MosaicTile().empty
+
+
+@patch("dashboard_api.api.mosaic.requests")
+def test_stac_assets(requests, monkeypatch):
+    """Items overlapping the tile are returned, searches are cached."""
+    monkeypatch.setattr(mosaic.config, "STAC_API_URL", "https://stac")
+    mosaic._searches.clear()
+    requests.post.return_value.json.return_value = {
+        "features": [
+            {
+                "bbox": [-180, -85, 180, 85],
+                "assets": {
+                    "thumbnail": {"href": "a.png", "type": "image/png"},
+                    "cog": {"href": "a.tif", "type": "image/tiff; application=geotiff"},
+                },
+            },
+            {"bbox": [0, 0, 1, 1], "assets": {"cog": {"href": "b.tif"}}},
+        ]
+    }
+
+    assert mosaic.stac_assets("no2", "2020-01-01", 0, 0, 0) == ["a.tif"]
+    assert mosaic.stac_assets("no2", "2020-01-01", 8, 128, 127, "cog") == [
+        "a.tif",
+        "b.tif",
+    ]
+    assert mosaic.stac_assets("no2", "2020-01-01", 8, 0, 0) == ["a.tif"]
+    assert requests.post.call_count == 2
+    body = requests.post.call_args[1]["json"]
+    assert body["datetime"] == "2020-01-01T00:00:00Z/2020-01-01T23:59:59Z"
+    mosaic._searches.clear()
@@ -0,0 +1,22 @@
+"""Test dashboard_api.ressources.responses."""
+
+from dashboard_api.ressources.responses import accepts, etag_match
+
+
+def test_accepts():
+    """Media types must be listed with a non-zero quality."""
+    assert accepts("image/avif,image/webp,*/*", "image/webp")
+    assert accepts("image/webp;q=0.8, image/png", "image/webp")
+    assert accepts("IMAGE/WEBP", "image/webp")
+    assert not accepts("image/webp;q=0", "image/webp")
+    assert not accepts("image/webp;q=x", "image/webp")
+    assert not accepts("*/*", "image/webp")
+    assert not accepts(None, "image/webp")
+
+
+def test_etag_match():
+    """ETags match weakly, or any with a star."""
+    assert etag_match('W/"a", "b"', '"a"')
+    assert etag_match("*", '"a"')
+    assert not etag_match('"b"', '"a"')
+    assert not etag_match(None, '"a"')
@@ -0,0 +1,166 @@
+"""Test dashboard_api.seed."""
+
+import datetime
+
+from mock import Mock, patch
+
+from dashboard_api.api import cogeo
+from dashboard_api.api.api_v1.endpoints.tiles import Encoder, tile_key
+from dashboard_api.api.utils import ColorMapName
+from dashboard_api.models.static import Site
+from dashboard_api.ressources.enums import ImageType
+from dashboard_api.seed import (
+    SeedState,
+    SeedTile,
+    expand_dates,
+    parse_tile_url,
+    seed,
+    seed_tiles,
+    site_tiles,
+    tile_encoders,
+)
+
+from .conftest import mock_rio
+
+TILE_URL = "/{z}/{x}/{y}@1x?url=s3://bucket/no2_{spotlightId}_{date}.tif&resampling_method=nearest&bidx=1&rescale=0%2C1.5e16&color_map=custom_no2"
+
+SITE = Site(
+    id="ny",
+    label="New York",
+    summary="",
+    center=[-74.0, 40.7],
+    bounding_box=[-73.5, 41.0, -74.5, 40.5],
+)
+
+
+def test_parse_tile_url():
+    """Tile URLs give the tile endpoint parameters."""
+    params = parse_tile_url(TILE_URL.replace("{date}", "2020_03"))
+    assert params.scale == 1
+    assert params.ext is None
+    assert params.url == "s3://bucket/no2_{spotlightId}_2020_03.tif"
+    assert params.bidx == "1"
+    assert params.rescale == "0,1.5e16"
+    assert params.color_map == ColorMapName("custom_no2")
+
+    params = parse_tile_url("/{z}/{x}/{y}@2x.png?url=s3://bucket/cog.tif")
+    assert params.scale == 2
+    assert params.ext == ImageType.png
+
+
+def test_expand_dates():
+    """Domains are filtered and periodic domains expanded."""
+    domain = ["2020-01-01T00:00:00Z", "2020-02-01T00:00:00Z", "2020-03-01T00:00:00Z"]
+    assert expand_dates(domain, start="2020-02-01") == [
+        datetime.date(2020, 2, 1),
+        datetime.date(2020, 3, 1),
+    ]
+
+    dates = expand_dates(
+        ["2019-11-01T00:00:00Z", "2020-02-01T00:00:00Z"], "month", True
+    )
+    assert [d.month for d in dates] == [11, 12, 1, 2]
+
+    dates = expand_dates(["2020-01-30T00:00:00Z", "2020-02-02T00:00:00Z"], "day", True)
+    assert len(dates) == 4
+
+
+def test_seed_tiles():
+    """Tiles cover the site extent for every date."""
+    tiles = list(site_tiles(SITE, 6, 8))
+    assert {t.z for t in tiles} == {6, 7, 8}
+
+    dates = [datetime.date(2020, 1, 1), datetime.date(2020, 2, 1)]
+    jobs = list(seed_tiles([TILE_URL], SITE, dates, "%Y%m", 6, 8))
+    # Auto-format tiles, with and without WebP
+    assert len(jobs) == 2 * 2 * len(tiles)
+    _, tile = jobs[0]
+    assert tile.params.url == "s3://bucket/no2_ny_202001.tif"
+    key = tile_key(
+        tile.z,
+        tile.x,
+        tile.y,
+        None,
+        1,
+        "s3://bucket/no2_ny_202001.tif",
+        "1",
+        None,
+        "0,1.5e16",
+        None,
+        ColorMapName("custom_no2"),
+    )
+    assert tile.key == key.hash
+
+
+def test_tile_encoders(monkeypatch):
+    """Auto-format tile URLs are seeded for both negotiated formats."""
+    from dashboard_api.core import config
+
+    assert tile_encoders(TILE_URL) == [Encoder(), Encoder(webp=True)]
+    assert tile_encoders(f"{TILE_URL}&webp_quality=50") == [
+        Encoder(),
+        Encoder(webp=True, quality=50),
+    ]
+    assert tile_encoders("/{z}/{x}/{y}.png?url=s3://bucket/cog.tif") == [Encoder()]
+
+    monkeypatch.setattr(config, "WEBP_NEGOTIATION", 0)
+    assert tile_encoders(TILE_URL) == [Encoder()]
+
+
+@patch("dashboard_api.api.api_v1.endpoints.tiles.cogeo.rasterio")
+def test_seed_browser_hit(rio, app, memcached, monkeypatch):
+    """Seeded tiles are served from the cache to browsers accepting WebP."""
+    from dashboard_api import main
+    from dashboard_api.db.memcache import AsyncCacheLayer, CacheLayer
+
+    rio.open = mock_rio
+    cogeo.footprints.clear()
+    cache = CacheLayer("127.0.0.1", memcached.port)
+    monkeypatch.setattr(main, "cache", cache)
+    monkeypatch.setattr(
+        main, "async_cache", AsyncCacheLayer("127.0.0.1", memcached.port, sync=cache)
+    )
+
+    url = "/8/87/48?url=https://myurl.com/cog.tif&rescale=0,1000"
+    params = parse_tile_url(url)
+    jobs = [SeedTile(8, 87, 48, params, encoder) for encoder in tile_encoders(url)]
+    assert seed(iter(jobs), cache, SeedState(None)) == {"rendered": 2}
+
+    for accept, media_type in (
+        ("image/avif,image/webp,*/*", "image/webp"),
+        ("*/*", "image/jpg"),
+    ):
+        response = app.get(f"/v1{url}", headers={"Accept": accept})
+        assert response.status_code == 200
+        assert response.headers["x-cache"].startswith("HIT-")
+        assert response.headers["content-type"] == media_type
+
+
+@patch("dashboard_api.seed.render_cached_tile")
+def test_seed(render, tmpdir):
+    """Tiles are rendered once and progress can be resumed."""
+    render.return_value = (200, ImageType.png, b"png")
+    cache_client = Mock()
+    cache_client.get_etag.return_value = None
+    jobs = [
+        tile
+        for _, tile in seed_tiles(
+            [TILE_URL], SITE, [datetime.date(2020, 1, 1)], "%Y%m", 6, 7
+        )
+    ]
+
+    path = str(tmpdir.join("seed.state"))
+    state = SeedState(path)
+    counts = seed(iter(jobs), cache_client, state, workers=2)
+    state.close()
+    assert counts == {"rendered": len(jobs)}
+    assert render.call_count == len(jobs)
+
+    state = SeedState(path)
+    counts = seed(iter(jobs), cache_client, state, workers=2)
+    state.close()
+    assert counts == {"resumed": len(jobs)}
+
+    cache_client.get_etag.return_value = '"etag"'
+    counts = seed(iter(jobs), cache_client, SeedState(None), workers=2)
+    assert counts == {"cached": len(jobs)}
@@ -0,0 +1,118 @@
+"""Test dashboard_api.api.utils."""
+
+import asyncio
+
+import numpy as np
+import pytest
+
+from dashboard_api.api.utils import (
+    SingleFlight,
+    apply_colormap,
+    compare_tiles,
+    get_colormap_lut,
+    parse_color_formula,
+    parse_rescale,
+    postprocess,
+)
+
+
+def test_postprocess_rescale():
+    """Rescale every band with its own bounds and zero masked pixels."""
+    tile = np.array([[[0, 500], [1000, 2000]], [[10, 20], [30, 40]]], np.uint16)
+    mask = np.array([[255, 255], [255, 0]], np.uint8)
+
+    arr = postprocess(tile.copy(), mask, rescale="0,1000")
+    assert arr.dtype == np.uint8
+    assert arr[0].tolist() == [[0, 127], [255, 0]]
+    assert arr[1].tolist() == [[2, 5], [7, 0]]
+
+    arr = postprocess(tile.copy(), mask, rescale="0,1000,10,40")
+    assert arr[0].tolist() == [[0, 127], [255, 0]]
+    assert arr[1].tolist() == [[0, 85], [170, 0]]
+
+
+def test_postprocess_color_formula():
+    """Apply color formula on rescaled data."""
+    tile = np.full((3, 4, 4), 500, np.uint16)
+    mask = np.full((4, 4), 255, np.uint8)
+
+    arr = postprocess(
+        tile, mask, rescale="0,1000", color_formula="Gamma RGB 3.5 Saturation 1.7"
+    )
+    assert arr.dtype == np.uint8
+    assert arr.shape == (3, 4, 4)
+
+
+def test_parse_memoized():
+    """Parsed rescale and color formula are cached."""
+    assert parse_rescale("0,1000,10,40") == ((0.0, 1000.0), (10.0, 40.0))
+    assert parse_rescale("0,1000,10,40") is parse_rescale("0,1000,10,40")
+    assert parse_color_formula("Gamma RGB 3.5") is parse_color_formula("Gamma RGB 3.5")
+
+
+def test_colormap_lut():
+    """Colormaps are compiled once into read-only lookup tables."""
+    lut = get_colormap_lut("custom_cropmonitor")
+    assert lut.shape == (4, 256)
+    assert lut.dtype == np.uint8
+    assert not lut.flags.writeable
+    assert lut[:, 4].tolist() == [245, 239, 0, 255]
+    assert lut[:, 0].tolist() == [0, 0, 0, 0]
+    assert get_colormap_lut("custom_cropmonitor") is lut
+    assert get_colormap_lut("viridis").shape == (4, 256)
+
+
+def test_apply_colormap():
+    """Apply a lookup table on 1 band data."""
+    tile = np.array([[[0, 4], [7, 4]]], np.uint8)
+    mask = np.array([[255, 255], [255, 0]], np.uint8)
+
+    data, alpha = apply_colormap(tile, mask, get_colormap_lut("custom_cropmonitor"))
+    assert data.shape == (3, 2, 2)
+    assert data[:, 0, 1].tolist() == [245, 239, 0]
+    assert alpha.tolist() == [[0, 255], [255, 0]]
+
+
+def test_compare_tiles():
+    """Compare raw values where both tiles are valid."""
+    tile = np.array([[[10, 20], [30, 40]]], np.uint8)
+    other = np.array([[[20, 10], [0, 40]]], np.uint8)
+    mask = np.array([[255, 255], [255, 0]], np.uint8)
+    other_mask = np.full((2, 2), 255, np.uint8)
+
+    data, valid = compare_tiles(tile, mask, other, other_mask)
+    assert data.dtype == np.float32
+    assert data.tolist() == [[[-10, 10], [30, 0]]]
+    assert valid.tolist() == [[255, 255], [255, 0]]
+
+    data, valid = compare_tiles(tile, mask, other, other_mask, "ratio")
+    assert data.tolist() == [[[0.5, 2], [0, 0]]]
+    assert valid.tolist() == [[255, 255], [0, 0]]
+
+
+@pytest.mark.asyncio
+async def test_single_flight():
+    """Concurrent calls with the same key share one execution."""
+    calls = []
+
+    async def work(key):
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        return key
+
+    flight = SingleFlight()
+    results = await asyncio.gather(
+        flight.do("a", lambda: work("a")),
+        flight.do("a", lambda: work("a")),
+        flight.do("b", lambda: work("b")),
+    )
+    assert results == [("a", False), ("a", True), ("b", False)]
+    assert calls == ["a", "b"]
+    assert flight.stats() == dict(inflight=0, leaders=2, shared=1)
+
+    async def fail():
+        raise ValueError("nope")
+
+    with pytest.raises(ValueError):
+        await flight.do("c", fail)
+    assert flight.stats()["inflight"] == 0